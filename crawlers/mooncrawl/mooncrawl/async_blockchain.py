@@ -0,0 +1,269 @@
+"""
+Asynchronous JSON-RPC client for blockchain nodes.
+
+Keeps many requests in flight from one process over pool of keep-alive connections.
+Results are formatted the same way as web3 formats them for synchronous calls.
+"""
+import asyncio
+import functools
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from uuid import UUID
+
+import aiohttp
+from hexbytes import HexBytes
+from moonstreamdb.blockchain import AvailableBlockchainType
+from web3.datastructures import AttributeDict
+from web3.exceptions import BlockNotFound, TransactionNotFound
+from web3.types import BlockData, FilterParams, LogReceipt, TxData, TxReceipt
+
+from .blockchain import (
+    BatchRequestError,
+    get_request_headers,
+    get_result_formatter,
+    get_web3_uri,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+T = TypeVar("T")
+
+
+class AsyncWeb3Client:
+    """
+    Asynchronous client with methods matching web3.eth ones used by crawlers.
+
+    Use as async context manager or call close() when finished.
+    """
+
+    def __init__(
+        self,
+        blockchain_type: AvailableBlockchainType,
+        web3_uri: str,
+        headers: Optional[Dict[str, str]] = None,
+        pool_size: int = 100,
+        timeout: float = 60,
+    ) -> None:
+        assert pool_size > 0, "pool_size must be greater than 0"
+        if not (web3_uri.startswith("http://") or web3_uri.startswith("https://")):
+            raise ValueError(
+                f"Asynchronous client supports only HTTP providers, got: {web3_uri}"
+            )
+
+        self.blockchain_type = blockchain_type
+        self.web3_uri = web3_uri
+        self.headers = {"Content-Type": "application/json"}
+        if headers is not None:
+            self.headers.update(headers)
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._request_id = 0
+
+    async def __aenter__(self) -> "AsyncWeb3Client":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Session has to be created inside running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def gather(self, calls: List[Callable[[], Awaitable[T]]]) -> List[T]:
+        """
+        Run calls concurrently, at most pool_size of them are in flight at once.
+        """
+        semaphore = asyncio.Semaphore(self.pool_size)
+
+        async def bounded_call(call: Callable[[], Awaitable[T]]) -> T:
+            async with semaphore:
+                return await call()
+
+        return await asyncio.gather(*[bounded_call(call) for call in calls])
+
+    def _next_request_id(self) -> int:
+        self._request_id += 1
+        return self._request_id
+
+    def _format_result(self, method: str, result: Any) -> Any:
+        if result is None:
+            return None
+        return AttributeDict.recursive(
+            get_result_formatter(self.blockchain_type, method)(result)
+        )
+
+    async def _post(self, payload: Any) -> Any:
+        session = self._get_session()
+        async with session.post(self.web3_uri, data=json.dumps(payload)) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def make_request(self, method: str, params: List[Any]) -> Any:
+        """
+        Send one JSON-RPC call and return formatted result.
+
+        Raises ValueError with node error as web3 does.
+        """
+        response = await self._post(
+            {
+                "jsonrpc": "2.0",
+                "method": method,
+                "params": params,
+                "id": self._next_request_id(),
+            }
+        )
+        if response.get("error") is not None:
+            raise ValueError(response["error"])
+        return self._format_result(method, response.get("result"))
+
+    async def make_batch_request(
+        self, method: str, params_list: List[List[Any]]
+    ) -> List[Any]:
+        """
+        Send several calls of the same JSON-RPC method in one batch request.
+
+        Raises BatchRequestError if node rejected batch.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+            for request_id, params in enumerate(params_list)
+        ]
+        try:
+            response = await self._post(payload)
+        except Exception as err:
+            raise BatchRequestError(f"Batch request failed: {repr(err)}")
+
+        if not isinstance(response, list):
+            raise BatchRequestError(f"Node rejected batch request: {response}")
+
+        results: List[Any] = [None] * len(params_list)
+        for item in response:
+            if item.get("error") is not None:
+                raise BatchRequestError(
+                    f"Error in batch response for {method}: {item['error']}"
+                )
+            results[item["id"]] = self._format_result(method, item.get("result"))
+        return results
+
+    async def block_number(self) -> int:
+        return await self.make_request("eth_blockNumber", [])
+
+    async def get_block(
+        self, block_number: int, full_transactions: bool = False
+    ) -> BlockData:
+        block = await self.make_request(
+            "eth_getBlockByNumber", [hex(block_number), full_transactions]
+        )
+        if block is None:
+            raise BlockNotFound(f"Block with id: {block_number} not found.")
+        return block
+
+    async def get_blocks(
+        self, blocks_numbers: List[int], full_transactions: bool = False
+    ) -> List[BlockData]:
+        """
+        Fetch blocks concurrently, number of requests in flight is limited by pool size.
+        """
+        return await self.gather(
+            [
+                functools.partial(
+                    self.get_block, block_number, full_transactions=full_transactions
+                )
+                for block_number in blocks_numbers
+            ]
+        )
+
+    async def get_transaction(self, transaction_hash: str) -> TxData:
+        transaction = await self.make_request(
+            "eth_getTransactionByHash", [HexBytes(transaction_hash).hex()]
+        )
+        if transaction is None:
+            raise TransactionNotFound(
+                f"Transaction with hash: {transaction_hash} not found."
+            )
+        return transaction
+
+    async def get_transaction_receipt(self, transaction_hash: str) -> TxReceipt:
+        receipt = await self.make_request(
+            "eth_getTransactionReceipt", [HexBytes(transaction_hash).hex()]
+        )
+        if receipt is None:
+            raise TransactionNotFound(
+                f"Transaction with hash: {transaction_hash} not found."
+            )
+        return receipt
+
+    async def get_transaction_receipts(
+        self, transactions_hashes: List[str], skip_missing: bool = False
+    ) -> Dict[str, TxReceipt]:
+        """
+        Fetch receipts concurrently, number of requests in flight is limited by pool size.
+
+        Returns receipts by transaction hash, as blockchain.get_transaction_receipts.
+        With skip_missing, transactions without receipt are not in result instead
+        of raising TransactionNotFound.
+        """
+
+        async def get_receipt(transaction_hash: str) -> Optional[TxReceipt]:
+            try:
+                return await self.get_transaction_receipt(transaction_hash)
+            except TransactionNotFound:
+                if skip_missing:
+                    return None
+                raise
+
+        receipts = await self.gather(
+            [
+                functools.partial(get_receipt, transaction_hash)
+                for transaction_hash in transactions_hashes
+            ]
+        )
+        return {
+            transaction_hash: receipt
+            for transaction_hash, receipt in zip(transactions_hashes, receipts)
+            if receipt is not None
+        }
+
+    async def get_logs(self, filter_params: FilterParams) -> List[LogReceipt]:
+        params: Dict[str, Any] = dict(filter_params)
+        for block_key in ["fromBlock", "toBlock"]:
+            if isinstance(params.get(block_key), int):
+                params[block_key] = hex(params[block_key])
+        return await self.make_request("eth_getLogs", [params])
+
+
+def async_connect(
+    blockchain_type: AvailableBlockchainType,
+    web3_uri: Optional[str] = None,
+    access_id: Optional[UUID] = None,
+    pool_size: int = 100,
+) -> AsyncWeb3Client:
+    """
+    Asynchronous version of blockchain.connect, supports only HTTP providers.
+
+    pool_size - maximum number of simultaneously opened keep-alive connections.
+    """
+    if web3_uri is None:
+        web3_uri = get_web3_uri(blockchain_type)
+
+    return AsyncWeb3Client(
+        blockchain_type,
+        web3_uri,
+        headers=get_request_headers(access_id),
+        pool_size=pool_size,
+    )
@@ -0,0 +1,209 @@
+"""
+Block number to block timestamp index shared by event and function call crawlers.
+"""
+import bisect
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from moonstreamdb.blockchain import AvailableBlockchainType, get_block_model
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from web3 import Web3
+
+from .blockchain import get_blocks
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BlockTimestampsCache:
+    """
+    Timestamps of contiguous block ranges, each range is stored in compact
+    array of 64-bit integers keyed by its first block number.
+
+    Ranges are evicted in least recently used order when cache holds more
+    than max_blocks blocks, if one range is left its oldest blocks are
+    dropped. Safe to share between threads.
+    """
+
+    def __init__(self, max_blocks: int = 100000) -> None:
+        assert max_blocks > 0, "max_blocks must be greater than 0"
+        self.max_blocks = max_blocks
+
+        self._ranges: "OrderedDict[int, array]" = OrderedDict()
+        self._starts: List[int] = []
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _find_range_start(self, block_number: int) -> Optional[int]:
+        index = bisect.bisect_right(self._starts, block_number) - 1
+        if index < 0:
+            return None
+        range_start = self._starts[index]
+        if block_number >= range_start + len(self._ranges[range_start]):
+            return None
+        return range_start
+
+    def get(self, block_number: int) -> Optional[int]:
+        with self._lock:
+            range_start = self._find_range_start(block_number)
+            if range_start is None:
+                return None
+            self._ranges.move_to_end(range_start)
+            return self._ranges[range_start][block_number - range_start]
+
+    def _add_range(self, range_start: int, timestamps: List[int]) -> None:
+        range_end = range_start + len(timestamps) - 1
+
+        # Pop overlapping and adjacent ranges, they are merged with added one
+        overlapping: List[Tuple[int, array]] = []
+        index = max(bisect.bisect_right(self._starts, range_start) - 1, 0)
+        while index < len(self._starts) and self._starts[index] <= range_end + 1:
+            existing_start = self._starts[index]
+            existing_timestamps = self._ranges[existing_start]
+            if existing_start + len(existing_timestamps) < range_start:
+                index += 1
+                continue
+            overlapping.append((existing_start, existing_timestamps))
+            del self._ranges[existing_start]
+            del self._starts[index]
+            self._size -= len(existing_timestamps)
+
+        # Range starting before added one is extended in place
+        if overlapping and overlapping[0][0] < range_start:
+            merged_start, merged_timestamps = overlapping.pop(0)
+        else:
+            merged_start, merged_timestamps = range_start, array("q")
+        offset = range_start - merged_start
+        merged_timestamps[offset : offset + len(timestamps)] = array("q", timestamps)
+        # Ranges starting within added one contribute only blocks after it
+        for existing_start, existing_timestamps in overlapping:
+            tail = merged_start + len(merged_timestamps) - existing_start
+            if tail < len(existing_timestamps):
+                merged_timestamps.extend(existing_timestamps[tail:])
+
+        self._ranges[merged_start] = merged_timestamps
+        bisect.insort(self._starts, merged_start)
+        self._size += len(merged_timestamps)
+
+        while self._size > self.max_blocks and len(self._ranges) > 1:
+            evicted_start, evicted_timestamps = self._ranges.popitem(last=False)
+            self._starts.remove(evicted_start)
+            self._size -= len(evicted_timestamps)
+
+        # Contiguous blocks are merged into one range, trim its oldest blocks
+        if self._size > self.max_blocks:
+            excess = self._size - self.max_blocks
+            del merged_timestamps[:excess]
+            del self._ranges[merged_start]
+            self._ranges[merged_start + excess] = merged_timestamps
+            self._starts = [merged_start + excess]
+            self._size = self.max_blocks
+
+    def add(self, timestamps: Dict[int, int]) -> None:
+        """
+        Add block timestamps, they are split into contiguous ranges.
+        """
+        if not timestamps:
+            return
+
+        with self._lock:
+            range_start: Optional[int] = None
+            range_timestamps: List[int] = []
+            for block_number in sorted(timestamps):
+                if range_start is not None and block_number != range_start + len(
+                    range_timestamps
+                ):
+                    self._add_range(range_start, range_timestamps)
+                    range_start = None
+                    range_timestamps = []
+                if range_start is None:
+                    range_start = block_number
+                range_timestamps.append(timestamps[block_number])
+            if range_start is not None:
+                self._add_range(range_start, range_timestamps)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ranges.clear()
+            self._starts = []
+            self._size = 0
+
+    def load(
+        self,
+        db_session: Session,
+        web3: Web3,
+        blockchain_type: AvailableBlockchainType,
+        blocks_numbers: Iterable[int],
+        db_prefetch_blocks: int = 0,
+        max_gap: int = 100,
+        rpc_batch_size: int = 100,
+    ) -> Dict[int, int]:
+        """
+        Returns timestamps of requested blocks.
+
+        Blocks missing in cache are loaded from database with one query, requested
+        blocks within max_gap of each other are loaded as one range which is
+        extended by db_prefetch_blocks. Blocks missing in database are fetched
+        from node with batch requests of rpc_batch_size blocks.
+        """
+        timestamps: Dict[int, int] = {}
+        missing_blocks: List[int] = []
+        for block_number in sorted(set(blocks_numbers)):
+            timestamp = self.get(block_number)
+            if timestamp is None:
+                missing_blocks.append(block_number)
+            else:
+                timestamps[block_number] = timestamp
+        if not missing_blocks:
+            return timestamps
+
+        spans: List[List[int]] = []
+        for block_number in missing_blocks:
+            if spans and block_number - spans[-1][1] <= max_gap:
+                spans[-1][1] = block_number
+            else:
+                spans.append([block_number, block_number])
+
+        block_model = get_block_model(blockchain_type)
+        loaded_timestamps: Dict[int, int] = {
+            block_number: timestamp
+            for block_number, timestamp in db_session.query(
+                block_model.block_number, block_model.timestamp
+            )
+            .filter(
+                or_(
+                    *[
+                        block_model.block_number.between(
+                            span_from, span_to + db_prefetch_blocks
+                        )
+                        for span_from, span_to in spans
+                    ]
+                )
+            )
+            .all()
+        }
+
+        node_blocks = [
+            block_number
+            for block_number in missing_blocks
+            if block_number not in loaded_timestamps
+        ]
+        if node_blocks:
+            logger.debug(f"Fetching {len(node_blocks)} blocks timestamps from node")
+        for i in range(0, len(node_blocks), rpc_batch_size):
+            for block in get_blocks(
+                web3, blockchain_type, node_blocks[i : i + rpc_batch_size]
+            ):
+                loaded_timestamps[block["number"]] = block["timestamp"]
+
+        self.add(loaded_timestamps)
+        for block_number in missing_blocks:
+            timestamps[block_number] = loaded_timestamps[block_number]
+        return timestamps
@@ -1,11 +1,18 @@
+import json
 import logging
-from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, Union
 from uuid import UUID
 
+from eth_typing import URI, HexStr
 from moonstreamdb.blockchain import (
     AvailableBlockchainType,
     get_block_model,
+    get_label_model,
     get_transaction_model,
 )
 from moonstreamdb.db import yield_db_session, yield_db_session_ctx
@@ -13,16 +20,20 @@ from moonstreamdb.models import (
     EthereumBlock,
     EthereumTransaction,
 )
-from psycopg2.errors import UniqueViolation  # type: ignore
-from sqlalchemy import Column, desc, func
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import Column, desc, func, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Query, Session
 from tqdm import tqdm
 from web3 import HTTPProvider, IPCProvider, Web3
+from web3._utils.method_formatters import PYTHONIC_RESULT_FORMATTERS
+from web3._utils.request import make_post_request
+from web3.datastructures import AttributeDict
+from web3.exceptions import BlockNotFound, TransactionNotFound
 from web3.middleware import geth_poa_middleware
-from web3.types import BlockData
+from web3.types import BlockData, RPCEndpoint
 
 from .data import DateRange
+from .provider_pool import PooledHTTPProvider
 from .settings import (
     MOONSTREAM_CRAWL_WORKERS,
     MOONSTREAM_ETHEREUM_WEB3_PROVIDER_URI,
@@ -43,40 +54,136 @@ class BlockCrawlError(Exception):
     """
 
 
+class BatchRequestError(Exception):
+    """
+    Raised when node rejects or fails to process JSON-RPC batch request.
+    """
+
+
+class BatchRequestRetryableError(BatchRequestError):
+    """
+    Raised when node failed to process batch request for a reason not related
+    to batching, e.g. rate limit or overload, the same batch could be retried.
+    """
+
+
+# JSON-RPC error codes and parts of messages of nodes which do not support
+# or disabled batch requests
+BATCH_REJECTED_ERROR_CODES = [-32600]
+BATCH_REJECTED_ERROR_MESSAGES = ["batch"]
+
+# Seconds during which batches are not sent to endpoint which rejected them
+BATCH_REJECTION_SECONDS = 600
+
+# Endpoints which rejected JSON-RPC batch requests with time of rejection
+_batch_rejected_endpoints: Dict[str, float] = {}
+
+
+def _is_batch_rejection(response: Any) -> bool:
+    if not isinstance(response, dict) or not isinstance(response.get("error"), dict):
+        return False
+    error = response["error"]
+    if error.get("code") in BATCH_REJECTED_ERROR_CODES:
+        return True
+    message = str(error.get("message", "")).lower()
+    return any(part in message for part in BATCH_REJECTED_ERROR_MESSAGES)
+
+
+def _get_batch_rejected_endpoints() -> Set[str]:
+    rejected_after = time.time() - BATCH_REJECTION_SECONDS
+    return {
+        endpoint_uri
+        for endpoint_uri, rejected_at in list(_batch_rejected_endpoints.items())
+        if rejected_at > rejected_after
+    }
+
+
+def get_web3_uri(blockchain_type: AvailableBlockchainType) -> str:
+    """
+    Default web3 provider URI for blockchain from environment variables,
+    it could contain several comma separated URIs to use as provider pool.
+    """
+    if blockchain_type == AvailableBlockchainType.ETHEREUM:
+        web3_uri = MOONSTREAM_ETHEREUM_WEB3_PROVIDER_URI
+    elif blockchain_type == AvailableBlockchainType.POLYGON:
+        web3_uri = MOONSTREAM_POLYGON_WEB3_PROVIDER_URI
+    elif blockchain_type == AvailableBlockchainType.MUMBAI:
+        web3_uri = MOONSTREAM_MUMBAI_WEB3_PROVIDER_URI
+    elif blockchain_type == AvailableBlockchainType.XDAI:
+        web3_uri = MOONSTREAM_XDAI_WEB3_PROVIDER_URI
+    else:
+        raise Exception("Wrong blockchain type provided for web3 URI")
+    return web3_uri
+
+
+def get_request_headers(access_id: Optional[UUID] = None) -> Optional[Dict[str, str]]:
+    """
+    Node balancer headers for requests to web3 provider.
+    """
+    if access_id is None:
+        return None
+    return {
+        NB_ACCESS_ID_HEADER: str(access_id),
+        NB_DATA_SOURCE_HEADER: "blockchain",
+        "Content-Type": "application/json",
+    }
+
+
+def get_result_formatter(
+    blockchain_type: AvailableBlockchainType, method: str
+) -> Callable[[Any], Any]:
+    """
+    Formatter for raw JSON-RPC result, the same as web3 applies to single calls.
+
+    For not Ethereum mainnet blocks extraData is renamed as geth_poa_middleware does.
+    """
+    result_formatter = PYTHONIC_RESULT_FORMATTERS.get(
+        RPCEndpoint(method), lambda result: result
+    )
+    if blockchain_type == AvailableBlockchainType.ETHEREUM or method not in {
+        "eth_getBlockByNumber",
+        "eth_getBlockByHash",
+    }:
+        return result_formatter
+
+    def poa_block_formatter(block: Dict[str, Any]) -> Any:
+        if "extraData" in block:
+            block["proofOfAuthorityData"] = block.pop("extraData")
+        return result_formatter(block)
+
+    return poa_block_formatter
+
+
+def get_web3_provider(
+    web3_uri: str, request_kwargs: Optional[Any] = None
+) -> Union[IPCProvider, HTTPProvider]:
+    """
+    Web3 provider for URI. Several comma separated HTTP URIs are combined
+    into PooledHTTPProvider with health scoring and failover between them.
+    """
+    web3_uris = [uri.strip() for uri in web3_uri.split(",") if uri.strip()]
+    if len(web3_uris) > 1:
+        return PooledHTTPProvider(web3_uris, request_kwargs=request_kwargs)
+
+    if web3_uri.startswith("http://") or web3_uri.startswith("https://"):
+        return Web3.HTTPProvider(web3_uri, request_kwargs=request_kwargs)
+    return Web3.IPCProvider(web3_uri)
+
+
 def connect(
     blockchain_type: AvailableBlockchainType,
     web3_uri: Optional[str] = None,
     access_id: Optional[UUID] = None,
 ) -> Web3:
-    web3_provider: Union[IPCProvider, HTTPProvider] = Web3.IPCProvider()
-
     request_kwargs: Any = None
-    if access_id is not None:
-        request_kwargs = {
-            "headers": {
-                NB_ACCESS_ID_HEADER: str(access_id),
-                NB_DATA_SOURCE_HEADER: "blockchain",
-                "Content-Type": "application/json",
-            }
-        }
+    request_headers = get_request_headers(access_id)
+    if request_headers is not None:
+        request_kwargs = {"headers": request_headers}
 
     if web3_uri is None:
-        if blockchain_type == AvailableBlockchainType.ETHEREUM:
-            web3_uri = MOONSTREAM_ETHEREUM_WEB3_PROVIDER_URI
-        elif blockchain_type == AvailableBlockchainType.POLYGON:
-            web3_uri = MOONSTREAM_POLYGON_WEB3_PROVIDER_URI
-        elif blockchain_type == AvailableBlockchainType.MUMBAI:
-            web3_uri = MOONSTREAM_MUMBAI_WEB3_PROVIDER_URI
-        elif blockchain_type == AvailableBlockchainType.XDAI:
-            web3_uri = MOONSTREAM_XDAI_WEB3_PROVIDER_URI
-        else:
-            raise Exception("Wrong blockchain type provided for web3 URI")
+        web3_uri = get_web3_uri(blockchain_type)
 
-    if web3_uri.startswith("http://") or web3_uri.startswith("https://"):
-        web3_provider = Web3.HTTPProvider(web3_uri, request_kwargs=request_kwargs)
-    else:
-        web3_provider = Web3.IPCProvider(web3_uri)
-    web3_client = Web3(web3_provider)
+    web3_client = Web3(get_web3_provider(web3_uri, request_kwargs=request_kwargs))
 
     # Inject --dev middleware if it is not Ethereum mainnet
     # Docs: https://web3py.readthedocs.io/en/stable/middleware.html#geth-style-proof-of-authority
@@ -86,45 +193,332 @@ def connect(
     return web3_client
 
 
-def add_block(db_session, block: Any, blockchain_type: AvailableBlockchainType) -> None:
+def make_batch_request(
+    web3_client: Web3,
+    method: str,
+    params_list: List[List[Any]],
+    result_formatter: Optional[Callable[[Any], Any]] = None,
+) -> List[Any]:
     """
-    Add block if doesn't presented in database.
+    Send several calls of the same JSON-RPC method in one batch request.
+
+    Results are returned in the order of params_list and formatted the same way as
+    web3 formats results of single calls, None results are kept as is.
+
+    Raises BatchRequestError if provider is not HTTP or node rejected batch,
+    BatchRequestRetryableError if node failed to process it for other reason.
+    Endpoint which explicitly rejected batch request is not sent batches for
+    BATCH_REJECTION_SECONDS.
+    """
+    provider = web3_client.provider
+    if not isinstance(provider, HTTPProvider):
+        raise BatchRequestError(
+            f"Batch requests are supported only by HTTP provider, got {type(provider)}"
+        )
+    rejected_endpoints = _get_batch_rejected_endpoints()
+    if (
+        not isinstance(provider, PooledHTTPProvider)
+        and provider.endpoint_uri in rejected_endpoints
+    ):
+        raise BatchRequestError("Node recently rejected batch request")
+
+    payload = [
+        {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+        for request_id, params in enumerate(params_list)
+    ]
+    request_data = json.dumps(payload).encode("utf-8")
+    endpoint_uri = str(provider.endpoint_uri)
+    try:
+        if isinstance(provider, PooledHTTPProvider):
+            endpoint_uri, raw_response = provider.post(
+                request_data, exclude=rejected_endpoints
+            )
+        else:
+            raw_response = make_post_request(
+                URI(endpoint_uri), request_data, **provider.get_request_kwargs()
+            )
+        response = json.loads(raw_response)
+    except Exception as err:
+        raise BatchRequestRetryableError(f"Batch request failed: {repr(err)}")
+
+    if not isinstance(response, list):
+        if _is_batch_rejection(response):
+            _batch_rejected_endpoints[endpoint_uri] = time.time()
+            raise BatchRequestError(f"Node rejected batch request: {response}")
+        raise BatchRequestRetryableError(f"Batch request failed: {response}")
+
+    if result_formatter is None:
+        result_formatter = PYTHONIC_RESULT_FORMATTERS.get(
+            RPCEndpoint(method), lambda result: result
+        )
+
+    results: List[Any] = [None] * len(params_list)
+    for item in response:
+        if item.get("error") is not None:
+            raise BatchRequestError(
+                f"Error in batch response for {method}: {item['error']}"
+            )
+        result = item.get("result")
+        if result is not None:
+            result = AttributeDict.recursive(result_formatter(result))
+        results[item["id"]] = result
+
+    return results
+
+
+def get_blocks(
+    web3_client: Web3,
+    blockchain_type: AvailableBlockchainType,
+    blocks_numbers: List[int],
+    full_transactions: bool = False,
+) -> List[BlockData]:
+    """
+    Fetch blocks with one JSON-RPC batch request.
+
+    If node rejects batch requests, falls back to one eth_getBlockByNumber call per block.
+    """
+    if len(blocks_numbers) > 1:
+        try:
+            blocks = make_batch_request(
+                web3_client,
+                "eth_getBlockByNumber",
+                [
+                    [hex(block_number), full_transactions]
+                    for block_number in blocks_numbers
+                ],
+                result_formatter=get_result_formatter(
+                    blockchain_type, "eth_getBlockByNumber"
+                ),
+            )
+            for block_number, block in zip(blocks_numbers, blocks):
+                if block is None:
+                    raise BlockNotFound(f"Block with id: {block_number} not found.")
+            return blocks
+        except BatchRequestError as err:
+            logger.warning(f"Falling back to single block requests: {err}")
+
+    return [
+        web3_client.eth.get_block(block_number, full_transactions=full_transactions)
+        for block_number in blocks_numbers
+    ]
+
+
+def _get_by_transactions_hashes(
+    web3_client: Web3,
+    method: str,
+    get_one: Callable[[HexStr], Any],
+    transactions_hashes: List[str],
+    batch_size: int,
+    workers: int = 1,
+    skip_missing: bool = False,
+) -> Dict[str, Any]:
+    """
+    Call JSON-RPC method for each transaction hash with batch requests of batch_size
+    calls, falling back to get_one calls if node rejects batch requests.
+    With workers > 1 batch requests are sent concurrently from thread pool.
+
+    Raises BlockCrawlError for not found results, unless skip_missing is set,
+    then such transactions are left out of result.
+    """
+
+    def get_single(transaction_hash: str) -> Any:
+        try:
+            return get_one(HexStr(transaction_hash))
+        except TransactionNotFound:
+            if skip_missing:
+                return None
+            raise
+
+    def get_batch(batch_hashes: List[str]) -> List[Any]:
+        try:
+            return make_batch_request(
+                web3_client,
+                method,
+                [[transaction_hash] for transaction_hash in batch_hashes],
+            )
+        except BatchRequestError as err:
+            logger.warning(f"Falling back to single {method} requests: {err}")
+            return [get_single(transaction_hash) for transaction_hash in batch_hashes]
+
+    batches = [
+        transactions_hashes[i : i + batch_size]
+        for i in range(0, len(transactions_hashes), batch_size)
+    ]
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            batches_results = list(executor.map(get_batch, batches))
+    else:
+        batches_results = [get_batch(batch_hashes) for batch_hashes in batches]
+
+    results: Dict[str, Any] = {}
+    for batch_hashes, batch_results in zip(batches, batches_results):
+        for transaction_hash, result in zip(batch_hashes, batch_results):
+            if result is None:
+                if skip_missing:
+                    continue
+                raise BlockCrawlError(
+                    f"{method} result for transaction {transaction_hash} not found"
+                )
+            results[transaction_hash] = result
+    return results
+
+
+def get_transactions(
+    web3_client: Web3,
+    transactions_hashes: List[str],
+    batch_size: int = 100,
+) -> Dict[str, Any]:
+    """
+    Fetch transactions with JSON-RPC batch requests of batch_size calls.
+
+    Returns transactions by hash. If node rejects batch requests,
+    falls back to one eth_getTransactionByHash call per transaction.
+    """
+    return _get_by_transactions_hashes(
+        web3_client,
+        "eth_getTransactionByHash",
+        web3_client.eth.get_transaction,
+        transactions_hashes,
+        batch_size,
+    )
+
+
+def get_transaction_receipts(
+    web3_client: Web3,
+    transactions_hashes: List[str],
+    batch_size: int = 100,
+    workers: int = 1,
+    skip_missing: bool = False,
+) -> Dict[str, Any]:
+    """
+    Fetch receipts of transactions with JSON-RPC batch requests of batch_size calls,
+    up to workers batch requests are sent concurrently.
+
+    Returns receipts by transaction hash. If node rejects batch requests,
+    falls back to one eth_getTransactionReceipt call per transaction.
+    With skip_missing, transactions without receipt are not in result instead
+    of raising BlockCrawlError.
+    """
+    return _get_by_transactions_hashes(
+        web3_client,
+        "eth_getTransactionReceipt",
+        web3_client.eth.get_transaction_receipt,
+        transactions_hashes,
+        batch_size,
+        workers,
+        skip_missing,
+    )
+
+
+def get_blocks_receipts(web3_client: Web3, blocks_numbers: List[int]) -> Dict[str, Any]:
+    """
+    Fetch all receipts of blocks with one batch of eth_getBlockReceipts calls.
+
+    eth_getBlockReceipts is not supported by all nodes, raises BatchRequestError
+    if node does not support it or rejects batch requests.
+    """
+    receipt_formatter = PYTHONIC_RESULT_FORMATTERS[
+        RPCEndpoint("eth_getTransactionReceipt")
+    ]
+    blocks_receipts = make_batch_request(
+        web3_client,
+        "eth_getBlockReceipts",
+        [[hex(block_number)] for block_number in blocks_numbers],
+        result_formatter=lambda receipts: [
+            receipt_formatter(receipt) for receipt in receipts
+        ],
+    )
+
+    receipts: Dict[str, Any] = {}
+    for block_number, block_receipts in zip(blocks_numbers, blocks_receipts):
+        if block_receipts is None:
+            raise BatchRequestError(f"Receipts of block {block_number} not found")
+        for receipt in block_receipts:
+            receipts[receipt.transactionHash.hex()] = receipt
+    return receipts
+
+
+def block_to_row(
+    block: Any, blockchain_type: AvailableBlockchainType
+) -> Dict[str, Any]:
+    """
+    Prepare block columns for database insert.
 
     block: web3.types.BlockData
 
     - BlockData.extraData - doesn't exist at Polygon mainnet
     - Nonce - doesn't exist at XDai blockchain
     """
-    block_model = get_block_model(blockchain_type)
-
-    block_obj = block_model(
-        block_number=block.number,
-        difficulty=block.difficulty,
-        extra_data=None
+    block_row = {
+        "block_number": block.number,
+        "difficulty": block.difficulty,
+        "extra_data": None
         if block.get("extraData", None) is None
         else block.get("extraData").hex(),
-        gas_limit=block.gasLimit,
-        gas_used=block.gasUsed,
-        base_fee_per_gas=block.get("baseFeePerGas", None),
-        hash=block.hash.hex(),
-        logs_bloom=block.logsBloom.hex(),
-        miner=block.miner,
-        nonce=None if block.get("nonce", None) is None else block.get("nonce").hex(),
-        parent_hash=block.parentHash.hex(),
-        receipt_root=block.get("receiptsRoot", ""),
-        uncles=block.sha3Uncles.hex(),
-        size=block.size,
-        state_root=block.stateRoot.hex(),
-        timestamp=block.timestamp,
-        total_difficulty=block.totalDifficulty,
-        transactions_root=block.transactionsRoot.hex(),
-    )
+        "gas_limit": block.gasLimit,
+        "gas_used": block.gasUsed,
+        "base_fee_per_gas": block.get("baseFeePerGas", None),
+        "hash": block.hash.hex(),
+        "logs_bloom": block.logsBloom.hex(),
+        "miner": block.miner,
+        "nonce": None if block.get("nonce", None) is None else block.get("nonce").hex(),
+        "parent_hash": block.parentHash.hex(),
+        "receipt_root": block.get("receiptsRoot", ""),
+        "uncles": block.sha3Uncles.hex(),
+        "size": block.size,
+        "state_root": block.stateRoot.hex(),
+        "timestamp": block.timestamp,
+        "total_difficulty": block.totalDifficulty,
+        "transactions_root": block.transactionsRoot.hex(),
+    }
     if blockchain_type == AvailableBlockchainType.XDAI:
-        block_obj.author = block.author
-        block_obj.signature = block.signature
-        block_obj.step = block.step
+        block_row["author"] = block.author
+        block_row["signature"] = block.signature
+        block_row["step"] = block.step
+
+    return block_row
 
-    db_session.add(block_obj)
+
+def transaction_to_row(tx: Any) -> Dict[str, Any]:
+    """
+    Prepare transaction columns for database insert.
+
+    tx: web3.types.TxData
+    """
+    return {
+        "hash": tx.hash.hex(),
+        "block_number": tx.blockNumber,
+        "from_address": tx["from"],
+        "to_address": tx.to,
+        "gas": tx.gas,
+        "gas_price": tx.gasPrice,
+        "max_fee_per_gas": tx.get("maxFeePerGas", None),
+        "max_priority_fee_per_gas": tx.get("maxPriorityFeePerGas", None),
+        "input": tx.input,
+        "nonce": tx.nonce,
+        "transaction_index": tx.transactionIndex,
+        "transaction_type": int(tx["type"], 0) if tx["type"] is not None else None,
+        "value": tx.value,
+    }
+
+
+def block_transactions_to_rows(block: Any) -> List[Dict[str, Any]]:
+    """
+    Prepare block transactions columns for database insert.
+
+    block: web3.types.BlockData
+    """
+    return [transaction_to_row(tx) for tx in block.transactions]
+
+
+def add_block(db_session, block: Any, blockchain_type: AvailableBlockchainType) -> None:
+    """
+    Add block if doesn't presented in database.
+
+    block: web3.types.BlockData
+    """
+    block_model = get_block_model(blockchain_type)
+    db_session.add(block_model(**block_to_row(block, blockchain_type)))
 
 
 def add_block_transactions(
@@ -136,24 +530,39 @@ def add_block_transactions(
     block: web3.types.BlockData
     """
     transaction_model = get_transaction_model(blockchain_type)
-    for tx in block.transactions:
-        tx_obj = transaction_model(
-            hash=tx.hash.hex(),
-            block_number=block.number,
-            from_address=tx["from"],
-            to_address=tx.to,
-            gas=tx.gas,
-            gas_price=tx.gasPrice,
-            max_fee_per_gas=tx.get("maxFeePerGas", None),
-            max_priority_fee_per_gas=tx.get("maxPriorityFeePerGas", None),
-            input=tx.input,
-            nonce=tx.nonce,
-            transaction_index=tx.transactionIndex,
-            transaction_type=int(tx["type"], 0) if tx["type"] is not None else None,
-            value=tx.value,
-        )
+    for tx_row in block_transactions_to_rows(block):
+        db_session.add(transaction_model(**tx_row))
 
-        db_session.add(tx_obj)
+
+def insert_blocks_rows(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    blocks_rows: List[Dict[str, Any]],
+    transactions_rows: List[Dict[str, Any]],
+    insert_batch_size: int = 1000,
+) -> None:
+    """
+    Write blocks and transactions with multi-row INSERT ... ON CONFLICT DO NOTHING.
+
+    Blocks and transactions which already exist in database are skipped,
+    the same as UniqueViolation skip for one by one inserts.
+    Session is not committed.
+    """
+    block_model = get_block_model(blockchain_type)
+    transaction_model = get_transaction_model(blockchain_type)
+
+    for i in range(0, len(blocks_rows), insert_batch_size):
+        db_session.execute(
+            insert(block_model.__table__)
+            .values(blocks_rows[i : i + insert_batch_size])
+            .on_conflict_do_nothing(index_elements=["block_number"])
+        )
+    for i in range(0, len(transactions_rows), insert_batch_size):
+        db_session.execute(
+            insert(transaction_model.__table__)
+            .values(transactions_rows[i : i + insert_batch_size])
+            .on_conflict_do_nothing(index_elements=["hash"])
+        )
 
 
 def get_latest_blocks(
@@ -191,57 +600,123 @@ def crawl_blocks(
     blocks_numbers: List[int],
     with_transactions: bool = False,
     access_id: Optional[UUID] = None,
+    rpc_batch_size: int = 1,
+    flush_size: int = 100,
 ) -> None:
     """
     Open database and geth sessions and fetch block data from blockchain.
+
+    If rpc_batch_size > 1, blocks are fetched by chunks with JSON-RPC batch requests.
+    Fetched blocks are buffered and written to database by flush_size blocks
+    in one commit.
     """
+    assert rpc_batch_size > 0, "rpc_batch_size must be greater than 0"
+    assert flush_size > 0, "flush_size must be greater than 0"
+
     web3_client = connect(blockchain_type, access_id=access_id)
     with yield_db_session_ctx() as db_session:
-        pbar = tqdm(total=len(blocks_numbers))
-        for block_number in blocks_numbers:
-            pbar.set_description(
-                f"Crawling block {block_number} with txs: {with_transactions}"
+        blocks_rows: List[Dict[str, Any]] = []
+        transactions_rows: List[Dict[str, Any]] = []
+
+        def flush() -> None:
+            if not blocks_rows:
+                return
+            blocks_range = (
+                f"{blocks_rows[0]['block_number']}-{blocks_rows[-1]['block_number']}"
             )
             try:
-                block: BlockData = web3_client.eth.get_block(
-                    block_number, full_transactions=with_transactions
+                insert_blocks_rows(
+                    db_session, blockchain_type, blocks_rows, transactions_rows
                 )
-                add_block(db_session, block, blockchain_type)
-
-                if with_transactions:
-                    add_block_transactions(db_session, block, blockchain_type)
-
                 db_session.commit()
-            except IntegrityError as err:
-                assert isinstance(err.orig, UniqueViolation)
-                logger.warning(
-                    "UniqueViolation error occurred, it means block already exists"
-                )
             except Exception as err:
                 db_session.rollback()
-                message = f"Error adding block (number={block_number}) to database:\n{repr(err)}"
+                message = f"Error adding blocks (numbers={blocks_range}) to database:\n{repr(err)}"
                 raise BlockCrawlError(message)
             except:
                 db_session.rollback()
                 logger.error(
-                    f"Interrupted while adding block (number={block_number}) to database."
+                    f"Interrupted while adding blocks (numbers={blocks_range}) to database."
                 )
                 raise
-            pbar.update()
+            pbar.update(len(blocks_rows))
+            blocks_rows.clear()
+            transactions_rows.clear()
+
+        pbar = tqdm(total=len(blocks_numbers))
+        for i in range(0, len(blocks_numbers), rpc_batch_size):
+            blocks_numbers_chunk = blocks_numbers[i : i + rpc_batch_size]
+            pbar.set_description(
+                f"Crawling blocks {blocks_numbers_chunk[0]}-{blocks_numbers_chunk[-1]} with txs: {with_transactions}"
+            )
+            try:
+                blocks = get_blocks(
+                    web3_client,
+                    blockchain_type,
+                    blocks_numbers_chunk,
+                    full_transactions=with_transactions,
+                )
+            except Exception as err:
+                message = f"Error fetching blocks (numbers={blocks_numbers_chunk[0]}-{blocks_numbers_chunk[-1]}) from blockchain:\n{repr(err)}"
+                raise BlockCrawlError(message)
+
+            for block in blocks:
+                blocks_rows.append(block_to_row(block, blockchain_type))
+                if with_transactions:
+                    transactions_rows.extend(block_transactions_to_rows(block))
+
+            if len(blocks_rows) >= flush_size:
+                flush()
+        flush()
         pbar.close()
 
 
+def get_blocks_transactions_count(
+    web3_client: Web3,
+    blocks_numbers: List[int],
+    rpc_batch_size: int = 100,
+) -> Dict[int, int]:
+    """
+    Fetch number of transactions in blocks with eth_getBlockTransactionCountByNumber
+    JSON-RPC batch requests.
+
+    If node rejects batch requests, falls back to one call per block.
+    """
+    transactions_count: Dict[int, int] = {}
+    for i in range(0, len(blocks_numbers), rpc_batch_size):
+        blocks_numbers_chunk = blocks_numbers[i : i + rpc_batch_size]
+        try:
+            counts = make_batch_request(
+                web3_client,
+                "eth_getBlockTransactionCountByNumber",
+                [[hex(block_number)] for block_number in blocks_numbers_chunk],
+            )
+        except BatchRequestError as err:
+            logger.warning(f"Falling back to single transaction count requests: {err}")
+            counts = [
+                web3_client.eth.get_block_transaction_count(block_number)
+                for block_number in blocks_numbers_chunk
+            ]
+        for block_number, count in zip(blocks_numbers_chunk, counts):
+            if count is None:
+                raise BlockNotFound(f"Block with id: {block_number} not found.")
+            transactions_count[block_number] = count
+    return transactions_count
+
+
 def check_missing_blocks(
     blockchain_type: AvailableBlockchainType,
     blocks_numbers: List[int],
     notransactions=False,
     access_id: Optional[UUID] = None,
+    rpc_batch_size: int = 100,
 ) -> List[int]:
     """
-    Query block from postgres. If block does not presented in database,
-    add to missing blocks numbers list.
+    Find block numbers which are not presented in database with generate_series
+    over blocks range.
     If arg notransactions=False, it checks correct number of transactions in
-    database according to blockchain.
+    database according to blockchain, blocks with wrong number of transactions
+    are deleted and added to missing blocks numbers list.
     """
     bottom_block = min(blocks_numbers[-1], blocks_numbers[0])
     top_block = max(blocks_numbers[-1], blocks_numbers[0])
@@ -249,20 +724,26 @@ def check_missing_blocks(
     block_model = get_block_model(blockchain_type)
     transaction_model = get_transaction_model(blockchain_type)
     with yield_db_session_ctx() as db_session:
-        if notransactions:
-            blocks_exist_raw_query = (
-                db_session.query(block_model.block_number)
-                .filter(block_model.block_number >= bottom_block)
-                .filter(block_model.block_number <= top_block)
-            )
-            blocks_exist = [[block[0]] for block in blocks_exist_raw_query.all()]
-        else:
-            corrupted_blocks = []
-            blocks_exist_raw_query = (
+        blocks_table = block_model.__tablename__
+        missing_blocks_raw = db_session.execute(
+            text(
+                f"""
+                SELECT series.block_number
+                FROM generate_series(:bottom_block, :top_block) AS series(block_number)
+                LEFT JOIN {blocks_table} ON {blocks_table}.block_number = series.block_number
+                WHERE {blocks_table}.block_number IS NULL
+                """
+            ),
+            {"bottom_block": bottom_block, "top_block": top_block},
+        )
+        missing_blocks = {row[0] for row in missing_blocks_raw}
+
+        if not notransactions:
+            blocks_transactions_count_query = (
                 db_session.query(
                     block_model.block_number, func.count(transaction_model.hash)
                 )
-                .join(
+                .outerjoin(
                     transaction_model,
                     transaction_model.block_number == block_model.block_number,
                 )
@@ -270,103 +751,432 @@ def check_missing_blocks(
                 .filter(block_model.block_number <= top_block)
                 .group_by(block_model.block_number)
             )
-            blocks_exist = [
-                [block[0], block[1]] for block in blocks_exist_raw_query.all()
-            ]
+            db_transactions_count = {
+                block_number: count
+                for block_number, count in blocks_transactions_count_query.all()
+            }
 
             web3_client = connect(blockchain_type, access_id=access_id)
+            logger.info(f"Checking txs in {len(db_transactions_count)} blocks")
+            transactions_count = get_blocks_transactions_count(
+                web3_client,
+                sorted(db_transactions_count.keys()),
+                rpc_batch_size=rpc_batch_size,
+            )
 
-            blocks_exist_len = len(blocks_exist)
-            pbar = tqdm(total=blocks_exist_len)
-            pbar.set_description(f"Checking txs in {blocks_exist_len} blocks")
-
-            for i, block_in_db in enumerate(blocks_exist):
-                block = web3_client.eth.get_block(
-                    block_in_db[0], full_transactions=True
-                )
-                if len(block.transactions) != block_in_db[1]:  # type: ignore
-                    corrupted_blocks.append(block_in_db[0])
-                    # Delete existing corrupted block and add to missing list
-                    del_block = (
-                        db_session.query(block_model)
-                        .filter(block_model.block_number == block_in_db[0])
-                        .one()
-                    )
-                    db_session.delete(del_block)
-                    del blocks_exist[i]
-                pbar.update()
-            pbar.close()
-
-            db_session.commit()
-
+            corrupted_blocks = [
+                block_number
+                for block_number, count in db_transactions_count.items()
+                if transactions_count[block_number] != count
+            ]
             corrupted_blocks_len = len(corrupted_blocks)
             if corrupted_blocks_len > 0:
+                # Delete existing corrupted blocks with transactions (cascade)
+                # and add to missing list
+                db_session.query(block_model).filter(
+                    block_model.block_number.in_(corrupted_blocks)
+                ).delete(synchronize_session=False)
+                db_session.commit()
+                missing_blocks.update(corrupted_blocks)
+
                 logger.warning(
                     f"Removed {corrupted_blocks_len} corrupted blocks: {corrupted_blocks if corrupted_blocks_len <= 10 else '...'}"
                 )
 
     missing_blocks_numbers = [
-        block for block in blocks_numbers if block not in [i[0] for i in blocks_exist]
+        block for block in blocks_numbers if block in missing_blocks
     ]
     return missing_blocks_numbers
 
 
+def find_fork_block_number(
+    db_session: Session,
+    web3_client: Web3,
+    blockchain_type: AvailableBlockchainType,
+    block_number: int,
+    max_depth: int = 128,
+) -> int:
+    """
+    Compare stored blocks hashes with blockchain node from block_number
+    and max_depth blocks behind.
+
+    Returns first block number which hash differs from node (fork block),
+    block_number + 1 if chain is consistent.
+    Raises BlockCrawlError if reorg is deeper than max_depth.
+    """
+    assert max_depth > 0, "max_depth must be greater than 0"
+
+    block_model = get_block_model(blockchain_type)
+    bottom_block = max(block_number - max_depth + 1, 0)
+    stored_hashes = {
+        stored_block_number: stored_hash
+        for stored_block_number, stored_hash in db_session.query(
+            block_model.block_number, block_model.hash
+        )
+        .filter(block_model.block_number >= bottom_block)
+        .filter(block_model.block_number <= block_number)
+        .all()
+    }
+    node_blocks = get_blocks(
+        web3_client,
+        blockchain_type,
+        list(range(bottom_block, block_number + 1)),
+    )
+
+    fork_block_number = block_number + 1
+    for node_block in reversed(node_blocks):
+        stored_hash = stored_hashes.get(node_block["number"])
+        if (
+            stored_hash is None
+            or stored_hash.lower() == node_block["hash"].hex().lower()
+        ):
+            return fork_block_number
+        fork_block_number = node_block["number"]
+
+    raise BlockCrawlError(
+        f"Reorg is deeper than {max_depth} blocks from block {block_number}"
+    )
+
+
+def rollback_blocks(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    from_block: int,
+) -> Tuple[int, int]:
+    """
+    Delete orphaned blocks starting from from_block with their transactions (cascade)
+    and labels. Session is not committed, crawlers progress should be rolled back
+    with checkpoints.rollback_crawlers_progress in the same transaction,
+    so label crawlers crawl deleted labels again.
+
+    Returns number of deleted blocks and labels.
+    """
+    block_model = get_block_model(blockchain_type)
+    label_model = get_label_model(blockchain_type)
+
+    deleted_labels = (
+        db_session.query(label_model)
+        .filter(label_model.block_number >= from_block)
+        .delete(synchronize_session=False)
+    )
+    deleted_blocks = (
+        db_session.query(block_model)
+        .filter(block_model.block_number >= from_block)
+        .delete(synchronize_session=False)
+    )
+    return deleted_blocks, deleted_labels
+
+
+@dataclass
+class PipelineStageStats:
+    """
+    Throughput counters of one blocks crawl pipeline stage.
+
+    blocked_seconds - time stage waited for free space in the next stage queue (backpressure).
+    """
+
+    name: str
+    workers: int
+    blocks: int = 0
+    busy_seconds: float = 0
+    blocked_seconds: float = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, blocks: int, busy_seconds: float, blocked_seconds: float) -> None:
+        with self.lock:
+            self.blocks += blocks
+            self.busy_seconds += busy_seconds
+            self.blocked_seconds += blocked_seconds
+
+    def to_dict(self, elapsed_seconds: float) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "blocks": self.blocks,
+            "blocks_per_second": round(self.blocks / elapsed_seconds, 2)
+            if elapsed_seconds > 0
+            else 0,
+            "busy_seconds": round(self.busy_seconds, 2),
+            "blocked_seconds": round(self.blocked_seconds, 2),
+        }
+
+
+class BlocksCrawlPipeline:
+    """
+    Crawls blocks in stages connected with bounded queues:
+    fetchers (JSON-RPC) -> decoder (database rows) -> writers (bulk inserts).
+
+    Network and database work overlap, when writers are slower than fetchers
+    queues fill up and fetchers wait (backpressure).
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        blockchain_type: AvailableBlockchainType,
+        with_transactions: bool = False,
+        access_id: Optional[UUID] = None,
+        fetchers: int = MOONSTREAM_CRAWL_WORKERS,
+        writers: int = 1,
+        rpc_batch_size: int = 1,
+        flush_size: int = 100,
+        queue_size: int = 10,
+    ) -> None:
+        assert fetchers > 0, "fetchers must be greater than 0"
+        assert writers > 0, "writers must be greater than 0"
+        assert rpc_batch_size > 0, "rpc_batch_size must be greater than 0"
+        assert flush_size > 0, "flush_size must be greater than 0"
+        assert queue_size > 0, "queue_size must be greater than 0"
+
+        self.blockchain_type = blockchain_type
+        self.with_transactions = with_transactions
+        self.access_id = access_id
+        self.rpc_batch_size = rpc_batch_size
+        self.flush_size = flush_size
+
+        self.fetch_queue: queue.Queue = queue.Queue()
+        self.decode_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.write_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self.fetch_stats = PipelineStageStats(name="fetch", workers=fetchers)
+        self.decode_stats = PipelineStageStats(name="decode", workers=1)
+        self.write_stats = PipelineStageStats(name="write", workers=writers)
+
+        self.errors: List[BaseException] = []
+        self.stop_event = threading.Event()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def _put(self, target_queue: queue.Queue, item: Any) -> float:
+        """
+        Put item to bounded queue, returns time spent waiting for free space.
+        """
+        started_at = time.time()
+        while not self.stop_event.is_set():
+            try:
+                target_queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+        return time.time() - started_at
+
+    def _get(self, source_queue: queue.Queue) -> Any:
+        while not self.stop_event.is_set():
+            try:
+                return source_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+        return self._STOP
+
+    def _fail(self, error: BaseException) -> None:
+        self.errors.append(error)
+        self.stop_event.set()
+
+    def _fetcher(self) -> None:
+        try:
+            web3_client = connect(self.blockchain_type, access_id=self.access_id)
+            while not self.stop_event.is_set():
+                try:
+                    blocks_numbers_chunk = self.fetch_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                started_at = time.time()
+                try:
+                    blocks = get_blocks(
+                        web3_client,
+                        self.blockchain_type,
+                        blocks_numbers_chunk,
+                        full_transactions=self.with_transactions,
+                    )
+                except Exception as err:
+                    message = f"Error fetching blocks (numbers={blocks_numbers_chunk[0]}-{blocks_numbers_chunk[-1]}) from blockchain:\n{repr(err)}"
+                    raise BlockCrawlError(message)
+                busy_seconds = time.time() - started_at
+
+                blocked_seconds = self._put(self.decode_queue, blocks)
+                self.fetch_stats.record(len(blocks), busy_seconds, blocked_seconds)
+        except BaseException as err:
+            self._fail(err)
+        finally:
+            self._put(self.decode_queue, self._STOP)
+
+    def _decoder(self, fetchers: int) -> None:
+        stopped_fetchers = 0
+        try:
+            while stopped_fetchers < fetchers:
+                blocks = self._get(self.decode_queue)
+                if blocks is self._STOP:
+                    stopped_fetchers += 1
+                    continue
+
+                started_at = time.time()
+                blocks_rows = [
+                    block_to_row(block, self.blockchain_type) for block in blocks
+                ]
+                transactions_rows: List[Dict[str, Any]] = []
+                if self.with_transactions:
+                    for block in blocks:
+                        transactions_rows.extend(block_transactions_to_rows(block))
+                busy_seconds = time.time() - started_at
+
+                blocked_seconds = self._put(
+                    self.write_queue, (blocks_rows, transactions_rows)
+                )
+                self.decode_stats.record(len(blocks), busy_seconds, blocked_seconds)
+        except BaseException as err:
+            self._fail(err)
+        finally:
+            for _ in range(self.write_stats.workers):
+                self._put(self.write_queue, self._STOP)
+
+    def _writer(self) -> None:
+        try:
+            with yield_db_session_ctx() as db_session:
+                blocks_rows: List[Dict[str, Any]] = []
+                transactions_rows: List[Dict[str, Any]] = []
+
+                def flush() -> None:
+                    if not blocks_rows:
+                        return
+                    started_at = time.time()
+                    try:
+                        insert_blocks_rows(
+                            db_session,
+                            self.blockchain_type,
+                            blocks_rows,
+                            transactions_rows,
+                        )
+                        db_session.commit()
+                    except:
+                        db_session.rollback()
+                        raise
+                    self.write_stats.record(
+                        len(blocks_rows), time.time() - started_at, 0
+                    )
+                    blocks_rows.clear()
+                    transactions_rows.clear()
+
+                while True:
+                    rows = self._get(self.write_queue)
+                    if rows is self._STOP:
+                        break
+                    blocks_rows.extend(rows[0])
+                    transactions_rows.extend(rows[1])
+                    if len(blocks_rows) >= self.flush_size:
+                        flush()
+                if not self.stop_event.is_set():
+                    flush()
+        except BaseException as err:
+            self._fail(err)
+
+    def run(self, block_numbers_list: List[int]) -> None:
+        """
+        Crawl blocks and wait until all stages finished.
+
+        Raises BlockCrawlError with list of errors if any stage failed.
+        """
+        for i in range(0, len(block_numbers_list), self.rpc_batch_size):
+            self.fetch_queue.put(block_numbers_list[i : i + self.rpc_batch_size])
+
+        self.started_at = time.time()
+        threads = [
+            threading.Thread(target=self._fetcher)
+            for _ in range(self.fetch_stats.workers)
+        ]
+        threads.append(
+            threading.Thread(target=self._decoder, args=(self.fetch_stats.workers,))
+        )
+        threads.extend(
+            threading.Thread(target=self._writer)
+            for _ in range(self.write_stats.workers)
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished_at = time.time()
+
+        logger.info(f"Blocks crawl pipeline stats: {self.stats()}")
+
+        if len(self.errors) > 0:
+            error_messages = "\n".join([f"- {error}" for error in self.errors])
+            message = f"Error processing blocks in list:\n{error_messages}"
+            raise BlockCrawlError(message)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Per stage throughput counters and current queues fill.
+        """
+        if self.started_at is None:
+            elapsed_seconds = 0.0
+        else:
+            elapsed_seconds = (
+                self.finished_at if self.finished_at is not None else time.time()
+            ) - self.started_at
+        return {
+            "elapsed_seconds": round(elapsed_seconds, 2),
+            "decode_queue_size": self.decode_queue.qsize(),
+            "write_queue_size": self.write_queue.qsize(),
+            **{
+                stage_stats.name: stage_stats.to_dict(elapsed_seconds)
+                for stage_stats in [
+                    self.fetch_stats,
+                    self.decode_stats,
+                    self.write_stats,
+                ]
+            },
+        }
+
+
 def crawl_blocks_executor(
     blockchain_type: AvailableBlockchainType,
     block_numbers_list: List[int],
     with_transactions: bool = False,
     num_processes: int = MOONSTREAM_CRAWL_WORKERS,
     access_id: Optional[UUID] = None,
+    rpc_batch_size: int = 1,
+    flush_size: int = 100,
+    writers: int = 1,
 ) -> None:
     """
-    Execute crawler in processes.
+    Execute crawler in pipeline of fetcher, decoder and writer threads.
 
     Args:
     block_numbers_list - List of block numbers to add to database.
     with_transactions - If True, also adds transactions from those blocks to the ethereum_transactions table.
-    num_processes - Number of processes to use to feed blocks into database.
+    num_processes - Number of fetcher threads which request blocks from blockchain node.
+    rpc_batch_size - Number of blocks to fetch in one JSON-RPC batch request.
+    flush_size - Number of blocks to write to database in one commit.
+    writers - Number of writer threads with own database sessions.
 
     Returns nothing, but if there was an error processing the given blocks it raises an EthereumBlocksCrawlError.
     The error message is a list of all the things that went wrong in the crawl.
     """
-    errors: List[BaseException] = []
-
-    def record_error(f: Future) -> None:
-        error = f.exception()
-        if error is not None:
-            errors.append(error)
-
-    worker_indices = range(MOONSTREAM_CRAWL_WORKERS)
-    worker_job_lists: List[List[Any]] = [[] for _ in worker_indices]
-    for i, block_number in enumerate(block_numbers_list):
-        worker_job_lists[i % MOONSTREAM_CRAWL_WORKERS].append(block_number)
-
-    results: List[Future] = []
     if num_processes == 1:
         logger.warning("Executing block crawler in lazy mod")
         return crawl_blocks(
-            blockchain_type, block_numbers_list, with_transactions, access_id=access_id
+            blockchain_type,
+            block_numbers_list,
+            with_transactions,
+            access_id=access_id,
+            rpc_batch_size=rpc_batch_size,
+            flush_size=flush_size,
         )
-    else:
-        with ThreadPoolExecutor(max_workers=MOONSTREAM_CRAWL_WORKERS) as executor:
-            for worker in worker_indices:
-                block_chunk = worker_job_lists[worker]
-                logger.info(f"Spawned process for {len(block_chunk)} blocks")
-                result = executor.submit(
-                    crawl_blocks,
-                    blockchain_type,
-                    block_chunk,
-                    with_transactions,
-                    access_id,
-                )
-                result.add_done_callback(record_error)
-                results.append(result)
 
-        wait(results)
-        if len(errors) > 0:
-            error_messages = "\n".join([f"- {error}" for error in errors])
-            message = f"Error processing blocks in list:\n{error_messages}"
-            raise BlockCrawlError(message)
+    pipeline = BlocksCrawlPipeline(
+        blockchain_type=blockchain_type,
+        with_transactions=with_transactions,
+        access_id=access_id,
+        fetchers=num_processes,
+        writers=writers,
+        rpc_batch_size=rpc_batch_size,
+        flush_size=flush_size,
+    )
+    logger.info(
+        f"Spawned pipeline with {num_processes} fetchers and {writers} writers for {len(block_numbers_list)} blocks"
+    )
+    pipeline.run(block_numbers_list)
 
 
 def trending(
@@ -0,0 +1,348 @@
+"""
+Persistent crawling state of crawlers, stored in crawler_checkpoints table,
+and progress of parallel crawlers shards, stored in crawler_ranges table.
+"""
+import logging
+from typing import Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from moonstreamdb.blockchain import AvailableBlockchainType
+from moonstreamdb.models import CrawlerCheckpoint, CrawlerRange
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+BLOCKS_CRAWLER = "blocks"
+GENERIC_CRAWLER = "generic"
+MOONWORM_CONTINUOUS_CRAWLER = "moonworm_continuous"
+MOONWORM_HISTORICAL_CRAWLER = "moonworm_historical"
+
+# Crawlers which crawl their ranges from to_block down to from_block
+DESCENDING_RANGES_CRAWLERS = [MOONWORM_HISTORICAL_CRAWLER]
+
+
+class CrawlRangeRolledBack(Exception):
+    """
+    Raised when range progress was rolled back by chain reorganization
+    while range was crawled.
+    """
+
+
+def add_range(
+    ranges: List[List[int]], from_block: int, to_block: int
+) -> List[List[int]]:
+    """
+    Returns new sorted list of [from_block, to_block] ranges with given range merged in.
+    """
+    if from_block > to_block:
+        return [list(block_range) for block_range in ranges]
+
+    merged_ranges: List[List[int]] = []
+    for range_from, range_to in sorted(
+        [list(block_range) for block_range in ranges] + [[from_block, to_block]]
+    ):
+        if merged_ranges and range_from <= merged_ranges[-1][1] + 1:
+            merged_ranges[-1][1] = max(merged_ranges[-1][1], range_to)
+        else:
+            merged_ranges.append([range_from, range_to])
+    return merged_ranges
+
+
+def subtract_range(
+    ranges: List[List[int]], from_block: int, to_block: int
+) -> List[List[int]]:
+    """
+    Returns new sorted list of [from_block, to_block] ranges without blocks of given range.
+    """
+    result_ranges: List[List[int]] = []
+    for range_from, range_to in sorted(ranges):
+        if range_to < from_block or range_from > to_block:
+            result_ranges.append([range_from, range_to])
+            continue
+        if range_from < from_block:
+            result_ranges.append([range_from, from_block - 1])
+        if range_to > to_block:
+            result_ranges.append([to_block + 1, range_to])
+    return result_ranges
+
+
+def get_checkpoint(
+    db_session: Session,
+    crawler: str,
+    blockchain_type: AvailableBlockchainType,
+) -> Optional[CrawlerCheckpoint]:
+    return (
+        db_session.query(CrawlerCheckpoint)
+        .filter(CrawlerCheckpoint.crawler == crawler)
+        .filter(CrawlerCheckpoint.blockchain == blockchain_type.value)
+        .one_or_none()
+    )
+
+
+def update_checkpoint(
+    db_session: Session,
+    crawler: str,
+    blockchain_type: AvailableBlockchainType,
+    crawled_range: Optional[Tuple[int, int]] = None,
+    add_gaps: Iterable[Tuple[int, int]] = (),
+    remove_gaps: Iterable[Tuple[int, int]] = (),
+    rollback_to: Optional[int] = None,
+) -> CrawlerCheckpoint:
+    """
+    Create checkpoint if it does not exist and lock it for update until commit.
+
+    crawled_range extends first_block and last_block and is removed from gaps,
+    add_gaps and remove_gaps update outstanding gaps. rollback_to lowers last_block
+    and drops gaps above it (chain reorganization). Session is not committed.
+    """
+    db_session.execute(
+        insert(CrawlerCheckpoint.__table__)
+        .values(crawler=crawler, blockchain=blockchain_type.value)
+        .on_conflict_do_nothing(index_elements=["crawler", "blockchain"])
+    )
+    checkpoint = (
+        db_session.query(CrawlerCheckpoint)
+        .filter(CrawlerCheckpoint.crawler == crawler)
+        .filter(CrawlerCheckpoint.blockchain == blockchain_type.value)
+        .with_for_update()
+        .one()
+    )
+
+    if rollback_to is not None:
+        rollback_checkpoint(checkpoint, rollback_to)
+
+    if crawled_range is not None:
+        from_block, to_block = min(crawled_range), max(crawled_range)
+        if checkpoint.first_block is None or from_block < checkpoint.first_block:
+            checkpoint.first_block = from_block
+        if checkpoint.last_block is None or to_block > checkpoint.last_block:
+            checkpoint.last_block = to_block
+
+    gaps = checkpoint.gaps
+    if crawled_range is not None:
+        gaps = subtract_range(gaps, min(crawled_range), max(crawled_range))
+    for from_block, to_block in add_gaps:
+        gaps = add_range(gaps, from_block, to_block)
+    for from_block, to_block in remove_gaps:
+        gaps = subtract_range(gaps, from_block, to_block)
+    # Assign new list for SQLAlchemy to track JSONB change
+    checkpoint.gaps = gaps
+
+    return checkpoint
+
+
+def rollback_checkpoint(checkpoint: CrawlerCheckpoint, rollback_to: int) -> bool:
+    """
+    Lower checkpoint last_block to rollback_to and drop gaps above it.
+
+    Returns True if checkpoint was changed.
+    """
+    if checkpoint.last_block is None or checkpoint.last_block <= rollback_to:
+        return False
+
+    if checkpoint.first_block is not None and rollback_to < checkpoint.first_block:
+        checkpoint.first_block = None
+        checkpoint.last_block = None
+    else:
+        checkpoint.last_block = rollback_to
+    # Assign new list for SQLAlchemy to track JSONB change
+    checkpoint.gaps = [
+        [from_block, min(to_block, rollback_to)]
+        for from_block, to_block in checkpoint.gaps
+        if from_block <= rollback_to
+    ]
+    return True
+
+
+def rollback_crawl_range(crawl_range: CrawlerRange, rollback_to: int) -> bool:
+    """
+    Mark blocks of range above rollback_to as not crawled.
+
+    Ascending range continues from rollback_to + 1. Descending range could not
+    keep crawled blocks below rollback_to, as it continues from progress_block down,
+    so it is crawled again from its to_block.
+
+    Returns True if range was changed.
+    """
+    if crawl_range.progress_block is None or crawl_range.to_block <= rollback_to:
+        return False
+
+    if crawl_range.crawler in DESCENDING_RANGES_CRAWLERS:
+        crawl_range.progress_block = None
+    elif crawl_range.progress_block <= rollback_to:
+        return False
+    elif rollback_to < crawl_range.from_block:
+        crawl_range.progress_block = None
+    else:
+        crawl_range.progress_block = rollback_to
+    crawl_range.finished = False
+    return True
+
+
+def rollback_crawlers_progress(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    rollback_to: int,
+) -> Tuple[int, int]:
+    """
+    Rewind checkpoints and ranges progress of all crawlers of blockchain
+    to rollback_to, so data of blocks above it is crawled again after chain
+    reorganization. Session is not committed.
+
+    Returns number of changed checkpoints and ranges.
+    """
+    checkpoints = (
+        db_session.query(CrawlerCheckpoint)
+        .filter(CrawlerCheckpoint.blockchain == blockchain_type.value)
+        .filter(CrawlerCheckpoint.last_block > rollback_to)
+        .with_for_update()
+        .all()
+    )
+    crawl_ranges = (
+        db_session.query(CrawlerRange)
+        .filter(CrawlerRange.blockchain == blockchain_type.value)
+        .filter(CrawlerRange.to_block > rollback_to)
+        .filter(CrawlerRange.progress_block != None)
+        .with_for_update()
+        .all()
+    )
+    changed_checkpoints = sum(
+        rollback_checkpoint(checkpoint, rollback_to) for checkpoint in checkpoints
+    )
+    changed_ranges = sum(
+        rollback_crawl_range(crawl_range, rollback_to) for crawl_range in crawl_ranges
+    )
+    return changed_checkpoints, changed_ranges
+
+
+def split_range(
+    from_block: int, to_block: int, shard_size: int
+) -> List[Tuple[int, int]]:
+    """
+    Split blocks range into (from_block, to_block) shards aligned to multiples
+    of shard_size, so the same blocks fall into the same shards between runs.
+    """
+    assert shard_size > 0, "shard_size must be greater than 0"
+
+    shards: List[Tuple[int, int]] = []
+    shard_from = from_block
+    while shard_from <= to_block:
+        shard_to = min((shard_from // shard_size + 1) * shard_size - 1, to_block)
+        shards.append((shard_from, shard_to))
+        shard_from = shard_to + 1
+    return shards
+
+
+def last_shard_block(latest_block: int, shard_size: int) -> int:
+    """
+    Returns last block of the last complete shard up to latest_block.
+
+    Used as crawl bound when it is not given, so the top shard has the same
+    range (crawler_ranges key) between runs and its progress is kept.
+    """
+    assert shard_size > 0, "shard_size must be greater than 0"
+    return (latest_block + 1) // shard_size * shard_size - 1
+
+
+def get_crawl_ranges(
+    db_session: Session,
+    crawler: str,
+    blockchain_type: AvailableBlockchainType,
+    label: str,
+    shards: Iterable[Tuple[int, int]],
+) -> List[CrawlerRange]:
+    """
+    Create missing crawler ranges for shards and return all of them,
+    ordered by from_block. Session is committed.
+    """
+    shards = list(shards)
+    if shards:
+        db_session.execute(
+            insert(CrawlerRange.__table__)
+            .values(
+                [
+                    {
+                        "crawler": crawler,
+                        "blockchain": blockchain_type.value,
+                        "label": label,
+                        "from_block": from_block,
+                        "to_block": to_block,
+                    }
+                    for from_block, to_block in shards
+                ]
+            )
+            .on_conflict_do_nothing(
+                index_elements=[
+                    "crawler",
+                    "blockchain",
+                    "label",
+                    "from_block",
+                    "to_block",
+                ]
+            )
+        )
+        db_session.commit()
+
+    shards_set = {(from_block, to_block) for from_block, to_block in shards}
+    crawl_ranges = (
+        db_session.query(CrawlerRange)
+        .filter(CrawlerRange.crawler == crawler)
+        .filter(CrawlerRange.blockchain == blockchain_type.value)
+        .filter(CrawlerRange.label == label)
+        .order_by(CrawlerRange.from_block)
+        .all()
+    )
+    return [
+        crawl_range
+        for crawl_range in crawl_ranges
+        if (crawl_range.from_block, crawl_range.to_block) in shards_set
+    ]
+
+
+def crawl_range_start_block(crawl_range: CrawlerRange) -> int:
+    """
+    Returns block to continue crawling of unfinished range from.
+    """
+    if crawl_range.crawler in DESCENDING_RANGES_CRAWLERS:
+        if crawl_range.progress_block is None:
+            return crawl_range.to_block
+        return crawl_range.progress_block - 1
+
+    if crawl_range.progress_block is None:
+        return crawl_range.from_block
+    return crawl_range.progress_block + 1
+
+
+def update_crawl_range_progress(
+    db_session: Session,
+    crawl_range_id: UUID,
+    previous_progress_block: Optional[int],
+    progress_block: int,
+    finished: bool = False,
+) -> None:
+    """
+    Store last crawled block of range. Session is not committed, to save
+    progress in the same transaction as crawled data.
+
+    previous_progress_block is progress stored by the same worker before, if it
+    was changed in between by rollback_crawlers_progress, CrawlRangeRolledBack
+    is raised and crawled data should not be committed.
+    """
+    query = db_session.query(CrawlerRange).filter(CrawlerRange.id == crawl_range_id)
+    if previous_progress_block is None:
+        query = query.filter(CrawlerRange.progress_block == None)
+    else:
+        query = query.filter(CrawlerRange.progress_block == previous_progress_block)
+    updated = query.update(
+        {
+            CrawlerRange.progress_block: progress_block,
+            CrawlerRange.finished: finished,
+        },
+        synchronize_session=False,
+    )
+    if updated == 0:
+        raise CrawlRangeRolledBack(
+            f"Progress of crawler range {crawl_range_id} was rolled back"
+        )
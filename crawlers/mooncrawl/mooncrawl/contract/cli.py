@@ -9,6 +9,7 @@ from moonstreamdb.db import yield_db_session_ctx
 from sqlalchemy.orm.session import Session
 from web3 import Web3
 
+from ..async_blockchain import AsyncWeb3Client, async_connect
 from ..blockchain import connect
 from ..settings import NB_CONTROLLER_ACCESS_ID
 from .deployment_crawler import ContractDeploymentCrawler, MoonstreamDataStore
@@ -26,12 +27,20 @@ def run_crawler_asc(
     batch_size: int,
     respect_state: bool,
     sleep_time: int,
+    workers: int = 1,
+    rpc_batch_size: int = 100,
+    async_client: Optional[AsyncWeb3Client] = None,
 ):
     """
     Runs crawler in ascending order
     """
     moonstream_data_store = MoonstreamDataStore(session)
-    contract_deployment_crawler = ContractDeploymentCrawler(w3, moonstream_data_store)
+    contract_deployment_crawler = ContractDeploymentCrawler(
+        w3,
+        moonstream_data_store,
+        rpc_batch_size=rpc_batch_size,
+        async_client=async_client,
+    )
 
     if respect_state:
         from_block = moonstream_data_store.get_last_labeled_block_number() + 1
@@ -49,21 +58,26 @@ def run_crawler_asc(
         from_block <= to_block
     ), "from_block must be less than or equal to to_block in asc order, used --order desc"
 
-    logger.info(f"Starting crawling from block {from_block} to block {to_block}")
-    contract_deployment_crawler.crawl(
-        from_block=from_block,
-        to_block=to_block,
-        batch_size=batch_size,
-    )
-    if synchronize:
-        last_crawled_block = to_block
-        while True:
-            contract_deployment_crawler.crawl(
-                from_block=last_crawled_block + 1,
-                to_block=None,  # to_block will be set to last_crawled_block
-                batch_size=batch_size,
-            )
-            time.sleep(sleep_time)
+    try:
+        logger.info(f"Starting crawling from block {from_block} to block {to_block}")
+        contract_deployment_crawler.crawl(
+            from_block=from_block,
+            to_block=to_block,
+            batch_size=batch_size,
+            workers=workers,
+        )
+        if synchronize:
+            last_crawled_block = to_block
+            while True:
+                contract_deployment_crawler.crawl(
+                    from_block=last_crawled_block + 1,
+                    to_block=None,  # to_block will be set to last_crawled_block
+                    batch_size=batch_size,
+                    workers=workers,
+                )
+                time.sleep(sleep_time)
+    finally:
+        contract_deployment_crawler.close()
 
 
 def run_crawler_desc(
@@ -75,12 +89,20 @@ def run_crawler_desc(
     batch_size: int,
     respect_state: bool,
     sleep_time: int,
+    workers: int = 1,
+    rpc_batch_size: int = 100,
+    async_client: Optional[AsyncWeb3Client] = None,
 ):
     """
     Runs crawler in descending order
     """
     moonstream_data_store = MoonstreamDataStore(session)
-    contract_deployment_crawler = ContractDeploymentCrawler(w3, moonstream_data_store)
+    contract_deployment_crawler = ContractDeploymentCrawler(
+        w3,
+        moonstream_data_store,
+        rpc_batch_size=rpc_batch_size,
+        async_client=async_client,
+    )
 
     if respect_state:
         to_block = moonstream_data_store.get_first_block_number() - 1
@@ -98,25 +120,40 @@ def run_crawler_desc(
         from_block >= to_block
     ), "from_block must be greater than or equal to to_block in desc order, used --order asc"
 
-    logger.info(f"Starting crawling from block {from_block} to block {to_block}")
-    contract_deployment_crawler.crawl(
-        from_block=from_block,
-        to_block=to_block,
-        batch_size=batch_size,
-    )
-    if synchronize:
-        last_crawled_block = to_block
-        while True:
-            to_block = moonstream_data_store.get_first_block_number()
-            contract_deployment_crawler.crawl(
-                from_block=last_crawled_block - 1,
-                to_block=to_block,
-                batch_size=batch_size,
-            )
-            time.sleep(sleep_time)
+    try:
+        logger.info(f"Starting crawling from block {from_block} to block {to_block}")
+        contract_deployment_crawler.crawl(
+            from_block=from_block,
+            to_block=to_block,
+            batch_size=batch_size,
+            workers=workers,
+        )
+        if synchronize:
+            last_crawled_block = to_block
+            while True:
+                to_block = moonstream_data_store.get_first_block_number()
+                contract_deployment_crawler.crawl(
+                    from_block=last_crawled_block - 1,
+                    to_block=to_block,
+                    batch_size=batch_size,
+                    workers=workers,
+                )
+                time.sleep(sleep_time)
+    finally:
+        contract_deployment_crawler.close()
 
 
 def handle_parser(args: argparse.Namespace):
+    async_client: Optional[AsyncWeb3Client] = None
+    if args.async_requests > 0:
+        if args.workers > 1:
+            raise ValueError("--async-requests could not be used with --workers")
+        async_client = async_connect(
+            AvailableBlockchainType.ETHEREUM,
+            access_id=args.access_id,
+            pool_size=args.async_requests,
+        )
+
     with yield_db_session_ctx() as session:
         w3 = connect(AvailableBlockchainType.ETHEREUM, access_id=args.access_id)
         if args.order == "asc":
@@ -129,6 +166,9 @@ def handle_parser(args: argparse.Namespace):
                 batch_size=args.batch,
                 respect_state=args.respect_state,
                 sleep_time=args.sleep,
+                workers=args.workers,
+                rpc_batch_size=args.rpc_batch,
+                async_client=async_client,
             )
         elif args.order == "desc":
             run_crawler_desc(
@@ -140,6 +180,9 @@ def handle_parser(args: argparse.Namespace):
                 batch_size=args.batch,
                 respect_state=args.respect_state,
                 sleep_time=args.sleep,
+                workers=args.workers,
+                rpc_batch_size=args.rpc_batch,
+                async_client=async_client,
             )
 
 
@@ -150,6 +193,9 @@ def generate_parser():
     --order: order to crawl : (desc, asc) default: asc
     --synchronize: Continious crawling, default: False
     --batch, -b : batch size, default: 10
+    --workers, -w: number of batches crawled concurrently, default: 1
+    --rpc-batch: number of receipts requested in one JSON-RPC batch, default: 100
+    --async-requests: number of receipts requests in flight with asynchronous client, default: 0 (JSON-RPC batches are used)
     --respect-state: If set to True:\n If order is asc: start=last_labeled_block+1\n If order is desc: start=first_labeled_block-1
     """
 
@@ -182,6 +228,25 @@ def generate_parser():
         "--synchronize", action="store_true", default=False, help="Continious crawling"
     )
     parser.add_argument("--batch", "-b", type=int, default=10, help="batch size")
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=1,
+        help="number of batches crawled concurrently",
+    )
+    parser.add_argument(
+        "--rpc-batch",
+        type=int,
+        default=100,
+        help="number of receipts requested in one JSON-RPC batch",
+    )
+    parser.add_argument(
+        "--async-requests",
+        type=int,
+        default=0,
+        help="number of receipts requests in flight with asynchronous client, 0 to use JSON-RPC batches",
+    )
     parser.add_argument(
         "--respect-state",
         action="store_true",
@@ -1,12 +1,19 @@
+import asyncio
+import itertools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Iterator, List, Optional, Tuple, cast
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, cast
 
-from hexbytes import HexBytes
+from moonstreamdb.blockchain import AvailableBlockchainType
+from moonstreamdb.db import yield_db_session_ctx
 from moonstreamdb.models import EthereumBlock, EthereumLabel, EthereumTransaction
 from sqlalchemy.orm import Query, Session
 from web3 import Web3
-from web3.types import TxReceipt
+
+from ..async_blockchain import AsyncWeb3Client
+from ..blockchain import get_transaction_receipts
+from ..moonworm_crawler.db import insert_labels
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -129,6 +136,10 @@ class MoonstreamDataStore:
     ) -> None:
         """
         Saves a list of contract deployment labels.
+
+        Labels of already labeled transactions are skipped, new ones are
+        written with bulk insert. On error session is rolled back and error
+        is raised.
         """
         transaction_hashes = [
             contract_deployment.transaction_hash
@@ -140,9 +151,9 @@ class MoonstreamDataStore:
             .filter(EthereumLabel.transaction_hash.in_(transaction_hashes))
             .all()
         )
-        existing_labels_tx_hashes = [
+        existing_labels_tx_hashes = {
             label_tx_hash[0] for label_tx_hash in existing_labels
-        ]
+        }
         new_labels = [
             EthereumLabel(
                 transaction_hash=contract_deployment.transaction_hash,
@@ -164,19 +175,12 @@ class MoonstreamDataStore:
             return
         try:
             logger.info(f"Saving {len(new_labels)} new contract deployment labels.")
-            self.db_session.add_all(new_labels)
+            insert_labels(self.db_session, AvailableBlockchainType.ETHEREUM, new_labels)
             self.db_session.commit()
         except Exception as e:
             logger.error(f"Error saving contract deployment labels: {e}")
             self.db_session.rollback()
-
-
-def get_transaction_receipt(web3: Web3, tx_hash: str) -> TxReceipt:
-    """
-    Returns the transaction receipt for the given transaction hash.
-    """
-
-    return web3.eth.get_transaction_receipt(cast(HexBytes, tx_hash))
+            raise
 
 
 def get_contract_deployment_transactions(
@@ -184,18 +188,33 @@ def get_contract_deployment_transactions(
     datastore: MoonstreamDataStore,
     from_block: int,
     to_block: int,
+    rpc_batch_size: int = 100,
+    get_receipts: Optional[Callable[[List[str]], Dict[str, Any]]] = None,
 ) -> List[ContractDeployment]:
     """
     Returns a list of ContractDeployment objects for all contract deployment transactions in the given block range.
+    Receipts are fetched with batch requests of rpc_batch_size calls, or with
+    get_receipts if it is given. Transactions without receipt are skipped.
     """
     logger.info(
         f"Getting contract deployment transactions from {from_block} to {to_block}"
     )
-    contract_deployment_transactions = []
-    for raw_deployment_tx in datastore.get_raw_contract_deployment_transactions(
+    raw_deployment_txs = datastore.get_raw_contract_deployment_transactions(
         from_block, to_block
-    ):
-        receipt = get_transaction_receipt(web3, raw_deployment_tx.transaction_hash)
+    )
+    transactions_hashes = [
+        raw_deployment_tx.transaction_hash for raw_deployment_tx in raw_deployment_txs
+    ]
+    if get_receipts is not None:
+        receipts = get_receipts(transactions_hashes)
+    else:
+        receipts = get_transaction_receipts(
+            web3, transactions_hashes, batch_size=rpc_batch_size, skip_missing=True
+        )
+
+    contract_deployment_transactions = []
+    for raw_deployment_tx in raw_deployment_txs:
+        receipt = receipts.get(raw_deployment_tx.transaction_hash)
         if receipt is None:
             continue
 
@@ -235,31 +254,121 @@ class ContractDeploymentCrawler:
     """
     Crawls contract deployments from MoonstreamDB transactions with the usage of web3
     to get transaction recipts
+
+    If async_client is given, receipts of each batch are requested concurrently
+    with it instead of JSON-RPC batch requests. Call close() when finished.
     """
 
-    def __init__(self, web3: Web3, datastore: MoonstreamDataStore):
+    def __init__(
+        self,
+        web3: Web3,
+        datastore: MoonstreamDataStore,
+        rpc_batch_size: int = 100,
+        async_client: Optional[AsyncWeb3Client] = None,
+    ):
         self.web3 = web3
         self.datastore = datastore
+        self.rpc_batch_size = rpc_batch_size
+        self.async_client = async_client
+
+        # Connections of async client are kept alive between batches of this loop
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        if async_client is not None:
+            self._loop = asyncio.new_event_loop()
+
+    def _get_receipts_async(self, transactions_hashes: List[str]) -> Dict[str, Any]:
+        assert self.async_client is not None and self._loop is not None
+        return self._loop.run_until_complete(
+            self.async_client.get_transaction_receipts(
+                transactions_hashes, skip_missing=True
+            )
+        )
+
+    def close(self) -> None:
+        if self.async_client is not None and self._loop is not None:
+            self._loop.run_until_complete(self.async_client.close())
+            self._loop.close()
+            self._loop = None
+
+    def _save_batch(
+        self,
+        datastore: MoonstreamDataStore,
+        contract_deployment_transactions: List[ContractDeployment],
+    ) -> None:
+        try:
+            datastore.save_contract_deployment_labels(contract_deployment_transactions)
+        except Exception:
+            # Already logged, continue with next batch
+            pass
+
+    def _crawl_batch(self, from_block: int, to_block: int) -> None:
+        """
+        Crawls one batch in worker thread with its own database session.
+        """
+        with yield_db_session_ctx() as db_session:
+            datastore = MoonstreamDataStore(db_session)
+            contract_deployment_transactions = get_contract_deployment_transactions(
+                self.web3, datastore, from_block, to_block, self.rpc_batch_size
+            )
+            self._save_batch(datastore, contract_deployment_transactions)
 
     def crawl(
-        self, from_block: Optional[int], to_block: Optional[int], batch_size: int = 200
+        self,
+        from_block: Optional[int],
+        to_block: Optional[int],
+        batch_size: int = 200,
+        workers: int = 1,
     ) -> None:
         """
         Crawls contract deployments in batches with the given batch size
         If from_block is None then the first block from datastore is used as start
         If to_block is None then the latest block from datastore is used
+
+        With workers > 1 batches are crawled concurrently in windows of workers
+        batches, next window starts when all batches of previous one are saved.
+        Concurrent batches are not supported with async_client, it keeps requests
+        of one batch in flight instead.
+
+        In both modes batch which failed to be saved is logged and skipped,
+        errors of node requests stop the crawl.
         """
+        if self.async_client is not None and workers > 1:
+            raise ValueError(
+                "Batches are crawled one by one with asynchronous client, "
+                "use workers=1"
+            )
         if from_block is None:
             from_block = self.datastore.get_first_block_number()
         if to_block is None:
             to_block = self.datastore.get_last_block_number()
 
-        for batch_from_block, batch_to_block in get_batch_block_range(
-            from_block, to_block, batch_size
-        ):
-            contract_deployment_transactions = get_contract_deployment_transactions(
-                self.web3, self.datastore, batch_from_block, batch_to_block
-            )
-            self.datastore.save_contract_deployment_labels(
-                contract_deployment_transactions
-            )
+        batches = get_batch_block_range(from_block, to_block, batch_size)
+        if workers <= 1:
+            for batch_from_block, batch_to_block in batches:
+                contract_deployment_transactions = get_contract_deployment_transactions(
+                    self.web3,
+                    self.datastore,
+                    batch_from_block,
+                    batch_to_block,
+                    self.rpc_batch_size,
+                    get_receipts=(
+                        self._get_receipts_async
+                        if self.async_client is not None
+                        else None
+                    ),
+                )
+                self._save_batch(self.datastore, contract_deployment_transactions)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                window = list(itertools.islice(batches, workers))
+                if not window:
+                    break
+                futures = [
+                    executor.submit(self._crawl_batch, batch_from_block, batch_to_block)
+                    for batch_from_block, batch_to_block in window
+                ]
+                # Raises first node error of window after all its batches are done
+                for future in futures:
+                    future.result()
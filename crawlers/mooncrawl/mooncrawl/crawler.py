@@ -9,19 +9,33 @@ import sys
 import time
 from datetime import datetime, timedelta, timezone
 from enum import Enum
-from typing import Iterator, List
+from typing import Iterator, List, Optional, Tuple
 from uuid import UUID
 
-from moonstreamdb.blockchain import AvailableBlockchainType
+from moonstreamdb.blockchain import AvailableBlockchainType, get_block_model
+from moonstreamdb.db import yield_db_session_ctx
 import dateutil.parser
 
 from .blockchain import (
     DateRange,
+    block_to_row,
+    block_transactions_to_rows,
     check_missing_blocks,
+    connect,
     crawl_blocks_executor,
+    find_fork_block_number,
+    get_blocks,
     get_latest_blocks,
+    insert_blocks_rows,
+    rollback_blocks,
     trending,
 )
+from .checkpoints import (
+    BLOCKS_CRAWLER,
+    get_checkpoint,
+    rollback_crawlers_progress,
+    update_checkpoint,
+)
 from .publish import publish_json
 from .settings import MOONSTREAM_CRAWL_WORKERS, NB_CONTROLLER_ACCESS_ID
 from .version import MOONCRAWL_VERSION
@@ -88,44 +102,245 @@ def yield_blocks_numbers_lists(
             current_block -= block_step
 
 
+def crawl_checkpoint_gaps(
+    blockchain_type: AvailableBlockchainType,
+    max_blocks: Optional[int] = None,
+    num_processes: int = MOONSTREAM_CRAWL_WORKERS,
+    access_id: Optional[UUID] = None,
+    rpc_batch_size: int = 1,
+) -> int:
+    """
+    Crawl outstanding gaps recorded in blocks crawler checkpoint, latest gaps first.
+    Crawled blocks are removed from checkpoint gaps.
+
+    Returns number of crawled blocks.
+    """
+    with yield_db_session_ctx() as db_session:
+        checkpoint = get_checkpoint(db_session, BLOCKS_CRAWLER, blockchain_type)
+        gaps = [] if checkpoint is None else list(checkpoint.gaps)
+
+    crawled_blocks = 0
+    for from_block, to_block in reversed(gaps):
+        if max_blocks is not None:
+            if crawled_blocks >= max_blocks:
+                break
+            from_block = max(from_block, to_block - (max_blocks - crawled_blocks) + 1)
+
+        for blocks_numbers_list in yield_blocks_numbers_lists(
+            f"{from_block}-{to_block}"
+        ):
+            logger.info(
+                f"Adding gap blocks {blocks_numbers_list[-1]}-{blocks_numbers_list[0]}"
+            )
+            crawl_blocks_executor(
+                blockchain_type=blockchain_type,
+                block_numbers_list=blocks_numbers_list,
+                with_transactions=True,
+                num_processes=num_processes,
+                access_id=access_id,
+                rpc_batch_size=rpc_batch_size,
+            )
+            with yield_db_session_ctx() as db_session:
+                update_checkpoint(
+                    db_session,
+                    BLOCKS_CRAWLER,
+                    blockchain_type,
+                    remove_gaps=[(blocks_numbers_list[-1], blocks_numbers_list[0])],
+                )
+                db_session.commit()
+            crawled_blocks += len(blocks_numbers_list)
+
+    return crawled_blocks
+
+
+def follow_blocks_head(
+    blockchain_type: AvailableBlockchainType,
+    latest_stored_block_number: Optional[int],
+    args: argparse.Namespace,
+) -> None:
+    """
+    Follow blockchain head and verify parent hash continuity of each new block
+    with stored blocks.
+
+    Poll interval grows while there are no new blocks and shrinks when they appear.
+    On chain reorganization orphaned blocks, transactions and labels are deleted
+    and blocks are crawled again from the fork block.
+    """
+    web3_client = connect(blockchain_type, access_id=args.access_id)
+    block_model = get_block_model(blockchain_type)
+    poll_interval = args.min_poll_interval
+
+    while True:
+        head_block_number: int = web3_client.eth.block_number - args.confirmations
+        if latest_stored_block_number is None:
+            latest_stored_block_number = (
+                head_block_number - 1 if args.start is None else args.start - 1
+            )
+
+        if head_block_number <= latest_stored_block_number:
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, args.max_poll_interval)
+            continue
+        poll_interval = max(poll_interval / 2, args.min_poll_interval)
+
+        to_block = min(head_block_number, latest_stored_block_number + args.flush_size)
+        blocks_numbers = list(range(latest_stored_block_number + 1, to_block + 1))
+        blocks = []
+        for i in range(0, len(blocks_numbers), args.rpc_batch_size):
+            blocks.extend(
+                get_blocks(
+                    web3_client,
+                    blockchain_type,
+                    blocks_numbers[i : i + args.rpc_batch_size],
+                    full_transactions=True,
+                )
+            )
+
+        with yield_db_session_ctx() as db_session:
+            stored_parent = (
+                db_session.query(block_model.hash)
+                .filter(block_model.block_number == latest_stored_block_number)
+                .one_or_none()
+            )
+            parent_hash = None if stored_parent is None else stored_parent[0]
+
+            if (
+                parent_hash is not None
+                and blocks[0]["parentHash"].hex().lower() != parent_hash.lower()
+            ):
+                fork_block_number = find_fork_block_number(
+                    db_session,
+                    web3_client,
+                    blockchain_type,
+                    latest_stored_block_number,
+                    max_depth=args.max_reorg_depth,
+                )
+                deleted_blocks, deleted_labels = rollback_blocks(
+                    db_session, blockchain_type, fork_block_number
+                )
+                # Label crawlers crawl removed labels again from the fork block
+                checkpoints_count, ranges_count = rollback_crawlers_progress(
+                    db_session, blockchain_type, fork_block_number - 1
+                )
+                db_session.commit()
+                logger.warning(
+                    f"Chain reorganization detected at block {fork_block_number}, "
+                    f"removed {deleted_blocks} orphaned blocks and {deleted_labels} labels, "
+                    f"rolled back {checkpoints_count} crawlers checkpoints "
+                    f"and {ranges_count} crawlers ranges"
+                )
+                latest_stored_block_number = fork_block_number - 1
+                continue
+
+            # Node could switch to another fork while blocks were fetched,
+            # keep only continuous part, the rest is fetched on next iteration
+            continuous_blocks = blocks[:1]
+            for block in blocks[1:]:
+                if block["parentHash"] != continuous_blocks[-1]["hash"]:
+                    break
+                continuous_blocks.append(block)
+
+            blocks_rows = []
+            transactions_rows = []
+            for block in continuous_blocks:
+                blocks_rows.append(block_to_row(block, blockchain_type))
+                transactions_rows.extend(block_transactions_to_rows(block))
+            insert_blocks_rows(
+                db_session, blockchain_type, blocks_rows, transactions_rows
+            )
+            update_checkpoint(
+                db_session,
+                BLOCKS_CRAWLER,
+                blockchain_type,
+                crawled_range=(
+                    continuous_blocks[0]["number"],
+                    continuous_blocks[-1]["number"],
+                ),
+            )
+            db_session.commit()
+
+        logger.info(
+            f"Added head blocks {continuous_blocks[0]['number']}-{continuous_blocks[-1]['number']}"
+        )
+        latest_stored_block_number = continuous_blocks[-1]["number"]
+
+
 def crawler_blocks_sync_handler(args: argparse.Namespace) -> None:
     """
     Synchronize latest Blockchain blocks with database.
+
+    Position is stored in blocks crawler checkpoint, ranges skipped because
+    of too large block difference are recorded as checkpoint gaps and crawled
+    when synchronization is unnecessary.
     """
-    while True:
-        latest_stored_block_number, latest_block_number = get_latest_blocks(
-            AvailableBlockchainType(args.blockchain),
-            args.confirmations,
+    blockchain_type = AvailableBlockchainType(args.blockchain)
+    web3_client = connect(blockchain_type, access_id=args.access_id)
+
+    with yield_db_session_ctx() as db_session:
+        checkpoint = get_checkpoint(db_session, BLOCKS_CRAWLER, blockchain_type)
+        latest_stored_block_number = (
+            None if checkpoint is None else checkpoint.last_block
+        )
+    if latest_stored_block_number is None:
+        logger.info("No blocks crawler checkpoint found, using latest stored block")
+        latest_stored_block_number, _ = get_latest_blocks(
+            blockchain_type, access_id=args.access_id
+        )
+
+    if args.follow_head:
+        return follow_blocks_head(blockchain_type, latest_stored_block_number, args)
+
+    def wait_for_blocks() -> None:
+        crawled_gaps_blocks = crawl_checkpoint_gaps(
+            blockchain_type,
+            max_blocks=args.gaps_blocks_step,
+            num_processes=args.jobs,
             access_id=args.access_id,
+            rpc_batch_size=args.rpc_batch_size,
         )
-        if latest_stored_block_number is None:
-            latest_stored_block_number = 0
+        if crawled_gaps_blocks == 0:
+            time.sleep(5)
+
+    while True:
+        latest_block_number: int = web3_client.eth.block_number
+        if args.confirmations > 0:
+            latest_block_number -= args.confirmations
 
-        if latest_stored_block_number >= latest_block_number:
+        stored_block_number = (
+            0 if latest_stored_block_number is None else latest_stored_block_number
+        )
+        if stored_block_number >= latest_block_number:
             logger.info(
-                f"Synchronization is unnecessary for blocks {latest_stored_block_number}-{latest_block_number - 1}"
+                f"Synchronization is unnecessary for blocks {stored_block_number}-{latest_block_number - 1}"
             )
-            time.sleep(5)
+            wait_for_blocks()
             continue
 
-        block_number_difference = latest_block_number - 1 - latest_stored_block_number
+        skipped_range: Optional[Tuple[int, int]] = None
+        block_number_difference = latest_block_number - 1 - stored_block_number
         if block_number_difference >= 70:
+            bottom_block_number = latest_block_number - args.confirmations - 1
+            if latest_stored_block_number is not None:
+                skipped_from_block = stored_block_number + 1
+                if args.start is not None:
+                    skipped_from_block = max(skipped_from_block, args.start)
+                skipped_range = (skipped_from_block, bottom_block_number - 1)
             logger.warning(
-                f"Block difference is too large: {block_number_difference}, crawling {args.confirmations + 1} latest blocks"
+                f"Block difference is too large: {block_number_difference}, crawling {args.confirmations + 1} latest blocks, "
+                f"skipped blocks {skipped_range} are recorded as gap"
             )
-            bottom_block_number = latest_block_number - args.confirmations - 1
         else:
             if args.start is None:
                 if block_number_difference < args.confirmations:
                     logger.info(
-                        f"Synchronization is unnecessary for blocks {latest_stored_block_number}-{latest_block_number - 1}"
+                        f"Synchronization is unnecessary for blocks {stored_block_number}-{latest_block_number - 1}"
                     )
-                    time.sleep(5)
+                    wait_for_blocks()
                     continue
                 else:
-                    bottom_block_number = latest_stored_block_number + 1
+                    bottom_block_number = stored_block_number + 1
             else:
-                bottom_block_number = max(latest_stored_block_number + 1, args.start)
+                bottom_block_number = max(stored_block_number + 1, args.start)
 
         for blocks_numbers_list in yield_blocks_numbers_lists(
             f"{bottom_block_number}-{latest_block_number}",
@@ -136,15 +351,28 @@ def crawler_blocks_sync_handler(args: argparse.Namespace) -> None:
             )
             # TODO(kompotkot): Set num_processes argument based on number of blocks to synchronize.
             crawl_blocks_executor(
-                blockchain_type=AvailableBlockchainType(args.blockchain),
+                blockchain_type=blockchain_type,
                 block_numbers_list=blocks_numbers_list,
                 with_transactions=True,
                 num_processes=args.jobs,
                 access_id=args.access_id,
+                rpc_batch_size=args.rpc_batch_size,
+                flush_size=args.flush_size,
+            )
+
+        with yield_db_session_ctx() as db_session:
+            update_checkpoint(
+                db_session,
+                BLOCKS_CRAWLER,
+                blockchain_type,
+                crawled_range=(bottom_block_number, latest_block_number),
+                add_gaps=[skipped_range] if skipped_range is not None else [],
             )
+            db_session.commit()
         logger.info(
-            f"Synchronized blocks from {latest_stored_block_number} to {latest_block_number}"
+            f"Synchronized blocks from {stored_block_number} to {latest_block_number}"
         )
+        latest_stored_block_number = latest_block_number
 
 
 def crawler_blocks_add_handler(args: argparse.Namespace) -> None:
@@ -160,6 +388,8 @@ def crawler_blocks_add_handler(args: argparse.Namespace) -> None:
             block_numbers_list=blocks_numbers_list,
             with_transactions=True,
             access_id=args.access_id,
+            rpc_batch_size=args.rpc_batch_size,
+            flush_size=args.flush_size,
         )
 
     logger.info(
@@ -177,6 +407,15 @@ def crawler_blocks_missing_handler(args: argparse.Namespace) -> None:
 
     missing_blocks_numbers_total = []
 
+    crawled_gaps_blocks = crawl_checkpoint_gaps(
+        AvailableBlockchainType(args.blockchain),
+        num_processes=1 if args.lazy else MOONSTREAM_CRAWL_WORKERS,
+        access_id=args.access_id,
+        rpc_batch_size=args.rpc_batch_size,
+    )
+    if crawled_gaps_blocks > 0:
+        logger.info(f"Crawled {crawled_gaps_blocks} blocks from checkpoint gaps")
+
     block_range = args.blocks
     if block_range is None:
         confirmations = 150
@@ -198,6 +437,7 @@ def crawler_blocks_missing_handler(args: argparse.Namespace) -> None:
             blocks_numbers=blocks_numbers_list,
             notransactions=args.notransactions,
             access_id=args.access_id,
+            rpc_batch_size=args.rpc_batch_size,
         )
         if len(missing_blocks_numbers) > 0:
             logger.info(f"Found {len(missing_blocks_numbers)} missing blocks")
@@ -215,6 +455,7 @@ def crawler_blocks_missing_handler(args: argparse.Namespace) -> None:
             with_transactions=True,
             num_processes=1 if args.lazy else MOONSTREAM_CRAWL_WORKERS,
             access_id=args.access_id,
+            rpc_batch_size=args.rpc_batch_size,
         )
     logger.info(
         f"Required {time.time() - startTime} with {MOONSTREAM_CRAWL_WORKERS} workers "
@@ -313,8 +554,8 @@ def main() -> None:
         type=int,
         default=MOONSTREAM_CRAWL_WORKERS,
         help=(
-            f"Number of processes to use when synchronizing (default: {MOONSTREAM_CRAWL_WORKERS})."
-            " If you set to 1, the main process handles synchronization without spawning subprocesses."
+            f"Number of fetcher threads to use when synchronizing (default: {MOONSTREAM_CRAWL_WORKERS})."
+            " If you set to 1, the main thread handles synchronization without spawning pipeline."
         ),
     )
     parser_crawler_blocks_sync.add_argument(
@@ -322,6 +563,53 @@ def main() -> None:
         required=True,
         help=f"Available blockchain types: {[member.value for member in AvailableBlockchainType]}",
     )
+    parser_crawler_blocks_sync.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        default=1,
+        help=(
+            "Number of blocks to fetch in one JSON-RPC batch request (default: 1)."
+            " If node rejects batch requests, blocks are fetched one by one."
+        ),
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--flush-size",
+        type=int,
+        default=100,
+        help="Number of blocks to write to database in one commit (default: 100)",
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--gaps-blocks-step",
+        type=int,
+        default=100,
+        help="Maximum number of checkpoint gaps blocks to crawl while waiting for new blocks (default: 100)",
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--follow-head",
+        action="store_true",
+        help=(
+            "Follow blockchain head with adaptive poll interval and parent hash checks,"
+            " orphaned blocks are rolled back and crawled again on chain reorganization"
+        ),
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--max-reorg-depth",
+        type=int,
+        default=128,
+        help="Maximum depth of chain reorganization to roll back in --follow-head mode (default: 128)",
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--min-poll-interval",
+        type=float,
+        default=0.5,
+        help="Minimum seconds between head polls in --follow-head mode (default: 0.5)",
+    )
+    parser_crawler_blocks_sync.add_argument(
+        "--max-poll-interval",
+        type=float,
+        default=10,
+        help="Maximum seconds between head polls in --follow-head mode (default: 10)",
+    )
     parser_crawler_blocks_sync.set_defaults(func=crawler_blocks_sync_handler)
 
     parser_crawler_blocks_add = subcommands_crawler_blocks.add_parser(
@@ -338,6 +626,21 @@ def main() -> None:
         required=True,
         help=f"Available blockchain types: {[member.value for member in AvailableBlockchainType]}",
     )
+    parser_crawler_blocks_add.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        default=1,
+        help=(
+            "Number of blocks to fetch in one JSON-RPC batch request (default: 1)."
+            " If node rejects batch requests, blocks are fetched one by one."
+        ),
+    )
+    parser_crawler_blocks_add.add_argument(
+        "--flush-size",
+        type=int,
+        default=100,
+        help="Number of blocks to write to database in one commit (default: 100)",
+    )
     parser_crawler_blocks_add.set_defaults(func=crawler_blocks_add_handler)
 
     parser_crawler_blocks_missing = subcommands_crawler_blocks.add_parser(
@@ -366,6 +669,15 @@ def main() -> None:
         required=True,
         help=f"Available blockchain types: {[member.value for member in AvailableBlockchainType]}",
     )
+    parser_crawler_blocks_missing.add_argument(
+        "--rpc-batch-size",
+        type=int,
+        default=100,
+        help=(
+            "Number of blocks to request in one JSON-RPC batch request (default: 100)."
+            " If node rejects batch requests, blocks are requested one by one."
+        ),
+    )
     parser_crawler_blocks_missing.set_defaults(func=crawler_blocks_missing_handler)
 
     parser_crawler_trending = subcommands.add_parser(
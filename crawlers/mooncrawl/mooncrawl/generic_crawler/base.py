@@ -1,16 +1,21 @@
 import json
 import logging
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Set, Union
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from uuid import UUID
 
-from eth_typing import ChecksumAddress
+from eth_typing import ChecksumAddress, HexStr
+from eth_utils import encode_hex, event_abi_to_log_topic
 from hexbytes.main import HexBytes
 from moonstreamdb.blockchain import (
     AvailableBlockchainType,
+    get_block_model,
     get_label_model,
     get_transaction_model,
 )
+from moonstreamdb.db import yield_db_session_ctx
 from moonstreamdb.models import (
     Base,
     EthereumTransaction,
@@ -21,14 +26,33 @@ from moonworm.crawler.function_call_crawler import (  # type: ignore
     utfy_dict,
 )
 from moonworm.crawler.log_scanner import _fetch_events_chunk  # type: ignore
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.session import Session
 from tqdm import tqdm
 from web3 import Web3
 from web3._utils.events import get_event_data
-
+from web3.middleware import geth_poa_middleware
+
+from ..block_timestamps import BlockTimestampsCache
+from ..blockchain import (
+    connect,
+    get_transaction_receipts,
+    get_transactions,
+    get_web3_provider,
+    transaction_to_row,
+)
+from ..checkpoints import (
+    GENERIC_CRAWLER,
+    crawl_range_start_block,
+    get_crawl_ranges,
+    split_range,
+    update_crawl_range_progress,
+)
 from ..moonworm_crawler.db import (
     add_events_to_session,
     commit_session,
+    dispose_inherited_connections,
+    insert_labels,
 )
 from ..moonworm_crawler.event_crawler import Event, get_block_timestamp
 
@@ -82,34 +106,17 @@ def add_function_calls_with_gas_price_to_session(
     blockchain_type: AvailableBlockchainType,
     label_name: str,
 ) -> None:
-
-    label_model = get_label_model(blockchain_type)
-    transactions_hashes_to_save = [
-        function_call.transaction_hash for function_call in function_calls
-    ]
-
-    existing_labels = (
-        db_session.query(label_model.transaction_hash)
-        .filter(
-            label_model.label == label_name,
-            label_model.log_index == None,
-            label_model.transaction_hash.in_(transactions_hashes_to_save),
-        )
-        .all()
+    inserted = insert_labels(
+        db_session,
+        blockchain_type,
+        [
+            _function_call_with_gas_price_to_label(
+                blockchain_type, function_call, label_name
+            )
+            for function_call in function_calls
+        ],
     )
-
-    existing_labels_transactions = [label[0] for label in existing_labels]
-
-    labels_to_save = [
-        _function_call_with_gas_price_to_label(
-            blockchain_type, function_call, label_name
-        )
-        for function_call in function_calls
-        if function_call.transaction_hash not in existing_labels_transactions
-    ]
-
-    logger.info(f"Saving {len(labels_to_save)} labels to session")
-    db_session.add_all(labels_to_save)
+    logger.info(f"Saved {inserted} of {len(function_calls)} labels to session")
 
 
 def _transform_to_w3_tx(
@@ -143,6 +150,22 @@ def _transform_to_w3_tx(
     return tx
 
 
+def make_events_topics_index(
+    events_abi: List[Dict[str, Any]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Index of event ABIs by topic0. Several ABIs could share topic0, for example
+    ERC20 and ERC721 Transfer events differ only by indexed arguments.
+    """
+    topics_index: Dict[str, List[Dict[str, Any]]] = {}
+    for event_abi in events_abi:
+        if event_abi.get("type") != "event" or event_abi.get("anonymous"):
+            continue
+        topic = encode_hex(event_abi_to_log_topic(event_abi))
+        topics_index.setdefault(topic, []).append(event_abi)
+    return topics_index
+
+
 def process_transaction(
     db_session: Session,
     web3: Web3,
@@ -150,8 +173,18 @@ def process_transaction(
     contract: Any,
     secondary_abi: List[Dict[str, Any]],
     transaction: Dict[str, Any],
-    blocks_cache: Dict[int, int],
+    blocks_cache: BlockTimestampsCache,
+    transaction_receipt: Optional[Any] = None,
+    secondary_topics_index: Optional[Dict[str, List[Dict[str, Any]]]] = None,
 ):
+    """
+    Decode transaction call and its logs matching secondary_abi events.
+
+    Logs are matched to events by topic0 with secondary_topics_index, which is built
+    from secondary_abi if not given.
+    """
+    if secondary_topics_index is None:
+        secondary_topics_index = make_events_topics_index(secondary_abi)
 
     try:
         raw_function_call = contract.decode_function_input(transaction["input"])
@@ -163,7 +196,8 @@ def process_transaction(
         function_name = selector
         function_args = "unknown"
 
-    transaction_reciept = web3.eth.getTransactionReceipt(transaction["hash"])
+    if transaction_receipt is None:
+        transaction_receipt = web3.eth.getTransactionReceipt(transaction["hash"])
     block_timestamp = get_block_timestamp(
         db_session,
         web3,
@@ -181,8 +215,8 @@ def process_transaction(
         caller_address=transaction["from"],
         function_name=function_name,
         function_args=function_args,
-        status=transaction_reciept["status"],
-        gas_used=transaction_reciept["gasUsed"],
+        status=transaction_receipt["status"],
+        gas_used=transaction_receipt["gasUsed"],
         gas_price=transaction["gasPrice"],
         max_fee_per_gas=transaction.get(
             "maxFeePerGas",
@@ -192,25 +226,12 @@ def process_transaction(
     )
 
     secondary_logs = []
-    for log in transaction_reciept["logs"]:
-        for abi in secondary_abi:
-            try:
-                raw_event = get_event_data(web3.codec, abi, log)
-                event = {
-                    "event": raw_event["event"],
-                    "args": json.loads(Web3.toJSON(utfy_dict(dict(raw_event["args"])))),
-                    "address": raw_event["address"],
-                    "blockNumber": raw_event["blockNumber"],
-                    "transactionHash": raw_event["transactionHash"].hex(),
-                    "logIndex": raw_event["logIndex"],
-                    "blockTimestamp": block_timestamp,
-                }
-                processed_event = _processEvent(event)
-                secondary_logs.append(processed_event)
-
-                break
-            except:
-                pass
+    for log in transaction_receipt["logs"]:
+        processed_event = _decode_log(
+            web3, secondary_topics_index, log, block_timestamp
+        )
+        if processed_event is not None:
+            secondary_logs.append(processed_event)
 
     return function_call, secondary_logs
 
@@ -220,7 +241,16 @@ def _get_transactions(
     web3: Web3,
     blockchain_type: AvailableBlockchainType,
     transaction_hashes: Set[str],
-):
+    write_transactions: bool = False,
+    rpc_batch_size: int = 100,
+) -> List[Dict[str, Any]]:
+    """
+    Returns transactions from database, transactions missing in database are
+    fetched from node with batch requests.
+
+    If write_transactions is set, fetched transactions of blocks stored in database
+    are inserted into transactions table, so next crawls find them there.
+    """
     transaction_model = get_transaction_model(blockchain_type)
     transactions = (
         db_session.query(transaction_model)
@@ -232,20 +262,67 @@ def _get_transactions(
         _transform_to_w3_tx(transaction) for transaction in transactions
     ]
 
+    found_transaction_hashes = {transaction.hash for transaction in transactions}
     not_found_transaction_hashes = [
         transaction_hash
         for transaction_hash in transaction_hashes
-        if transaction_hash not in [transaction.hash for transaction in transactions]
+        if transaction_hash not in found_transaction_hashes
     ]
+    if not not_found_transaction_hashes:
+        return web3_transactions
 
-    for nf_transaction in not_found_transaction_hashes:
-        tx = web3.eth.getTransaction(nf_transaction)
+    logger.info(
+        f"Fetching {len(not_found_transaction_hashes)} transactions missing in database"
+    )
+    fetched_transactions = list(
+        get_transactions(
+            web3, not_found_transaction_hashes, batch_size=rpc_batch_size
+        ).values()
+    )
+    web3_transactions.extend(fetched_transactions)
 
-        web3_transactions.append(tx)
+    if write_transactions:
+        _write_transactions(db_session, blockchain_type, fetched_transactions)
 
     return web3_transactions
 
 
+def _write_transactions(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    transactions: List[Any],
+) -> None:
+    """
+    Insert transactions of blocks stored in database, transactions table references
+    blocks table so transactions of other blocks are skipped. Session is not committed.
+    """
+    block_model = get_block_model(blockchain_type)
+    transaction_model = get_transaction_model(blockchain_type)
+
+    blocks_numbers = {transaction["blockNumber"] for transaction in transactions}
+    stored_blocks_numbers = {
+        block_number
+        for (block_number,) in db_session.query(block_model.block_number)
+        .filter(block_model.block_number.in_(blocks_numbers))
+        .all()
+    }
+    transactions_rows = [
+        transaction_to_row(transaction)
+        for transaction in transactions
+        if transaction["blockNumber"] in stored_blocks_numbers
+    ]
+    logger.info(
+        f"Writing {len(transactions_rows)} of {len(transactions)} fetched transactions "
+        "to database"
+    )
+    if transactions_rows:
+        db_session.execute(
+            insert(transaction_model.__table__)
+            .values(transactions_rows)
+            .on_conflict_do_nothing(index_elements=["hash"])
+        )
+
+
 def _processEvent(raw_event: Dict[str, Any]):
     event = Event(
         event_name=raw_event["event"],
@@ -259,6 +336,114 @@ def _processEvent(raw_event: Dict[str, Any]):
     return event
 
 
+# Queries of populate_with_events batch: logs of contracts emitting populated
+# events or receipts of labeled transactions
+POPULATE_BY_ADDRESSES = "addresses"
+POPULATE_BY_RECEIPTS = "receipts"
+POPULATE_AUTO = "auto"
+POPULATE_STRATEGIES = [POPULATE_AUTO, POPULATE_BY_ADDRESSES, POPULATE_BY_RECEIPTS]
+
+# Maximum number of contract addresses in one eth_getLogs filter
+LOGS_FILTER_MAX_ADDRESSES = 1000
+
+
+class PopulateCostModel:
+    """
+    Estimates number of logs node returns for populate batch with each query.
+
+    Receipts contain every log of labeled transactions, address filtered
+    eth_getLogs returns populated events of contracts in whole blocks range.
+    Estimates are averages observed in previous batches, until logs were
+    requested by addresses their cost is unknown and they are chosen to measure it.
+    """
+
+    def __init__(self, logs_per_receipt: float = 5) -> None:
+        self.logs_per_receipt = logs_per_receipt
+        self._receipts = 0
+        self._receipts_logs = 0
+        self._address_blocks = 0
+        self._address_logs = 0
+
+    def receipts_cost(self, transactions: int) -> float:
+        if self._receipts > 0:
+            return transactions * self._receipts_logs / self._receipts
+        return transactions * self.logs_per_receipt
+
+    def addresses_cost(self, addresses: int, blocks: int) -> Optional[float]:
+        if self._address_blocks == 0:
+            return None
+        return addresses * blocks * self._address_logs / self._address_blocks
+
+    def choose(self, transactions: int, addresses: int, blocks: int) -> str:
+        addresses_cost = self.addresses_cost(addresses, blocks)
+        if addresses_cost is None or addresses_cost < self.receipts_cost(transactions):
+            return POPULATE_BY_ADDRESSES
+        return POPULATE_BY_RECEIPTS
+
+    def record_receipts(self, receipts: int, logs: int) -> None:
+        self._receipts += receipts
+        self._receipts_logs += logs
+
+    def record_addresses(self, addresses: int, blocks: int, logs: int) -> None:
+        self._address_blocks += addresses * blocks
+        self._address_logs += logs
+
+
+def _decode_log(
+    web3: Web3,
+    topics_index: Dict[str, List[Dict[str, Any]]],
+    log: Any,
+    block_timestamp: int,
+) -> Optional[Event]:
+    """
+    Decode log with the first event ABI of its topic0 which fits it.
+    """
+    if not log["topics"]:
+        return None
+    for abi in topics_index.get(encode_hex(log["topics"][0]), []):
+        try:
+            raw_event = get_event_data(web3.codec, abi, log)
+        except Exception:
+            continue
+        return _processEvent(
+            {
+                "event": raw_event["event"],
+                "args": json.loads(Web3.toJSON(utfy_dict(dict(raw_event["args"])))),
+                "address": raw_event["address"],
+                "blockNumber": raw_event["blockNumber"],
+                "transactionHash": raw_event["transactionHash"].hex(),
+                "logIndex": raw_event["logIndex"],
+                "blockTimestamp": block_timestamp,
+            }
+        )
+    return None
+
+
+def _get_logs_by_addresses(
+    web3: Web3,
+    topics: List[HexStr],
+    addresses: List[str],
+    from_block: int,
+    to_block: int,
+) -> List[Any]:
+    logs: List[Any] = []
+    for i in range(0, len(addresses), LOGS_FILTER_MAX_ADDRESSES):
+        logs.extend(
+            web3.eth.get_logs(
+                {
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "address": [
+                        Web3.toChecksumAddress(address)
+                        for address in addresses[i : i + LOGS_FILTER_MAX_ADDRESSES]
+                    ],
+                    "topics": [topics],
+                }
+            )
+        )
+    return logs
+
+
 def populate_with_events(
     db_session: Session,
     web3: Web3,
@@ -269,20 +454,40 @@ def populate_with_events(
     from_block: int,
     to_block: int,
     batch_size: int = 100,
-):
+    strategy: str = POPULATE_AUTO,
+    addresses: Optional[List[str]] = None,
+    rpc_batch_size: int = 100,
+    receipts_workers: int = 1,
+) -> None:
+    """
+    Populate label_name labels with events of abi emitted in transactions
+    labeled with populate_from_label.
+
+    Each batch of blocks requests only logs related to labeled transactions:
+    with POPULATE_BY_RECEIPTS receipts of labeled transactions are fetched,
+    with POPULATE_BY_ADDRESSES logs of events abi are requested for addresses,
+    which are required for it, as populated events could be emitted by any contract.
+    POPULATE_AUTO chooses cheaper query with PopulateCostModel if addresses
+    are given and fetches receipts otherwise. Decoded events are inserted
+    batch by batch.
+    """
+    assert strategy in POPULATE_STRATEGIES, f"Unknown populate strategy {strategy}"
+    if strategy == POPULATE_BY_ADDRESSES and not addresses:
+        raise ValueError(
+            f"Addresses of contracts are required for {POPULATE_BY_ADDRESSES} strategy"
+        )
 
     current_block = from_block
 
-    events_abi = [event for event in abi if event["type"] == "event"]
+    topics_index = make_events_topics_index(abi)
     label_model = get_label_model(blockchain_type)
+    cost_model = PopulateCostModel()
 
     pbar = tqdm(total=(to_block - from_block + 1))
     pbar.set_description(f"Populating events for  blocks {from_block}-{to_block}")
 
     while current_block <= to_block:
         batch_end = min(current_block + batch_size, to_block)
-        events = []
-        logger.info("Fetching events")
         txs = (
             db_session.query(
                 label_model.transaction_hash,
@@ -307,19 +512,44 @@ def populate_with_events(
             current_block = batch_end + 1
             continue
 
-        for event_abi in events_abi:
-            raw_events = _fetch_events_chunk(
+        blocks = batch_end - current_block + 1
+        batch_strategy = strategy
+        if strategy == POPULATE_AUTO:
+            batch_strategy = (
+                cost_model.choose(len(txs_to_populate), len(addresses), blocks)
+                if addresses
+                else POPULATE_BY_RECEIPTS
+            )
+
+        if batch_strategy == POPULATE_BY_ADDRESSES and addresses:
+            logs = _get_logs_by_addresses(
                 web3,
-                event_abi,
+                [HexStr(topic) for topic in topics_index],
+                addresses,
                 current_block,
                 batch_end,
             )
-            logger.info(f"Fetched {len(raw_events)} events")
-            for raw_event in raw_events:
-                if raw_event["transactionHash"] not in txs_to_populate:
-                    continue
-                raw_event["blockTimestamp"] = block_timestamps[raw_event["blockNumber"]]
-                event = _processEvent(raw_event)
+            cost_model.record_addresses(len(addresses), blocks, len(logs))
+            logs = [
+                log for log in logs if log["transactionHash"].hex() in txs_to_populate
+            ]
+        else:
+            receipts = get_transaction_receipts(
+                web3,
+                list(txs_to_populate),
+                batch_size=rpc_batch_size,
+                workers=receipts_workers,
+            )
+            logs = [log for receipt in receipts.values() for log in receipt["logs"]]
+            cost_model.record_receipts(len(receipts), len(logs))
+        logger.info(f"Fetched {len(logs)} logs by {batch_strategy}")
+
+        events = []
+        for log in logs:
+            event = _decode_log(
+                web3, topics_index, log, block_timestamps[log["blockNumber"]]
+            )
+            if event is not None:
                 events.append(event)
 
         logger.info(f"Found {len(events)} events for populate")
@@ -341,11 +571,24 @@ def crawl(
     crawl_transactions: bool = True,
     addresses: Optional[List[ChecksumAddress]] = None,
     batch_size: int = 100,
+    write_transactions: bool = False,
+    receipts_workers: int = 1,
+    progress_callback: Optional[Callable[[Session, int], None]] = None,
 ) -> None:
+    """
+    Crawl events of abi and, if crawl_transactions is set, calls of transactions
+    which emitted them. Transactions missing in database and their receipts are
+    fetched with batch requests, write_transactions saves fetched transactions.
+    Up to receipts_workers receipts batch requests are sent concurrently.
+
+    progress_callback is called with session and the last crawled block
+    before each batch is committed.
+    """
     current_block = from_block
 
-    db_blocks_cache: Dict[int, int] = {}
+    db_blocks_cache = BlockTimestampsCache()
     contract = web3.eth.contract(abi=abi)
+    secondary_topics_index = make_events_topics_index(secondary_abi)
     # TODO(yhtiyar): load checkpoint
     events_abi = [item for item in abi if item["type"] == "event"]  # type: ignore
 
@@ -388,9 +631,24 @@ def crawl(
             logger.info(f"Fetching {len(transaction_hashes)} transactions")
 
             transactions = _get_transactions(
-                db_session, web3, blockchain_type, transaction_hashes
+                db_session,
+                web3,
+                blockchain_type,
+                transaction_hashes,
+                write_transactions=write_transactions,
             )
             logger.info(f"Fetched {len(transactions)} transactions")
+            receipts = get_transaction_receipts(
+                web3,
+                [transaction["hash"].hex() for transaction in transactions],
+                workers=receipts_workers,
+            )
+            db_blocks_cache.load(
+                db_session,
+                web3,
+                blockchain_type,
+                {transaction["blockNumber"] for transaction in transactions},
+            )
 
             function_calls = []
             for tx in transactions:
@@ -402,6 +660,8 @@ def crawl(
                     secondary_abi,
                     tx,
                     db_blocks_cache,
+                    receipts[tx["hash"].hex()],
+                    secondary_topics_index,
                 )
                 function_calls.append(processed_tx)
                 events.extend(secondary_logs)
@@ -417,11 +677,160 @@ def crawl(
             blockchain_type,
             label_name,
         )
+        if progress_callback is not None:
+            progress_callback(db_session, batch_end)
         commit_session(db_session)
         pbar.update(batch_end - current_block + 1)
         current_block = batch_end + 1
 
 
+def _crawl_range(
+    blockchain_type: AvailableBlockchainType,
+    web3_uri: Optional[str],
+    poa: bool,
+    access_id: Optional[UUID],
+    crawl_range_id: UUID,
+    progress_block: Optional[int],
+    crawl_kwargs: Dict[str, Any],
+) -> None:
+    """
+    Crawl one range in worker process with its own database session
+    and web3 connection, range progress is saved with each batch.
+
+    Raises CrawlRangeRolledBack if range progress was rolled back by chain
+    reorganization, range is continued from rolled back progress on next run.
+    """
+    if web3_uri is not None:
+        web3 = Web3(get_web3_provider(web3_uri))
+        if poa:
+            web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    else:
+        web3 = connect(blockchain_type, access_id=access_id)
+
+    to_block = crawl_kwargs["to_block"]
+    saved_progress_block = progress_block
+
+    def save_progress(db_session: Session, progress_block: int) -> None:
+        nonlocal saved_progress_block
+        update_crawl_range_progress(
+            db_session,
+            crawl_range_id,
+            saved_progress_block,
+            progress_block,
+            finished=progress_block >= to_block,
+        )
+        saved_progress_block = progress_block
+
+    with yield_db_session_ctx() as db_session:
+        crawl(
+            db_session,
+            web3,
+            blockchain_type,
+            progress_callback=save_progress,
+            **crawl_kwargs,
+        )
+
+
+def parallel_crawl(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    label_name: str,
+    abi: List[Dict[str, Any]],
+    secondary_abi: List[Dict[str, Any]],
+    from_block: int,
+    to_block: int,
+    workers: int,
+    shard_size: int = 100000,
+    web3_uri: Optional[str] = None,
+    poa: bool = False,
+    access_id: Optional[UUID] = None,
+    crawl_transactions: bool = True,
+    addresses: Optional[List[ChecksumAddress]] = None,
+    batch_size: int = 100,
+    write_transactions: bool = False,
+    receipts_workers: int = 1,
+) -> None:
+    """
+    Split blocks from from_block to to_block into ranges of shard_size blocks
+    and crawl them with pool of worker processes.
+
+    Ranges progress is stored in crawler_ranges table under label_name,
+    so interrupted crawl continues only with unfinished ranges.
+    """
+    assert workers > 0, "workers must be greater than 0"
+    assert from_block <= to_block, "from_block must be less than to_block"
+
+    crawl_ranges = get_crawl_ranges(
+        db_session,
+        GENERIC_CRAWLER,
+        blockchain_type,
+        label_name,
+        split_range(from_block, to_block, shard_size),
+    )
+    shards: List[Tuple[UUID, Optional[int], int, int]] = [
+        (
+            crawl_range.id,
+            crawl_range.progress_block,
+            crawl_range_start_block(crawl_range),
+            crawl_range.to_block,
+        )
+        for crawl_range in crawl_ranges
+        if not crawl_range.finished
+    ]
+
+    logger.info(
+        f"Crawling {len(shards)} unfinished of {len(crawl_ranges)} ranges "
+        f"from {from_block} to {to_block} with {workers} workers"
+    )
+
+    failed_shards = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=dispose_inherited_connections
+    ) as executor:
+        futures = {
+            executor.submit(
+                _crawl_range,
+                blockchain_type,
+                web3_uri,
+                poa,
+                access_id,
+                crawl_range_id,
+                progress_block,
+                {
+                    "label_name": label_name,
+                    "abi": abi,
+                    "secondary_abi": secondary_abi,
+                    "from_block": shard_from_block,
+                    "to_block": shard_to_block,
+                    "crawl_transactions": crawl_transactions,
+                    "addresses": addresses,
+                    "batch_size": batch_size,
+                    "write_transactions": write_transactions,
+                    "receipts_workers": receipts_workers,
+                },
+            ): (shard_from_block, shard_to_block)
+            for crawl_range_id, progress_block, shard_from_block, shard_to_block in shards
+        }
+        for future in as_completed(futures):
+            shard_from_block, shard_to_block = futures[future]
+            try:
+                future.result()
+                logger.info(
+                    f"Finished range from {shard_from_block} to {shard_to_block}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Range from {shard_from_block} to {shard_to_block} failed: {e}"
+                )
+                failed_shards.append((shard_from_block, shard_to_block))
+
+    if failed_shards:
+        raise Exception(
+            f"{len(failed_shards)} ranges failed, run crawler again to resume them: "
+            f"{failed_shards}"
+        )
+
+
 def get_checkpoint(
     db_session: Session,
     blockchain_type: AvailableBlockchainType,
@@ -9,14 +9,42 @@ from moonstreamdb.db import yield_db_session_ctx
 from web3 import Web3
 from web3.middleware import geth_poa_middleware
 
-from ..blockchain import connect
+from ..blockchain import connect, get_web3_provider
+from ..checkpoints import last_shard_block
 from ..settings import NB_CONTROLLER_ACCESS_ID
-from .base import crawl, get_checkpoint, populate_with_events
+from .base import (
+    POPULATE_BY_ADDRESSES,
+    POPULATE_STRATEGIES,
+    crawl,
+    get_checkpoint,
+    parallel_crawl,
+    populate_with_events,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def _get_parallel_to_block(args: argparse.Namespace, web3: Web3) -> int:
+    """
+    Without --end_block parallel crawl ends at the last complete shard,
+    so its top range is the same between runs and its progress is kept.
+    """
+    if args.end_block is not None:
+        return args.end_block
+
+    to_block = last_shard_block(web3.eth.block_number, args.shard_size)
+    if to_block < args.start_block:
+        raise ValueError(
+            f"No complete shard of {args.shard_size} blocks after start block "
+            f"{args.start_block}, set --end_block"
+        )
+    logger.info(
+        f"No end block provided, using last block of complete shard: {to_block}"
+    )
+    return to_block
+
+
 def handle_nft_crawler(args: argparse.Namespace) -> None:
     logger.info(f"Starting NFT crawler")
 
@@ -42,12 +70,31 @@ def handle_nft_crawler(args: argparse.Namespace) -> None:
             web3 = connect(blockchain_type, access_id=args.access_id)
         else:
             logger.info(f"Using web3 provider URL: {args.web3}")
-            web3 = Web3(
-                Web3.HTTPProvider(args.web3),
-            )
+            web3 = Web3(get_web3_provider(args.web3))
             if args.poa:
                 logger.info("Using PoA middleware")
                 web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+
+        if args.workers > 1:
+            parallel_crawl(
+                db_session,
+                blockchain_type,
+                label,
+                abi,
+                [],
+                from_block,
+                _get_parallel_to_block(args, web3),
+                args.workers,
+                shard_size=args.shard_size,
+                web3_uri=args.web3,
+                poa=args.poa,
+                access_id=args.access_id,
+                batch_size=args.max_blocks_batch,
+                write_transactions=args.write_transactions,
+                receipts_workers=args.receipts_workers,
+            )
+            return
+
         last_crawled_block = get_checkpoint(
             db_session, blockchain_type, from_block, to_block, label
         )
@@ -63,12 +110,19 @@ def handle_nft_crawler(args: argparse.Namespace) -> None:
             from_block=last_crawled_block,
             to_block=to_block,
             batch_size=args.max_blocks_batch,
+            write_transactions=args.write_transactions,
+            receipts_workers=args.receipts_workers,
         )
 
 
 def populate_with_erc20_transfers(args: argparse.Namespace) -> None:
     logger.info(f"Starting erc20 transfer crawler")
 
+    if args.strategy == POPULATE_BY_ADDRESSES and not args.addresses:
+        raise ValueError(
+            f"--addresses are required for {POPULATE_BY_ADDRESSES} strategy"
+        )
+
     label = args.label_name
     from_block = args.start_block
     to_block = args.end_block
@@ -94,9 +148,7 @@ def populate_with_erc20_transfers(args: argparse.Namespace) -> None:
             web3 = connect(blockchain_type, access_id=args.access_id)
         else:
             logger.info(f"Using web3 provider URL: {args.web3}")
-            web3 = Web3(
-                Web3.HTTPProvider(args.web3),
-            )
+            web3 = Web3(get_web3_provider(args.web3))
             if args.poa:
                 logger.info("Using PoA middleware")
                 web3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -115,6 +167,9 @@ def populate_with_erc20_transfers(args: argparse.Namespace) -> None:
             last_crawled_block,
             to_block,
             batch_size=args.max_blocks_batch,
+            strategy=args.strategy,
+            addresses=args.addresses.split(",") if args.addresses else None,
+            receipts_workers=args.receipts_workers,
         )
 
 
@@ -140,18 +195,38 @@ def handle_crawl(args: argparse.Namespace) -> None:
             web3 = connect(blockchain_type, access_id=args.access_id)
         else:
             logger.info(f"Using web3 provider URL: {args.web3}")
-            web3 = Web3(
-                Web3.HTTPProvider(args.web3),
-            )
+            web3 = Web3(get_web3_provider(args.web3))
             if args.poa:
                 logger.info("Using PoA middleware")
                 web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        crawl_transaction = not args.disable_transactions
+
+        if args.workers > 1:
+            parallel_crawl(
+                db_session,
+                blockchain_type,
+                label,
+                abi,
+                [],
+                from_block,
+                _get_parallel_to_block(args, web3),
+                args.workers,
+                shard_size=args.shard_size,
+                web3_uri=args.web3,
+                poa=args.poa,
+                access_id=args.access_id,
+                crawl_transactions=crawl_transaction,
+                batch_size=args.max_blocks_batch,
+                write_transactions=args.write_transactions,
+                receipts_workers=args.receipts_workers,
+            )
+            return
+
         last_crawled_block = get_checkpoint(
             db_session, blockchain_type, from_block, to_block, label
         )
 
         logger.info(f"Starting from block: {last_crawled_block}")
-        crawl_transaction = not args.disable_transactions
         crawl(
             db_session,
             web3,
@@ -163,6 +238,8 @@ def handle_crawl(args: argparse.Namespace) -> None:
             to_block=to_block,
             crawl_transactions=crawl_transaction,
             batch_size=args.max_blocks_batch,
+            write_transactions=args.write_transactions,
+            receipts_workers=args.receipts_workers,
         )
 
 
@@ -200,7 +277,7 @@ def main():
         "--web3",
         type=str,
         default=None,
-        help="Web3 provider URL",
+        help="Web3 provider URL, several comma separated URLs are used as provider pool",
     )
 
     crawl_parser.add_argument(
@@ -228,6 +305,34 @@ def main():
         help="Maximum number of blocks to crawl in a single crawl step",
     )
 
+    crawl_parser.add_argument(
+        "--write_transactions",
+        action="store_true",
+        default=False,
+        help="Save transactions fetched from node to database",
+    )
+
+    crawl_parser.add_argument(
+        "--receipts_workers",
+        type=int,
+        default=1,
+        help="Number of concurrent transactions receipts batch requests",
+    )
+
+    crawl_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes crawling disjoint block ranges, progress of ranges is saved to resume unfinished ones",
+    )
+
+    crawl_parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=100000,
+        help="Number of blocks in one range crawled by worker",
+    )
+
     crawl_parser.add_argument(
         "--label_name",
         type=str,
@@ -252,7 +357,7 @@ def main():
         "--web3",
         type=str,
         default=None,
-        help="Web3 provider URL",
+        help="Web3 provider URL, several comma separated URLs are used as provider pool",
     )
 
     nft_crawler_parser.add_argument(
@@ -280,6 +385,34 @@ def main():
         help="Maximum number of blocks to crawl in a single crawl step",
     )
 
+    nft_crawler_parser.add_argument(
+        "--write_transactions",
+        action="store_true",
+        default=False,
+        help="Save transactions fetched from node to database",
+    )
+
+    nft_crawler_parser.add_argument(
+        "--receipts_workers",
+        type=int,
+        default=1,
+        help="Number of concurrent transactions receipts batch requests",
+    )
+
+    nft_crawler_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes crawling disjoint block ranges, progress of ranges is saved to resume unfinished ones",
+    )
+
+    nft_crawler_parser.add_argument(
+        "--shard_size",
+        type=int,
+        default=100000,
+        help="Number of blocks in one range crawled by worker",
+    )
+
     nft_crawler_parser.add_argument(
         "--label_name",
         type=str,
@@ -304,7 +437,7 @@ def main():
         "--web3",
         type=str,
         default=None,
-        help="Web3 provider URL",
+        help="Web3 provider URL, several comma separated URLs are used as provider pool",
     )
 
     erc20_populate_parser.add_argument(
@@ -353,6 +486,28 @@ def main():
         help="Abi of the erc20 contract",
     )
 
+    erc20_populate_parser.add_argument(
+        "--strategy",
+        type=str,
+        default="auto",
+        choices=POPULATE_STRATEGIES,
+        help="Fetch logs of --addresses (required for addresses strategy), receipts of labeled transactions or choose cheaper of them",
+    )
+
+    erc20_populate_parser.add_argument(
+        "--addresses",
+        type=str,
+        default=None,
+        help="Comma separated addresses of contracts emitting populated events",
+    )
+
+    erc20_populate_parser.add_argument(
+        "--receipts_workers",
+        type=int,
+        default=1,
+        help="Number of concurrent transactions receipts batch requests",
+    )
+
     erc20_populate_parser.set_defaults(func=populate_with_erc20_transfers)
 
     args = parser.parse_args()
@@ -0,0 +1,42 @@
+import unittest
+
+from .base import POPULATE_BY_ADDRESSES, POPULATE_BY_RECEIPTS, PopulateCostModel
+
+
+class TestPopulateCostModel(unittest.TestCase):
+    def test_receipts_cost_uses_default_before_records(self):
+        cost_model = PopulateCostModel(logs_per_receipt=3)
+        self.assertEqual(cost_model.receipts_cost(10), 30)
+
+    def test_receipts_cost_uses_observed_average(self):
+        cost_model = PopulateCostModel(logs_per_receipt=3)
+        cost_model.record_receipts(10, 80)
+        cost_model.record_receipts(10, 20)
+        self.assertEqual(cost_model.receipts_cost(4), 20)
+
+    def test_addresses_cost_unknown_before_records(self):
+        cost_model = PopulateCostModel()
+        self.assertIsNone(cost_model.addresses_cost(2, 100))
+
+    def test_addresses_cost_scales_with_addresses_and_blocks(self):
+        cost_model = PopulateCostModel()
+        cost_model.record_addresses(2, 100, 50)
+        self.assertEqual(cost_model.addresses_cost(4, 100), 100)
+        self.assertEqual(cost_model.addresses_cost(2, 50), 25)
+
+    def test_choose_measures_addresses_first(self):
+        cost_model = PopulateCostModel()
+        self.assertEqual(cost_model.choose(1, 1000, 1000), POPULATE_BY_ADDRESSES)
+
+    def test_choose_cheaper_query(self):
+        cost_model = PopulateCostModel(logs_per_receipt=5)
+        cost_model.record_addresses(1, 100, 10)
+        # 10 transactions cost 50 logs, 1 address in 100 blocks costs 10 logs
+        self.assertEqual(cost_model.choose(10, 1, 100), POPULATE_BY_ADDRESSES)
+        # 1 transaction costs 5 logs, 10 addresses in 100 blocks cost 100 logs
+        self.assertEqual(cost_model.choose(1, 10, 100), POPULATE_BY_RECEIPTS)
+
+    def test_choose_receipts_on_equal_cost(self):
+        cost_model = PopulateCostModel(logs_per_receipt=5)
+        cost_model.record_addresses(1, 100, 50)
+        self.assertEqual(cost_model.choose(10, 1, 100), POPULATE_BY_RECEIPTS)
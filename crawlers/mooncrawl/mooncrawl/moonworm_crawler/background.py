@@ -0,0 +1,114 @@
+"""
+Side tasks of continuous crawler which talk to Bugout API, run in background
+threads so slow API responses do not stall crawling.
+"""
+import copy
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+from moonstreamdb.blockchain import AvailableBlockchainType
+
+from .crawler import heartbeat
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class HeartbeatWorker:
+    """
+    Sends crawler heartbeats from background thread.
+
+    Crawl loop only hands over status with send(), if several statuses are
+    sent while previous heartbeat is in flight, only the latest one is sent.
+    """
+
+    def __init__(
+        self, crawler_type: str, blockchain_type: AvailableBlockchainType
+    ) -> None:
+        self.crawler_type = crawler_type
+        self.blockchain_type = blockchain_type
+
+        self._status: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"{crawler_type}-heartbeat", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def send(self, crawler_status: Dict[str, Any]) -> None:
+        with self._lock:
+            self._status = copy.deepcopy(crawler_status)
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                crawler_status = self._status
+                self._status = None
+            if crawler_status is None:
+                continue
+            try:
+                heartbeat(
+                    crawler_type=self.crawler_type,
+                    blockchain_type=self.blockchain_type,
+                    crawler_status=crawler_status,
+                )
+            except Exception as e:
+                logger.error(f"Failed to send heartbeat: {e}")
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+
+
+class JobsRefetchWorker(Generic[T]):
+    """
+    Calls fetch every interval seconds in background thread.
+
+    Fetched updates are queued, crawl loop takes them with get_updates() and
+    applies them itself, so crawl jobs are never changed during crawl step.
+    """
+
+    def __init__(self, fetch: Callable[[], T], interval: float) -> None:
+        assert interval > 0, "interval must be greater than 0"
+        self.fetch = fetch
+        self.interval = interval
+
+        self._updates: "queue.Queue[T]" = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="jobs-refetch", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def get_updates(self) -> List[T]:
+        updates: List[T] = []
+        while True:
+            try:
+                updates.append(self._updates.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self._updates.put(self.fetch())
+            except Exception as e:
+                logger.error(f"Failed to refetch crawl jobs: {e}")
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopped.set()
+        self._thread.join(timeout)
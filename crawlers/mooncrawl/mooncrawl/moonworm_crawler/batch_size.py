@@ -0,0 +1,142 @@
+import logging
+from typing import Any, Dict
+
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Parts of node errors returned when eth_getLogs range or response is too large
+PROVIDER_LIMIT_ERRORS = [
+    "query returned more than",
+    "too many results",
+    "response size exceeded",
+    "response size should not",
+    "block range",
+    "limit exceeded",
+    "query timeout",
+    "request timed out",
+]
+
+# HTTP statuses of node responses to too large requests
+PROVIDER_LIMIT_HTTP_STATUSES = [413, 504]
+
+
+def is_provider_limit_error(error: Exception) -> bool:
+    """
+    Checks if error means that request should be retried with smaller block range.
+
+    Only node errors are checked: requests timeouts and HTTP errors, and
+    JSON-RPC errors which web3 raises as ValueError. Errors of database or
+    other APIs are never limit errors, even if their message looks alike.
+    """
+    if isinstance(error, requests.exceptions.Timeout):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        if (
+            error.response is not None
+            and error.response.status_code in PROVIDER_LIMIT_HTTP_STATUSES
+        ):
+            return True
+    elif not isinstance(error, ValueError):
+        return False
+    message = str(error).lower()
+    return any(limit_error in message for limit_error in PROVIDER_LIMIT_ERRORS)
+
+
+class BatchSizeController:
+    """
+    Adaptive size of blocks window crawled in one step.
+
+    Window grows while step takes less than half of target_seconds and returns
+    less than half of target_results items, shrinks proportionally when targets
+    are exceeded and is halved on provider limit errors.
+    """
+
+    def __init__(
+        self,
+        initial_size: int,
+        min_size: int = 1,
+        max_size: int = 1000,
+        target_seconds: float = 10,
+        target_results: int = 5000,
+        growth_factor: float = 1.5,
+    ) -> None:
+        assert min_size > 0, "min_size must be greater than 0"
+        assert max_size >= min_size, "max_size must be greater than min_size"
+        assert target_seconds > 0, "target_seconds must be greater than 0"
+        assert target_results > 0, "target_results must be greater than 0"
+        assert growth_factor > 1, "growth_factor must be greater than 1"
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.target_results = target_results
+        self.growth_factor = growth_factor
+        self.size = self._bound(initial_size)
+
+        self.last_seconds: float = 0
+        self.last_results: int = 0
+        self.limit_errors: int = 0
+
+    def _bound(self, size: float) -> int:
+        return max(self.min_size, min(self.max_size, int(size)))
+
+    def record_success(self, blocks: int, seconds: float, results: int) -> None:
+        """
+        Update window size after crawled step of blocks number of blocks.
+        """
+        self.last_seconds = seconds
+        self.last_results = results
+
+        # Window was shortened by chain tip, it says nothing about larger windows
+        if blocks < self.size and (
+            seconds <= self.target_seconds and results <= self.target_results
+        ):
+            return
+
+        load = max(seconds / self.target_seconds, results / self.target_results)
+        if load > 1:
+            new_size = self._bound(blocks / load)
+        elif load < 0.5:
+            new_size = self._bound(max(self.size * self.growth_factor, self.size + 1))
+        else:
+            return
+
+        if new_size != self.size:
+            logger.info(
+                f"Changing blocks batch size from {self.size} to {new_size} "
+                f"(step took {seconds:.2f} seconds, returned {results} results)"
+            )
+            self.size = new_size
+
+    def record_failure(self, error: Exception) -> bool:
+        """
+        Halves window on provider limit error.
+
+        Returns True if step should be retried with smaller window.
+        """
+        if not is_provider_limit_error(error):
+            return False
+
+        self.limit_errors += 1
+        if self.size == self.min_size:
+            return False
+
+        new_size = self._bound(self.size // 2)
+        logger.warning(
+            f"Provider limit error, changing blocks batch size from {self.size} "
+            f"to {new_size}: {error}"
+        )
+        self.size = new_size
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "last_seconds": round(self.last_seconds, 3),
+            "last_results": self.last_results,
+            "limit_errors": self.limit_errors,
+        }
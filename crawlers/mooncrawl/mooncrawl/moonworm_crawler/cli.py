@@ -1,5 +1,6 @@
 import argparse
 import logging
+import os
 from typing import Optional
 from uuid import UUID
 
@@ -8,7 +9,13 @@ from moonstreamdb.db import yield_db_session_ctx
 from web3 import Web3
 from web3.middleware import geth_poa_middleware
 
-from ..settings import MOONSTREAM_MOONWORM_TASKS_JOURNAL, NB_CONTROLLER_ACCESS_ID
+from ..blockchain import get_web3_provider
+from ..checkpoints import MOONWORM_CONTINUOUS_CRAWLER, get_checkpoint, last_shard_block
+from ..settings import (
+    MOONSTREAM_MOONWORM_JOBS_SNAPSHOT_DIR,
+    MOONSTREAM_MOONWORM_TASKS_JOURNAL,
+    NB_CONTROLLER_ACCESS_ID,
+)
 from .continuous_crawler import _retry_connect_web3, continuous_crawler
 from .crawler import (
     SubscriptionTypes,
@@ -18,7 +25,8 @@ from .crawler import (
     make_function_call_crawl_jobs,
 )
 from .db import get_first_labeled_block_number, get_last_labeled_block_number
-from .historical_crawler import historical_crawler
+from .historical_crawler import historical_crawler, parallel_historical_crawler
+from .jobs_sync import CrawlJobsSync
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,24 +35,20 @@ logger = logging.getLogger(__name__)
 def handle_crawl(args: argparse.Namespace) -> None:
 
     blockchain_type = AvailableBlockchainType(args.blockchain_type)
-    subscription_type = blockchain_type_to_subscription_type(blockchain_type)
 
-    initial_event_jobs = make_event_crawl_jobs(
-        get_crawl_job_entries(
-            subscription_type,
-            "event",
-            MOONSTREAM_MOONWORM_TASKS_JOURNAL,
+    jobs_snapshot_path: Optional[str] = None
+    if args.jobs_snapshot_dir is not None:
+        os.makedirs(args.jobs_snapshot_dir, exist_ok=True)
+        jobs_snapshot_path = os.path.join(
+            args.jobs_snapshot_dir, f"moonworm_jobs_{blockchain_type.value}.json"
         )
-    )
+    crawl_jobs_sync = CrawlJobsSync(blockchain_type, snapshot_path=jobs_snapshot_path)
+    crawl_jobs_sync.load()
+
+    initial_event_jobs = crawl_jobs_sync.registry.event_jobs
     logger.info(f"Initial event crawl jobs count: {len(initial_event_jobs)}")
 
-    initial_function_call_jobs = make_function_call_crawl_jobs(
-        get_crawl_job_entries(
-            subscription_type,
-            "function",
-            MOONSTREAM_MOONWORM_TASKS_JOURNAL,
-        )
-    )
+    initial_function_call_jobs = crawl_jobs_sync.registry.function_call_jobs
     logger.info(
         f"Initial function call crawl jobs count: {len(initial_function_call_jobs)}"
     )
@@ -59,11 +63,7 @@ def handle_crawl(args: argparse.Namespace) -> None:
             web3 = _retry_connect_web3(blockchain_type, access_id=args.access_id)
         else:
             logger.info(f"Using web3 provider URL: {args.web3}")
-            web3 = Web3(
-                Web3.HTTPProvider(
-                    args.web3,
-                )
-            )
+            web3 = Web3(get_web3_provider(args.web3))
             if args.poa:
                 logger.info("Using PoA middleware")
                 web3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -71,10 +71,19 @@ def handle_crawl(args: argparse.Namespace) -> None:
         last_labeled_block = get_last_labeled_block_number(db_session, blockchain_type)
         logger.info(f"Last labeled block: {last_labeled_block}")
 
+        checkpoint = get_checkpoint(
+            db_session, MOONWORM_CONTINUOUS_CRAWLER, blockchain_type
+        )
+        last_committed_block = checkpoint.last_block if checkpoint is not None else None
+        logger.info(f"Last committed block: {last_committed_block}")
+
         start_block = args.start
         if start_block is None:
             logger.info("No start block provided")
-            if last_labeled_block is not None:
+            if last_committed_block is not None:
+                start_block = last_committed_block + 1
+                logger.info(f"Using block after last committed as start: {start_block}")
+            elif last_labeled_block is not None:
                 start_block = last_labeled_block - 1
                 logger.info(f"Using last labeled block as start: {start_block}")
             else:
@@ -112,6 +121,13 @@ def handle_crawl(args: argparse.Namespace) -> None:
             args.heartbeat_interval,
             args.new_jobs_refetch_interval,
             access_id=args.access_id,
+            single_logs_request=args.single_logs_request,
+            max_adaptive_blocks_batch=args.max_adaptive_blocks_batch,
+            crawl_jobs_sync=crawl_jobs_sync,
+            batched_function_calls=args.batched_function_calls,
+            db_function_calls=args.db_function_calls,
+            max_buffered_labels=args.max_buffered_labels,
+            flush_interval=args.flush_interval,
         )
 
 
@@ -169,15 +185,44 @@ def handle_historical_crawl(args: argparse.Namespace) -> None:
             web3 = _retry_connect_web3(blockchain_type, access_id=args.access_id)
         else:
             logger.info(f"Using web3 provider URL: {args.web3}")
-            web3 = Web3(
-                Web3.HTTPProvider(
-                    args.web3,
-                )
-            )
+            web3 = Web3(get_web3_provider(args.web3))
             if args.poa:
                 logger.info("Using PoA middleware")
                 web3.middleware_onion.inject(geth_poa_middleware, layer=0)
 
+        if args.workers > 1:
+            start_block = args.start
+            if start_block is None:
+                start_block = last_shard_block(web3.eth.block_number, args.shard_size)
+                logger.info(
+                    f"No start block provided, using last block of complete shard: "
+                    f"{start_block}"
+                )
+            if start_block < args.end:
+                raise ValueError(
+                    f"Start block {start_block} is less than end block {args.end}. This crawler crawls in the reverse direction."
+                )
+            parallel_historical_crawler(
+                db_session,
+                blockchain_type,
+                args.address if not args.only_events else f"{args.address}:events",
+                filtered_event_jobs,
+                filtered_function_call_jobs,
+                start_block,
+                args.end,
+                args.workers,
+                shard_size=args.shard_size,
+                web3_uri=args.web3,
+                poa=args.poa,
+                max_blocks_batch=args.max_blocks_batch,
+                min_sleep_time=args.min_sleep_time,
+                access_id=args.access_id,
+                max_adaptive_blocks_batch=args.max_adaptive_blocks_batch,
+                batched_function_calls=args.batched_function_calls,
+                db_function_calls=args.db_function_calls,
+            )
+            return
+
         last_labeled_block = get_first_labeled_block_number(
             db_session, blockchain_type, args.address, only_events=args.only_events
         )
@@ -227,6 +272,9 @@ def handle_historical_crawl(args: argparse.Namespace) -> None:
             args.max_blocks_batch,
             args.min_sleep_time,
             access_id=args.access_id,
+            max_adaptive_blocks_batch=args.max_adaptive_blocks_batch,
+            batched_function_calls=args.batched_function_calls,
+            db_function_calls=args.db_function_calls,
         )
 
 
@@ -264,7 +312,7 @@ def main() -> None:
         "--web3",
         type=str,
         default=None,
-        help="Web3 provider URL",
+        help="Web3 provider URL, several comma separated URLs are used as provider pool",
     )
     crawl_parser.add_argument(
         "--poa",
@@ -278,7 +326,14 @@ def main() -> None:
         "-m",
         type=int,
         default=80,
-        help="Maximum number of blocks to crawl in a single batch",
+        help="Initial number of blocks to crawl in a single batch, it is adapted to node response time and results count",
+    )
+
+    crawl_parser.add_argument(
+        "--max-adaptive-blocks-batch",
+        type=int,
+        default=1000,
+        help="Upper bound for adaptive number of blocks to crawl in a single batch",
     )
 
     crawl_parser.add_argument(
@@ -328,6 +383,51 @@ def main() -> None:
         help="Force start from the start block",
     )
 
+    crawl_parser.add_argument(
+        "--single-logs-request",
+        action="store_true",
+        default=False,
+        help="Fetch logs of all event jobs with one eth_getLogs request per batch and decode them locally",
+    )
+
+    crawl_parser.add_argument(
+        "--batched-function-calls",
+        action="store_true",
+        default=False,
+        help="Crawl function calls of all jobs with one pass over blocks transactions and batched receipts requests",
+    )
+
+    crawl_parser.add_argument(
+        "--db-function-calls",
+        action="store_true",
+        default=False,
+        help="Select function calls transactions from blocks stored in database, fetch only missing blocks and receipts from node",
+    )
+
+    crawl_parser.add_argument(
+        "--max-buffered-labels",
+        type=int,
+        default=10000,
+        help="Commit crawled labels when this many of them are buffered",
+    )
+
+    crawl_parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=10,
+        help="Commit crawled labels at least every this many seconds",
+    )
+
+    crawl_parser.add_argument(
+        "--jobs-snapshot-dir",
+        type=str,
+        default=MOONSTREAM_MOONWORM_JOBS_SNAPSHOT_DIR,
+        help=(
+            "Directory for local snapshot of crawl jobs, crawler starts from it"
+            " and requests only jobs updated since snapshot"
+        ),
+    )
+
     crawl_parser.set_defaults(func=handle_crawl)
 
     historical_crawl_parser = subparsers.add_parser(
@@ -361,7 +461,7 @@ def main() -> None:
         "--web3",
         type=str,
         default=None,
-        help="Web3 provider URL",
+        help="Web3 provider URL, several comma separated URLs are used as provider pool",
     )
     historical_crawl_parser.add_argument(
         "--poa",
@@ -375,7 +475,28 @@ def main() -> None:
         "-m",
         type=int,
         default=80,
-        help="Maximum number of blocks to crawl in a single batch",
+        help="Initial number of blocks to crawl in a single batch, it is adapted to node response time and results count",
+    )
+
+    historical_crawl_parser.add_argument(
+        "--max-adaptive-blocks-batch",
+        type=int,
+        default=1000,
+        help="Upper bound for adaptive number of blocks to crawl in a single batch",
+    )
+
+    historical_crawl_parser.add_argument(
+        "--batched-function-calls",
+        action="store_true",
+        default=False,
+        help="Crawl function calls of all jobs with one pass over blocks transactions and batched receipts requests",
+    )
+
+    historical_crawl_parser.add_argument(
+        "--db-function-calls",
+        action="store_true",
+        default=False,
+        help="Select function calls transactions from blocks stored in database, fetch only missing blocks and receipts from node",
     )
 
     historical_crawl_parser.add_argument(
@@ -398,6 +519,21 @@ def main() -> None:
         default=False,
         help="Only crawl events",
     )
+    historical_crawl_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes crawling shards of blocks range in parallel,"
+            " progress of shards is stored and unfinished shards are resumed on restart"
+        ),
+    )
+    historical_crawl_parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=100000,
+        help="Number of blocks in one shard for --workers > 1",
+    )
     historical_crawl_parser.set_defaults(func=handle_historical_crawl)
 
     args = parser.parse_args()
@@ -2,9 +2,10 @@ import logging
 import time
 import traceback
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Any, List, Optional, Tuple
 from uuid import UUID
 
+from bugout.data import BugoutSearchResult
 from moonstreamdb.blockchain import AvailableBlockchainType
 from moonworm.crawler.moonstream_ethereum_state_provider import (  # type: ignore
     MoonstreamEthereumStateProvider,
@@ -13,7 +14,13 @@ from moonworm.crawler.networks import Network  # type: ignore
 from sqlalchemy.orm.session import Session
 from web3 import Web3
 
+from ..block_timestamps import BlockTimestampsCache
+from ..checkpoints import MOONWORM_CONTINUOUS_CRAWLER
+from ..provider_pool import PooledHTTPProvider
+from .background import HeartbeatWorker, JobsRefetchWorker
+from .batch_size import BatchSizeController
 from .crawler import (
+    CrawlJobRegistry,
     EventCrawlJob,
     FunctionCallCrawlJob,
     _retry_connect_web3,
@@ -22,12 +29,11 @@ from .crawler import (
     heartbeat,
     make_event_crawl_jobs,
     make_function_call_crawl_jobs,
-    merge_event_crawl_jobs,
-    merge_function_call_crawl_jobs,
 )
-from .db import add_events_to_session, add_function_calls_to_session, commit_session
+from .db import LabelsWriteBuffer
 from .event_crawler import _crawl_events
-from .function_call_crawler import _crawl_functions
+from .function_call_crawler import _crawl_functions, _crawl_functions_batched
+from .jobs_sync import CrawlJobsSync
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -37,49 +43,44 @@ def _date_to_str(date: datetime) -> str:
     return date.strftime("%Y-%m-%d %H:%M:%S")
 
 
-def _refetch_new_jobs(
-    old_event_jobs: List[EventCrawlJob],
-    old_function_call_jobs: List[FunctionCallCrawlJob],
+def _fetch_new_jobs_entries(
+    crawl_job_registry: CrawlJobRegistry,
     blockchain_type: AvailableBlockchainType,
-) -> Tuple[List[EventCrawlJob], List[FunctionCallCrawlJob]]:
+) -> Tuple[List[BugoutSearchResult], List[BugoutSearchResult]]:
     """
-    Refetches new jobs from bugout journal, merges, and returns new jobs.
+    Fetches entries of jobs created since newest jobs in registry from bugout journal.
     """
-
-    max_created_at_event_job = max(job.created_at for job in old_event_jobs)
-    max_created_at_function_call_job = max(
-        job.created_at for job in old_function_call_jobs
-    )
-
     logger.info("Looking for new event crawl jobs.")
-    old_event_jobs_length = len(old_event_jobs)
     new_event_entries = get_crawl_job_entries(
         subscription_type=blockchain_type_to_subscription_type(blockchain_type),
         crawler_type="event",
-        created_at_filter=max_created_at_event_job,
-    )
-    new_event_jobs = make_event_crawl_jobs(new_event_entries)
-    event_crawl_jobs = merge_event_crawl_jobs(old_event_jobs, new_event_jobs)
-    logger.info(
-        f"Found {len(event_crawl_jobs) - old_event_jobs_length} new event crawl jobs. "
+        created_at_filter=crawl_job_registry.max_event_created_at,
     )
 
     logger.info("Looking for new function call crawl jobs.")
-    old_function_call_jobs_length = len(old_function_call_jobs)
     new_function_entries = get_crawl_job_entries(
         subscription_type=blockchain_type_to_subscription_type(blockchain_type),
         crawler_type="function",
-        created_at_filter=max_created_at_function_call_job,
-    )
-    new_function_call_jobs = make_function_call_crawl_jobs(new_function_entries)
-    function_call_crawl_jobs = merge_function_call_crawl_jobs(
-        old_function_call_jobs, new_function_call_jobs
+        created_at_filter=crawl_job_registry.max_function_call_created_at,
     )
-    logger.info(
-        f"Found {len(function_call_crawl_jobs) - old_function_call_jobs_length} new function call crawl jobs. "
+
+    return new_event_entries, new_function_entries
+
+
+def _add_new_jobs(
+    crawl_job_registry: CrawlJobRegistry,
+    new_jobs_entries: Tuple[List[BugoutSearchResult], List[BugoutSearchResult]],
+) -> None:
+    new_event_entries, new_function_entries = new_jobs_entries
+    added_event_jobs = crawl_job_registry.add_event_jobs(
+        make_event_crawl_jobs(new_event_entries)
     )
+    logger.info(f"Found {added_event_jobs} new event crawl jobs. ")
 
-    return event_crawl_jobs, function_call_crawl_jobs
+    added_function_call_jobs = crawl_job_registry.add_function_call_jobs(
+        make_function_call_crawl_jobs(new_function_entries)
+    )
+    logger.info(f"Found {added_function_call_jobs} new function call crawl jobs. ")
 
 
 def continuous_crawler(
@@ -96,13 +97,39 @@ def continuous_crawler(
     heartbeat_interval: float = 60,
     new_jobs_refetch_interval: float = 120,
     access_id: Optional[UUID] = None,
+    single_logs_request: bool = False,
+    max_adaptive_blocks_batch: int = 1000,
+    crawl_jobs_sync: Optional[CrawlJobsSync] = None,
+    batched_function_calls: bool = False,
+    db_function_calls: bool = False,
+    max_buffered_labels: int = 10000,
+    flush_interval: float = 10,
 ):
+    """
+    Crawl events and function calls of jobs following blockchain head.
+
+    If crawl_jobs_sync is given, its registry is used as jobs source and
+    periodic refetch applies added, updated and deactivated jobs. Otherwise
+    only new jobs are added on refetch. Jobs are refetched and heartbeats are
+    sent by background threads, fetched jobs are applied between crawl steps.
+
+    If batched_function_calls is set, function calls of all jobs are crawled
+    with one pass over blocks transactions instead of one crawl per job.
+    db_function_calls additionally selects transactions of blocks stored by
+    blocks crawler from database.
+
+    Labels are buffered and committed together with moonworm_continuous checkpoint
+    when buffer holds max_buffered_labels labels or flush_interval seconds passed.
+    """
     crawler_type = "continuous"
     assert (
         min_blocks_batch < max_blocks_batch
     ), "min_blocks_batch must be less than max_blocks_batch"
     assert min_blocks_batch > 0, "min_blocks_batch must be greater than 0"
     assert max_blocks_batch > 0, "max_blocks_batch must be greater than 0"
+    assert (
+        max_adaptive_blocks_batch >= max_blocks_batch
+    ), "max_adaptive_blocks_batch must be greater than max_blocks_batch"
     assert confirmations > 0, "confirmations must be greater than 0"
     assert min_sleep_time > 0, "min_sleep_time must be greater than 0"
     assert heartbeat_interval > 0, "heartbeat_interval must be greater than 0"
@@ -133,6 +160,19 @@ def continuous_crawler(
         db_session,
     )
 
+    if crawl_jobs_sync is not None:
+        crawl_job_registry = crawl_jobs_sync.registry
+    else:
+        crawl_job_registry = CrawlJobRegistry(
+            event_crawl_jobs, function_call_crawl_jobs
+        )
+    event_crawl_jobs = crawl_job_registry.event_jobs
+    function_call_crawl_jobs = crawl_job_registry.function_call_jobs
+
+    batch_size_controller = BatchSizeController(
+        initial_size=max_blocks_batch, max_size=max_adaptive_blocks_batch
+    )
+
     heartbeat_template = {
         "status": "crawling",
         "start_block": start_block,
@@ -142,17 +182,36 @@ def continuous_crawler(
         "current_event_jobs_length": len(event_crawl_jobs),
         "current_function_call_jobs_length": len(function_call_crawl_jobs),
         "jobs_last_refetched_at": _date_to_str(jobs_refetchet_time),
+        "blocks_batch": batch_size_controller.to_dict(),
     }
 
     logger.info(f"Starting continuous event crawler start_block={start_block}")
+    heartbeat_worker = HeartbeatWorker(crawler_type, blockchain_type)
+    heartbeat_worker.start()
     logger.info("Sending initial heartbeat")
-    heartbeat(
-        crawler_type=crawler_type,
-        blockchain_type=blockchain_type,
-        crawler_status=heartbeat_template,
-    )
+    heartbeat_worker.send(heartbeat_template)
+
+    jobs_refetch_worker: JobsRefetchWorker[Any]
+    if crawl_jobs_sync is not None:
+        jobs_refetch_worker = JobsRefetchWorker(
+            crawl_jobs_sync.fetch_updates, new_jobs_refetch_interval
+        )
+    else:
+        jobs_refetch_worker = JobsRefetchWorker(
+            lambda: _fetch_new_jobs_entries(crawl_job_registry, blockchain_type),
+            new_jobs_refetch_interval,
+        )
+    jobs_refetch_worker.start()
+
     last_heartbeat_time = datetime.utcnow()
-    blocks_cache: Dict[int, int] = {}
+    blocks_cache = BlockTimestampsCache()
+    labels_buffer = LabelsWriteBuffer(
+        db_session,
+        blockchain_type,
+        max_labels=max_buffered_labels,
+        max_seconds=flush_interval,
+        checkpoint_crawler=MOONWORM_CONTINUOUS_CRAWLER,
+    )
     current_sleep_time = min_sleep_time
     failed_count = 0
     try:
@@ -162,10 +221,13 @@ def continuous_crawler(
 
                 end_block = min(
                     web3.eth.blockNumber - confirmations,
-                    start_block + max_blocks_batch,
+                    start_block + batch_size_controller.size - 1,
                 )
 
-                if start_block + min_blocks_batch > end_block:
+                # Window shrunk by provider limits below min_blocks_batch is
+                # crawled when it is full, otherwise crawler would wait forever
+                min_blocks = min(min_blocks_batch, batch_size_controller.size - 1)
+                if start_block + min_blocks > end_block:
                     current_sleep_time += 0.1
                     logger.info(
                         f"Sleeping for {current_sleep_time} seconds because of low block count"
@@ -173,6 +235,7 @@ def continuous_crawler(
                     continue
                 current_sleep_time = max(min_sleep_time, current_sleep_time - 0.1)
 
+                step_started_at = time.time()
                 logger.info(f"Crawling events from {start_block} to {end_block}")
                 all_events = _crawl_events(
                     db_session=db_session,
@@ -183,51 +246,79 @@ def continuous_crawler(
                     to_block=end_block,
                     blocks_cache=blocks_cache,
                     db_block_query_batch=min_blocks_batch * 2,
+                    single_logs_request=single_logs_request,
                 )
                 logger.info(
                     f"Crawled {len(all_events)} events from {start_block} to {end_block}."
                 )
 
-                add_events_to_session(db_session, all_events, blockchain_type)
-
                 logger.info(
                     f"Crawling function calls from {start_block} to {end_block}"
                 )
-                all_function_calls = _crawl_functions(
-                    blockchain_type,
-                    ethereum_state_provider,
-                    function_call_crawl_jobs,
-                    start_block,
-                    end_block,
-                )
+                if batched_function_calls or db_function_calls:
+                    all_function_calls = _crawl_functions_batched(
+                        blockchain_type,
+                        web3,
+                        function_call_crawl_jobs,
+                        start_block,
+                        end_block,
+                        blocks_cache=blocks_cache,
+                        db_session=db_session if db_function_calls else None,
+                    )
+                else:
+                    all_function_calls = _crawl_functions(
+                        blockchain_type,
+                        ethereum_state_provider,
+                        function_call_crawl_jobs,
+                        start_block,
+                        end_block,
+                    )
                 logger.info(
                     f"Crawled {len(all_function_calls)} function calls from {start_block} to {end_block}."
                 )
 
-                add_function_calls_to_session(
-                    db_session, all_function_calls, blockchain_type
+                labels_buffer.add_events(all_events)
+                labels_buffer.add_function_calls(all_function_calls)
+                labels_buffer.mark_crawled(start_block, end_block)
+                next_block = end_block + 1
+                if labels_buffer.should_flush() and not labels_buffer.flush():
+                    # Checkpoint was rolled back by chain reorganization
+                    assert labels_buffer.committed_block is not None
+                    next_block = labels_buffer.committed_block + 1
+                    logger.warning(
+                        f"Chain reorganization, continuing from block {next_block}"
+                    )
+
+                batch_size_controller.record_success(
+                    end_block - start_block + 1,
+                    time.time() - step_started_at,
+                    len(all_events) + len(all_function_calls),
                 )
 
                 current_time = datetime.utcnow()
 
-                if current_time - jobs_refetchet_time > timedelta(
-                    seconds=new_jobs_refetch_interval
-                ):
+                jobs_updates = jobs_refetch_worker.get_updates()
+                if jobs_updates:
                     logger.info(
-                        f"Refetching new jobs from bugout journal since {jobs_refetchet_time}"
-                    )
-                    event_crawl_jobs, function_call_crawl_jobs = _refetch_new_jobs(
-                        event_crawl_jobs, function_call_crawl_jobs, blockchain_type
+                        f"Applying {len(jobs_updates)} crawl jobs updates from bugout journal"
                     )
+                    for updates in jobs_updates:
+                        if crawl_jobs_sync is not None:
+                            crawl_jobs_sync.apply_updates(updates)
+                        else:
+                            _add_new_jobs(crawl_job_registry, updates)
+                    event_crawl_jobs = crawl_job_registry.event_jobs
+                    function_call_crawl_jobs = crawl_job_registry.function_call_jobs
                     jobs_refetchet_time = current_time
 
                 if current_time - last_heartbeat_time > timedelta(
                     seconds=heartbeat_interval
                 ):
-                    # Commiting to db
-                    commit_session(db_session)
                     # Update heartbeat
                     heartbeat_template["last_block"] = end_block
+                    heartbeat_template[
+                        "last_committed_block"
+                    ] = labels_buffer.committed_block
                     heartbeat_template["current_time"] = _date_to_str(current_time)
                     heartbeat_template["current_event_jobs_length"] = len(
                         event_crawl_jobs
@@ -241,17 +332,18 @@ def continuous_crawler(
                     heartbeat_template[
                         "function_call metrics"
                     ] = ethereum_state_provider.metrics
-                    heartbeat(
-                        crawler_type=crawler_type,
-                        blockchain_type=blockchain_type,
-                        crawler_status=heartbeat_template,
-                    )
+                    heartbeat_template["blocks_batch"] = batch_size_controller.to_dict()
+                    if isinstance(web3.provider, PooledHTTPProvider):
+                        heartbeat_template["web3_endpoints"] = web3.provider.health()
+                    heartbeat_worker.send(heartbeat_template)
                     logger.info("Sending heartbeat.", heartbeat_template)
                     last_heartbeat_time = datetime.utcnow()
 
-                start_block = end_block + 1
+                start_block = next_block
                 failed_count = 0
             except Exception as e:
+                if batch_size_controller.record_failure(e):
+                    continue
                 logger.error(f"Internal error: {e}")
                 logger.exception(e)
                 failed_count += 1
@@ -267,6 +359,12 @@ def continuous_crawler(
 
     except BaseException as e:
         logger.error(f"!!!!Crawler Died!!!!")
+        jobs_refetch_worker.stop()
+        heartbeat_worker.stop()
+        try:
+            labels_buffer.flush()
+        except Exception as err:
+            logger.error(f"Failed to save buffered labels: {err}")
         heartbeat_template["status"] = "dead"
         heartbeat_template["current_time"] = _date_to_str(datetime.utcnow())
         heartbeat_template["current_event_jobs_length"] = len(event_crawl_jobs)
@@ -285,6 +383,9 @@ def continuous_crawler(
             "die_reason"
         ] = f"{e.__class__.__name__}: {e}\n error_summary: {error_summary}\n error_traceback: {error_traceback}"
         heartbeat_template["last_block"] = end_block
+        heartbeat_template["last_committed_block"] = labels_buffer.committed_block
+        if web3 is not None and isinstance(web3.provider, PooledHTTPProvider):
+            heartbeat_template["web3_endpoints"] = web3.provider.health()
         heartbeat(
             crawler_type=crawler_type,
             blockchain_type=blockchain_type,
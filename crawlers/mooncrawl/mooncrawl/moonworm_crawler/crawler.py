@@ -5,7 +5,8 @@ import time
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Callable, Dict, List, Optional, cast
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, cast
 from uuid import UUID
 
 from bugout.data import BugoutSearchResult
@@ -71,9 +72,12 @@ def encode_function_signature(function_abi: Dict[str, Any]) -> Optional[str]:
     """
     if function_abi["type"] != "function":
         return None
-    function_signature = abi_function_signature(function_abi)
-    encoded_signature = Web3.keccak(text=function_signature)[:4]
-    return encoded_signature.hex()
+    return _encode_signature(abi_function_signature(function_abi))
+
+
+@lru_cache(maxsize=65536)
+def _encode_signature(function_signature: str) -> str:
+    return Web3.keccak(text=function_signature)[:4].hex()
 
 
 def _generate_reporter_callback(
@@ -158,16 +162,21 @@ def get_crawl_job_entries(
     journal_id: str = MOONSTREAM_MOONWORM_TASKS_JOURNAL,
     created_at_filter: int = None,
     limit: int = 200,
+    updated_at_filter: Optional[int] = None,
+    only_active: bool = True,
 ) -> List[BugoutSearchResult]:
     """
     Get all event ABIs from bugout journal
     where tags are:
     - #crawler_type:crawler_type (either event or function)
-    - #status:active
+    - #status:active (if only_active, otherwise entries with any status)
     - #subscription_type:subscription_type (either polygon_blockchain or ethereum_blockchain)
 
+    updated_at_filter returns only entries updated since given timestamp.
     """
-    query = f"#status:active #type:{crawler_type} #subscription_type:{subscription_type.value}"
+    query = f"#type:{crawler_type} #subscription_type:{subscription_type.value}"
+    if only_active:
+        query = f"#status:active {query}"
 
     if created_at_filter is not None:
         # Filtering by created_at
@@ -178,6 +187,9 @@ def get_crawl_job_entries(
         #
         query += f" created_at:>={created_at_filter}"
 
+    if updated_at_filter is not None:
+        query += f" updated_at:>={updated_at_filter}"
+
     current_offset = 0
     entries = []
     while True:
@@ -214,7 +226,7 @@ def make_event_crawl_jobs(entries: List[BugoutSearchResult]) -> List[EventCrawlJ
 
     for entry in entries:
         abi_hash = _get_tag(entry, "abi_method_hash")
-        contract_address = Web3().toChecksumAddress(_get_tag(entry, "address"))
+        contract_address = Web3.toChecksumAddress(_get_tag(entry, "address"))
 
         existing_crawl_job = crawl_job_by_hash.get(abi_hash)
         if existing_crawl_job is not None:
@@ -244,7 +256,7 @@ def make_function_call_crawl_jobs(
     method_signature_by_address: Dict[str, List[str]] = {}
 
     for entry in entries:
-        contract_address = Web3().toChecksumAddress(_get_tag(entry, "address"))
+        contract_address = Web3.toChecksumAddress(_get_tag(entry, "address"))
         abi = json.loads(cast(str, entry.content))
         method_signature = encode_function_signature(abi)
         if method_signature is None:
@@ -266,6 +278,149 @@ def make_function_call_crawl_jobs(
     return [crawl_job for crawl_job in crawl_job_by_address.values()]
 
 
+class CrawlJobRegistry:
+    """
+    Index of crawl jobs: event jobs by event_abi_hash, function call jobs
+    by contract_address.
+
+    Contracts of event jobs and method selectors of function call jobs are
+    kept in sets, so adding and removing jobs does not scan existing ones.
+    Job objects are updated in place.
+    """
+
+    def __init__(
+        self,
+        event_crawl_jobs: Iterable[EventCrawlJob] = (),
+        function_call_crawl_jobs: Iterable[FunctionCallCrawlJob] = (),
+    ) -> None:
+        self._event_jobs: Dict[str, EventCrawlJob] = {}
+        self._event_contracts: Dict[str, Set[ChecksumAddress]] = {}
+        self._function_call_jobs: Dict[ChecksumAddress, FunctionCallCrawlJob] = {}
+        self._function_selectors: Dict[ChecksumAddress, Set[Optional[str]]] = {}
+        self.max_event_created_at = 0
+        self.max_function_call_created_at = 0
+
+        self.add_event_jobs(event_crawl_jobs)
+        self.add_function_call_jobs(function_call_crawl_jobs)
+
+    @property
+    def event_jobs(self) -> List[EventCrawlJob]:
+        return list(self._event_jobs.values())
+
+    @property
+    def function_call_jobs(self) -> List[FunctionCallCrawlJob]:
+        return list(self._function_call_jobs.values())
+
+    def add_event_jobs(self, crawl_jobs: Iterable[EventCrawlJob]) -> int:
+        """
+        Add contracts of event crawl jobs, returns number of added (abi, contract) pairs.
+        """
+        added = 0
+        for crawl_job in crawl_jobs:
+            self.max_event_created_at = max(
+                self.max_event_created_at, crawl_job.created_at
+            )
+            existing_job = self._event_jobs.get(crawl_job.event_abi_hash)
+            if existing_job is None:
+                contracts = list(dict.fromkeys(crawl_job.contracts))
+                self._event_jobs[crawl_job.event_abi_hash] = EventCrawlJob(
+                    event_abi_hash=crawl_job.event_abi_hash,
+                    event_abi=crawl_job.event_abi,
+                    contracts=contracts,
+                    created_at=crawl_job.created_at,
+                )
+                self._event_contracts[crawl_job.event_abi_hash] = set(contracts)
+                added += len(contracts)
+                continue
+
+            contracts_set = self._event_contracts[crawl_job.event_abi_hash]
+            for contract in crawl_job.contracts:
+                if contract not in contracts_set:
+                    contracts_set.add(contract)
+                    existing_job.contracts.append(contract)
+                    added += 1
+        return added
+
+    def remove_event_job(
+        self, event_abi_hash: str, contract_address: Optional[ChecksumAddress] = None
+    ) -> bool:
+        """
+        Remove contract from event crawl job, or whole job if contract_address
+        is None or it was the last contract. Returns True if anything was removed.
+        """
+        existing_job = self._event_jobs.get(event_abi_hash)
+        if existing_job is None:
+            return False
+
+        contracts_set = self._event_contracts[event_abi_hash]
+        if contract_address is not None:
+            if contract_address not in contracts_set:
+                return False
+            contracts_set.remove(contract_address)
+            existing_job.contracts.remove(contract_address)
+
+        if contract_address is None or not contracts_set:
+            del self._event_jobs[event_abi_hash]
+            del self._event_contracts[event_abi_hash]
+        return True
+
+    def add_function_call_jobs(self, crawl_jobs: Iterable[FunctionCallCrawlJob]) -> int:
+        """
+        Add methods of function call crawl jobs, returns number of added
+        (contract, method) pairs.
+        """
+        added = 0
+        for crawl_job in crawl_jobs:
+            self.max_function_call_created_at = max(
+                self.max_function_call_created_at, crawl_job.created_at
+            )
+            existing_job = self._function_call_jobs.get(crawl_job.contract_address)
+            if existing_job is None:
+                existing_job = FunctionCallCrawlJob(
+                    contract_abi=[],
+                    contract_address=crawl_job.contract_address,
+                    created_at=crawl_job.created_at,
+                )
+                self._function_call_jobs[crawl_job.contract_address] = existing_job
+                self._function_selectors[crawl_job.contract_address] = set()
+
+            selectors = self._function_selectors[crawl_job.contract_address]
+            for function_abi in crawl_job.contract_abi:
+                selector = encode_function_signature(function_abi)
+                if selector not in selectors:
+                    selectors.add(selector)
+                    existing_job.contract_abi.append(function_abi)
+                    added += 1
+        return added
+
+    def remove_function_call_job(
+        self, contract_address: ChecksumAddress, selector: Optional[str] = None
+    ) -> bool:
+        """
+        Remove method from function call crawl job, or whole job if selector
+        is None or it was the last method. Returns True if anything was removed.
+        """
+        existing_job = self._function_call_jobs.get(contract_address)
+        if existing_job is None:
+            return False
+
+        selectors = self._function_selectors[contract_address]
+        if selector is not None:
+            if selector not in selectors:
+                return False
+            selectors.remove(selector)
+            existing_job.contract_abi = [
+                function_abi
+                for function_abi in existing_job.contract_abi
+                if encode_function_signature(function_abi) != selector
+            ]
+
+        if selector is None or not selectors:
+            del self._function_call_jobs[contract_address]
+            del self._function_selectors[contract_address]
+        return True
+
+
 def merge_event_crawl_jobs(
     old_crawl_jobs: List[EventCrawlJob], new_event_crawl_jobs: List[EventCrawlJob]
 ) -> List[EventCrawlJob]:
@@ -275,25 +430,14 @@ def merge_event_crawl_jobs(
     then we will merge the contracts to one job.
     Othervise new job will be created
 
-    Important:
-        old_crawl_jobs will be modified
+    For repeated merges keep jobs in CrawlJobRegistry instead.
+
     Returns:
         Merged list of event crawl jobs
     """
-    for new_crawl_job in new_event_crawl_jobs:
-        for old_crawl_job in old_crawl_jobs:
-            if new_crawl_job.event_abi_hash == old_crawl_job.event_abi_hash:
-                old_crawl_job.contracts.extend(
-                    [
-                        contract
-                        for contract in new_crawl_job.contracts
-                        if contract not in old_crawl_job.contracts
-                    ]
-                )
-                break
-        else:
-            old_crawl_jobs.append(new_crawl_job)
-    return old_crawl_jobs
+    registry = CrawlJobRegistry(event_crawl_jobs=old_crawl_jobs)
+    registry.add_event_jobs(new_event_crawl_jobs)
+    return registry.event_jobs
 
 
 def merge_function_call_crawl_jobs(
@@ -306,34 +450,27 @@ def merge_function_call_crawl_jobs(
     then we will merge the contracts to one job.
     Othervise new job will be created
 
-    Important:
-        old_crawl_jobs will be modified
+    For repeated merges keep jobs in CrawlJobRegistry instead.
+
     Returns:
         Merged list of function call crawl jobs
     """
-    for new_crawl_job in new_function_call_crawl_jobs:
-        for old_crawl_job in old_crawl_jobs:
-            if new_crawl_job.contract_address == old_crawl_job.contract_address:
-                old_selectors = [
-                    encode_function_signature(function_abi)
-                    for function_abi in old_crawl_job.contract_abi
-                ]
-                old_crawl_job.contract_abi.extend(
-                    [
-                        function_abi
-                        for function_abi in new_crawl_job.contract_abi
-                        if encode_function_signature(function_abi) not in old_selectors
-                    ]
-                )
-                break
-        else:
-            old_crawl_jobs.append(new_crawl_job)
-    return old_crawl_jobs
+    registry = CrawlJobRegistry(function_call_crawl_jobs=old_crawl_jobs)
+    registry.add_function_call_jobs(new_function_call_crawl_jobs)
+    return registry.function_call_jobs
+
+
+# Heartbeat entries ids by crawler type and blockchain, looked up once per process
+_heartbeat_entry_ids: Dict[Tuple[str, str], str] = {}
 
 
 def _get_heartbeat_entry_id(
     crawler_type: str, blockchain_type: AvailableBlockchainType
 ) -> str:
+    cached_entry_id = _heartbeat_entry_ids.get((crawler_type, blockchain_type.value))
+    if cached_entry_id is not None:
+        return cached_entry_id
+
     entries = bugout_client.search(
         token=MOONSTREAM_ADMIN_ACCESS_TOKEN,
         journal_id=MOONSTREAM_MOONWORM_TASKS_JOURNAL,
@@ -342,7 +479,7 @@ def _get_heartbeat_entry_id(
         timeout=BUGOUT_REQUEST_TIMEOUT_SECONDS,
     )
     if entries.results:
-        return entries.results[0].entry_url.split("/")[-1]
+        entry_id = entries.results[0].entry_url.split("/")[-1]
     else:
         logger.info(f"No {crawler_type} heartbeat entry found, creating one")
         entry = bugout_client.create_entry(
@@ -353,7 +490,9 @@ def _get_heartbeat_entry_id(
             content="",
             timeout=BUGOUT_REQUEST_TIMEOUT_SECONDS,
         )
-        return str(entry.id)
+        entry_id = str(entry.id)
+    _heartbeat_entry_ids[(crawler_type, blockchain_type.value)] = entry_id
+    return entry_id
 
 
 def heartbeat(
@@ -390,3 +529,5 @@ def heartbeat(
             tags=[crawler_type, "heartbeat", blockchain_type.value, "dead"],
             timeout=BUGOUT_REQUEST_TIMEOUT_SECONDS,
         )
+        # Dead entry is not updated anymore, next crawler creates new one
+        _heartbeat_entry_ids.pop((crawler_type, blockchain_type.value), None)
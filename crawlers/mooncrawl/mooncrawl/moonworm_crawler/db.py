@@ -1,17 +1,42 @@
 import logging
-from typing import Dict, List, Optional
+import time
+import uuid
+from typing import List, Optional
 
 from moonstreamdb.blockchain import AvailableBlockchainType, get_label_model
+from moonstreamdb.db import engine
 from moonstreamdb.models import Base
 from moonworm.crawler.function_call_crawler import ContractFunctionCall  # type: ignore
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
+from ..checkpoints import update_checkpoint
 from ..settings import CRAWLER_LABEL
 from .event_crawler import Event
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LABELS_INSERT_BATCH_SIZE = 1000
+
+LABEL_COLUMNS = [
+    "label",
+    "label_data",
+    "address",
+    "block_number",
+    "block_timestamp",
+    "transaction_hash",
+    "log_index",
+]
+
+
+def dispose_inherited_connections() -> None:
+    """
+    Initializer of worker processes. Forgets database connections pooled by
+    parent process without closing them, so worker opens its own connections.
+    """
+    engine.dispose(close=False)
+
 
 def _event_to_label(
     blockchain_type: AvailableBlockchainType, event: Event, label_name=CRAWLER_LABEL
@@ -132,45 +157,51 @@ def commit_session(db_session: Session) -> None:
         raise e
 
 
-def add_events_to_session(
+def insert_labels(
     db_session: Session,
-    events: List[Event],
     blockchain_type: AvailableBlockchainType,
-    label_name=CRAWLER_LABEL,
-) -> None:
-    label_model = get_label_model(blockchain_type)
+    labels: List[Base],
+    batch_size: int = LABELS_INSERT_BATCH_SIZE,
+) -> int:
+    """
+    Bulk insert labels with INSERT ... ON CONFLICT DO NOTHING.
 
-    events_hashes_to_save = [event.transaction_hash for event in events]
+    Already saved events are skipped by unique index on (label, transaction_hash,
+    log_index) and function calls by unique index on (label, transaction_hash).
+    Returns number of inserted labels, they are saved on session commit.
+    """
+    label_model = get_label_model(blockchain_type)
+    rows = [
+        {
+            "id": label.id if label.id is not None else uuid.uuid4(),
+            **{column: getattr(label, column) for column in LABEL_COLUMNS},
+        }
+        for label in labels
+    ]
 
-    existing_labels = (
-        db_session.query(label_model.transaction_hash, label_model.log_index)
-        .filter(
-            label_model.label == label_name,
-            label_model.log_index != None,
-            label_model.transaction_hash.in_(events_hashes_to_save),
+    inserted = 0
+    for i in range(0, len(rows), batch_size):
+        result = db_session.execute(
+            insert(label_model.__table__)
+            .values(rows[i : i + batch_size])
+            .on_conflict_do_nothing()
         )
-        .all()
-    )
+        inserted += result.rowcount
+    return inserted
 
-    existing_labels_transactions = []
-    existing_log_index_by_tx_hash: Dict[str, List[int]] = {}
-    for label in existing_labels:
-        if label[0] not in existing_labels_transactions:
-            existing_labels_transactions.append(label[0])
-            existing_log_index_by_tx_hash[label[0]] = []
-        existing_log_index_by_tx_hash[label[0]].append(label[1])
-
-    labels_to_save = []
-    for event in events:
-        if event.transaction_hash not in existing_labels_transactions:
-            labels_to_save.append(_event_to_label(blockchain_type, event, label_name))
-        elif (
-            event.log_index not in existing_log_index_by_tx_hash[event.transaction_hash]
-        ):
-            labels_to_save.append(_event_to_label(blockchain_type, event, label_name))
 
-    logger.info(f"Saving {len(labels_to_save)} event labels to session")
-    db_session.add_all(labels_to_save)
+def add_events_to_session(
+    db_session: Session,
+    events: List[Event],
+    blockchain_type: AvailableBlockchainType,
+    label_name=CRAWLER_LABEL,
+) -> None:
+    inserted = insert_labels(
+        db_session,
+        blockchain_type,
+        [_event_to_label(blockchain_type, event, label_name) for event in events],
+    )
+    logger.info(f"Saved {inserted} of {len(events)} event labels to session")
 
 
 def add_function_calls_to_session(
@@ -179,29 +210,156 @@ def add_function_calls_to_session(
     blockchain_type: AvailableBlockchainType,
     label_name=CRAWLER_LABEL,
 ) -> None:
+    inserted = insert_labels(
+        db_session,
+        blockchain_type,
+        [
+            _function_call_to_label(blockchain_type, function_call, label_name)
+            for function_call in function_calls
+        ],
+    )
+    logger.info(f"Saved {inserted} of {len(function_calls)} labels to session")
 
-    label_model = get_label_model(blockchain_type)
-    transactions_hashes_to_save = [
-        function_call.transaction_hash for function_call in function_calls
-    ]
 
-    existing_labels = (
-        db_session.query(label_model.transaction_hash)
-        .filter(
-            label_model.label == label_name,
-            label_model.log_index == None,
-            label_model.transaction_hash.in_(transactions_hashes_to_save),
+class LabelsWriteBuffer:
+    """
+    Labels of crawled blocks waiting to be saved.
+
+    Buffer is flushed when it holds max_labels labels or max_seconds passed since
+    previous flush. Flush inserts labels and, if checkpoint_crawler is set, moves
+    crawler checkpoint to the last buffered block in the same transaction, so
+    crawler restarted after commit continues right after committed block.
+
+    If blocks crawler rolled back checkpoint below committed block because of
+    chain reorganization, flush drops buffered labels and crawler should continue
+    right after rolled back committed_block.
+    """
+
+    def __init__(
+        self,
+        db_session: Session,
+        blockchain_type: AvailableBlockchainType,
+        max_labels: int = 10000,
+        max_seconds: float = 10,
+        checkpoint_crawler: Optional[str] = None,
+    ) -> None:
+        assert max_labels > 0, "max_labels must be greater than 0"
+        assert max_seconds > 0, "max_seconds must be greater than 0"
+
+        self.db_session = db_session
+        self.blockchain_type = blockchain_type
+        self.max_labels = max_labels
+        self.max_seconds = max_seconds
+        self.checkpoint_crawler = checkpoint_crawler
+
+        self.labels: List[Base] = []
+        self.from_block: Optional[int] = None
+        self.to_block: Optional[int] = None
+        self.committed_block: Optional[int] = None
+        self.first_committed_block: Optional[int] = None
+        self.flushed_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def add_events(self, events: List[Event], label_name=CRAWLER_LABEL) -> None:
+        self.labels.extend(
+            _event_to_label(self.blockchain_type, event, label_name) for event in events
         )
-        .all()
-    )
 
-    existing_labels_transactions = [label[0] for label in existing_labels]
+    def add_function_calls(
+        self, function_calls: List[ContractFunctionCall], label_name=CRAWLER_LABEL
+    ) -> None:
+        self.labels.extend(
+            _function_call_to_label(self.blockchain_type, function_call, label_name)
+            for function_call in function_calls
+        )
 
-    labels_to_save = [
-        _function_call_to_label(blockchain_type, function_call)
-        for function_call in function_calls
-        if function_call.transaction_hash not in existing_labels_transactions
-    ]
+    def mark_crawled(self, from_block: int, to_block: int) -> None:
+        """
+        Mark blocks range as crawled, all its labels should be already added.
+        """
+        if self.from_block is None or from_block < self.from_block:
+            self.from_block = from_block
+        if self.to_block is None or to_block > self.to_block:
+            self.to_block = to_block
+
+    def should_flush(self) -> bool:
+        return (
+            len(self.labels) >= self.max_labels
+            or time.time() - self.flushed_at >= self.max_seconds
+        )
+
+    def _clear(self) -> None:
+        self.labels = []
+        self.from_block = None
+        self.to_block = None
+        self.flushed_at = time.time()
+
+    def _rolled_back_block(self) -> Optional[int]:
+        """
+        Returns last block of checkpoint if it was rolled back below
+        committed block, None otherwise.
+        """
+        if self.checkpoint_crawler is None or self.committed_block is None:
+            return None
+        checkpoint = update_checkpoint(
+            self.db_session, self.checkpoint_crawler, self.blockchain_type
+        )
+        if checkpoint.last_block is None:
+            # Checkpoint was rolled back below its first block
+            assert self.first_committed_block is not None
+            return self.first_committed_block - 1
+        if checkpoint.last_block < self.committed_block:
+            return checkpoint.last_block
+        return None
+
+    def flush(self) -> bool:
+        """
+        Save buffered labels and checkpoint and commit session.
+
+        Returns False if checkpoint was rolled back, buffered labels are dropped
+        then and crawling should continue from committed_block + 1.
+        On failure session is rolled back and buffer is kept for retry.
+        """
+        try:
+            return self._flush()
+        except Exception as e:
+            logger.error(f"Failed to flush labels buffer: {e}")
+            self.db_session.rollback()
+            raise
+
+    def _flush(self) -> bool:
+        rolled_back_block = self._rolled_back_block()
+        if rolled_back_block is not None:
+            logger.warning(
+                f"Checkpoint was rolled back from {self.committed_block} to "
+                f"{rolled_back_block}, dropping {len(self.labels)} buffered labels"
+            )
+            commit_session(self.db_session)
+            self.committed_block = rolled_back_block
+            self._clear()
+            return False
+
+        if self.labels:
+            inserted = insert_labels(self.db_session, self.blockchain_type, self.labels)
+            logger.info(f"Saved {inserted} of {len(self.labels)} buffered labels")
+        if (
+            self.checkpoint_crawler is not None
+            and self.from_block is not None
+            and self.to_block is not None
+        ):
+            update_checkpoint(
+                self.db_session,
+                self.checkpoint_crawler,
+                self.blockchain_type,
+                crawled_range=(self.from_block, self.to_block),
+            )
+        commit_session(self.db_session)
 
-    logger.info(f"Saving {len(labels_to_save)} labels to session")
-    db_session.add_all(labels_to_save)
+        if self.from_block is not None and self.first_committed_block is None:
+            self.first_committed_block = self.from_block
+        if self.to_block is not None:
+            self.committed_block = self.to_block
+        self._clear()
+        return True
@@ -1,13 +1,20 @@
+import json
 import logging
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, cast
 
-from moonstreamdb.blockchain import AvailableBlockchainType, get_block_model
+import requests
+from moonstreamdb.blockchain import AvailableBlockchainType
+from eth_utils import encode_hex, event_abi_to_log_topic
+from moonworm.crawler.function_call_crawler import utfy_dict  # type: ignore
 from moonworm.crawler.log_scanner import _fetch_events_chunk  # type: ignore
 from sqlalchemy.orm.session import Session
-from sqlalchemy.sql.expression import and_
 from web3 import Web3
+from web3._utils.events import get_event_data
+from web3.types import FilterParams
 
+from ..block_timestamps import BlockTimestampsCache
 from .crawler import EventCrawlJob
 
 logging.basicConfig(level=logging.INFO)
@@ -25,17 +32,6 @@ class Event:
     log_index: int
 
 
-def _get_block_timestamp_from_web3(
-    web3: Web3,
-    block_number: int,
-) -> int:
-    """
-    Gets the timestamp of a block from the blockchain.
-    will raise an exception if the block is not found.
-    """
-    return web3.eth.getBlock(block_number).timestamp
-
-
 # I am using blocks_cache as the argument, to reuse this function in tx_call crawler
 # and support one cashe for both tx_call and event_crawler
 def get_block_timestamp(
@@ -43,7 +39,7 @@ def get_block_timestamp(
     web3: Web3,
     blockchain_type: AvailableBlockchainType,
     block_number: int,
-    blocks_cache: Dict[int, int],
+    blocks_cache: BlockTimestampsCache,
     max_blocks_batch: int = 30,
 ) -> int:
     """
@@ -52,48 +48,119 @@ def get_block_timestamp(
     then tries to get the block from the db,
     then tries to get it from the blockchain.
 
-    After the call cache is updated.
-    If the cache grows too large, it is cleared.
+    On cache miss next max_blocks_batch blocks are loaded from db to the cache.
 
     :param block_number: The block number.
     :param max_blocks_batch: The maximum number of blocks to fetch in a single batch from db query.
-    :param blocks_cache: The cache of blocks.
+    :param blocks_cache: The cache of blocks timestamps.
     :return: The timestamp of the block.
     """
     assert max_blocks_batch > 0
 
-    if block_number in blocks_cache:
-        return blocks_cache[block_number]
+    timestamp = blocks_cache.get(block_number)
+    if timestamp is not None:
+        return timestamp
 
-    block_model = get_block_model(blockchain_type)
+    return blocks_cache.load(
+        db_session,
+        web3,
+        blockchain_type,
+        [block_number],
+        db_prefetch_blocks=max_blocks_batch - 1,
+    )[block_number]
 
-    blocks = (
-        db_session.query(block_model)
-        .filter(
-            and_(
-                block_model.block_number >= block_number,
-                block_model.block_number <= block_number + max_blocks_batch - 1,
-            )
-        )
-        .order_by(block_model.block_number.asc())
-        .all()
-    )
 
-    target_block_timestamp: Optional[int] = None
-    if blocks and blocks[0].block_number == block_number:
-        target_block_timestamp = blocks[0].timestamp
+def make_event_topics_index(
+    jobs: List[EventCrawlJob],
+) -> Dict[str, List[Tuple[Dict[str, Any], Optional[Set[str]]]]]:
+    """
+    Index of crawl jobs event ABIs by topic0 (event signature hash).
 
-    if target_block_timestamp is None:
-        target_block_timestamp = _get_block_timestamp_from_web3(web3, block_number)
+    Several ABIs could share topic0 (e.g. ERC20 and ERC721 Transfer events differ
+    only by indexed arguments), each of them is stored with its contracts set.
+    None contracts set means job crawls event of any contract.
+    Anonymous events have no topic0 and are not indexed.
+    """
+    topics_index: Dict[
+        str, List[Tuple[Dict[str, Any], Optional[Set[str]]]]
+    ] = defaultdict(list)
+    for job in jobs:
+        if job.event_abi.get("anonymous", False):
+            continue
+        topic = encode_hex(event_abi_to_log_topic(job.event_abi))
+        contracts = {contract.lower() for contract in job.contracts} or None
+        topics_index[topic].append((job.event_abi, contracts))
+    return dict(topics_index)
 
-    if len(blocks_cache) > max_blocks_batch * 2:
-        blocks_cache.clear()
 
-    blocks_cache[block_number] = target_block_timestamp
-    for block in blocks:
-        blocks_cache[block.block_number] = block.timestamp
+def _fetch_jobs_events(
+    web3: Web3,
+    jobs: List[EventCrawlJob],
+    from_block: int,
+    to_block: int,
+    on_decode_error: Callable[[Exception], None],
+) -> List[Dict[str, Any]]:
+    """
+    Fetch logs of all jobs with one eth_getLogs request for union of contract
+    addresses and topic0 hashes, decode them locally with ABI chosen by topic0.
 
-    return target_block_timestamp
+    Jobs with anonymous events are fetched with request per job.
+    """
+    topics_index = make_event_topics_index(jobs)
+    raw_events: List[Dict[str, Any]] = []
+    for job in jobs:
+        if job.event_abi.get("anonymous", False):
+            raw_events.extend(
+                _fetch_events_chunk(
+                    web3,
+                    job.event_abi,
+                    from_block,
+                    to_block,
+                    job.contracts,
+                    on_decode_error=on_decode_error,
+                )
+            )
+    if not topics_index:
+        return raw_events
+
+    filter_params: Dict[str, Any] = {
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "topics": [list(topics_index)],
+    }
+    jobs_contracts = [
+        contracts for abis in topics_index.values() for _, contracts in abis
+    ]
+    # If some job crawls events of any contract, logs are filtered by address locally
+    if all(contracts is not None for contracts in jobs_contracts):
+        addresses: Set[str] = set().union(*jobs_contracts)  # type: ignore
+        filter_params["address"] = [
+            Web3.toChecksumAddress(address) for address in sorted(addresses)
+        ]
+
+    for log in web3.eth.get_logs(cast(FilterParams, filter_params)):
+        if not log["topics"]:
+            continue
+        log_address = log["address"].lower()
+        for event_abi, contracts in topics_index.get(log["topics"][0].hex(), []):
+            if contracts is not None and log_address not in contracts:
+                continue
+            try:
+                raw_event = get_event_data(web3.codec, event_abi, log)
+            except Exception as err:
+                on_decode_error(err)
+                continue
+            raw_events.append(
+                {
+                    "event": raw_event["event"],
+                    "args": json.loads(Web3.toJSON(utfy_dict(dict(raw_event["args"])))),
+                    "address": raw_event["address"],
+                    "blockNumber": raw_event["blockNumber"],
+                    "transactionHash": raw_event["transactionHash"].hex(),
+                    "logIndex": raw_event["logIndex"],
+                }
+            )
+    return raw_events
 
 
 def _crawl_events(
@@ -103,39 +170,73 @@ def _crawl_events(
     jobs: List[EventCrawlJob],
     from_block: int,
     to_block: int,
-    blocks_cache: Dict[int, int] = {},
+    blocks_cache: Optional[BlockTimestampsCache] = None,
     db_block_query_batch=10,
+    single_logs_request: bool = False,
 ) -> List[Event]:
-    all_events = []
-    for job in jobs:
-        raw_events = _fetch_events_chunk(
-            web3,
-            job.event_abi,
-            from_block,
-            to_block,
-            job.contracts,
-            on_decode_error=lambda e: print(
-                f"Error decoding event: {e}"
-            ),  # TODO report via humbug
-        )
-        for raw_event in raw_events:
-            raw_event["blockTimestamp"] = get_block_timestamp(
-                db_session,
-                web3,
-                blockchain_type,
-                raw_event["blockNumber"],
-                blocks_cache,
-                db_block_query_batch,
+    """
+    Crawl events of jobs in blocks range.
+
+    By default logs are fetched with eth_getLogs request per job event ABI.
+    With single_logs_request all jobs logs are fetched with one request and
+    decoded locally, if node fails to process it, crawler falls back to
+    request per job.
+    """
+    if blocks_cache is None:
+        blocks_cache = BlockTimestampsCache()
+
+    def on_decode_error(e: Exception) -> None:
+        print(f"Error decoding event: {e}")  # TODO report via humbug
+
+    raw_events: List[Dict[str, Any]] = []
+    fetched = False
+    if single_logs_request:
+        try:
+            raw_events = _fetch_jobs_events(
+                web3, jobs, from_block, to_block, on_decode_error
             )
-            event = Event(
-                event_name=raw_event["event"],
-                args=raw_event["args"],
-                address=raw_event["address"],
-                block_number=raw_event["blockNumber"],
-                block_timestamp=raw_event["blockTimestamp"],
-                transaction_hash=raw_event["transactionHash"],
-                log_index=raw_event["logIndex"],
+            fetched = True
+        except (ValueError, requests.HTTPError, requests.Timeout) as err:
+            # Node returns error, or HTTP error status, or does not respond in time
+            # if logs of all jobs are too many for one request
+            logger.warning(
+                f"Single logs request for blocks {from_block}-{to_block} failed, "
+                f"falling back to request per job: {err}"
             )
-            all_events.append(event)
+    if not fetched:
+        for job in jobs:
+            raw_events.extend(
+                _fetch_events_chunk(
+                    web3,
+                    job.event_abi,
+                    from_block,
+                    to_block,
+                    job.contracts,
+                    on_decode_error=on_decode_error,
+                )
+            )
+
+    # Resolve timestamps of all events blocks at once: one db query
+    # and batched node requests for blocks missing in db
+    blocks_timestamps = blocks_cache.load(
+        db_session,
+        web3,
+        blockchain_type,
+        {raw_event["blockNumber"] for raw_event in raw_events},
+        max_gap=db_block_query_batch,
+    )
+
+    all_events = []
+    for raw_event in raw_events:
+        event = Event(
+            event_name=raw_event["event"],
+            args=raw_event["args"],
+            address=raw_event["address"],
+            block_number=raw_event["blockNumber"],
+            block_timestamp=blocks_timestamps[raw_event["blockNumber"]],
+            transaction_hash=raw_event["transactionHash"],
+            log_index=raw_event["logIndex"],
+        )
+        all_events.append(event)
 
     return all_events
@@ -1,10 +1,15 @@
 import logging
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple, Type, cast
 
-from moonstreamdb.blockchain import AvailableBlockchainType
+from moonstreamdb.blockchain import (
+    AvailableBlockchainType,
+    get_block_model,
+    get_transaction_model,
+)
 from moonworm.crawler.function_call_crawler import (  # type: ignore
     ContractFunctionCall,
     FunctionCallCrawler,
+    utfy_dict,
 )
 from moonworm.crawler.moonstream_ethereum_state_provider import (  # type: ignore
     MoonstreamEthereumStateProvider,
@@ -13,8 +18,20 @@ from moonworm.crawler.networks import Network  # type: ignore
 from moonworm.cu_watch import MockState  # type: ignore
 from sqlalchemy.orm import Session
 from web3 import Web3
+from web3.contract import Contract
 
-from .crawler import FunctionCallCrawlJob, _generate_reporter_callback
+from ..block_timestamps import BlockTimestampsCache
+from ..blockchain import (
+    BatchRequestError,
+    get_blocks,
+    get_blocks_receipts,
+    get_transaction_receipts,
+)
+from .crawler import (
+    FunctionCallCrawlJob,
+    _generate_reporter_callback,
+    encode_function_signature,
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -50,6 +67,215 @@ def _crawl_functions(
     return crawled_functions
 
 
+def make_function_selectors_index(
+    web3: Web3, jobs: List[FunctionCallCrawlJob]
+) -> Dict[str, Dict[str, Type[Contract]]]:
+    """
+    Index of lowercased contract address -> method selector -> contract
+    which decodes calls of the method.
+    """
+    index: Dict[str, Dict[str, Type[Contract]]] = {}
+    for job in jobs:
+        contract = web3.eth.contract(abi=job.contract_abi)
+        selectors = index.setdefault(job.contract_address.lower(), {})
+        for function_abi in job.contract_abi:
+            selector = encode_function_signature(function_abi)
+            if selector is not None:
+                selectors[selector] = contract
+    return index
+
+
+def _get_db_transactions(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    contracts_addresses: List[str],
+    from_block: int,
+    to_block: int,
+) -> Tuple[List[Dict[str, Any]], Dict[int, int]]:
+    """
+    Select transactions to contracts from blocks already stored by blocks crawler.
+
+    Returns transactions and timestamps of stored blocks, blocks which are not
+    in database should be fetched from node.
+    """
+    block_model = get_block_model(blockchain_type)
+    transaction_model = get_transaction_model(blockchain_type)
+
+    stored_blocks_timestamps: Dict[int, int] = {
+        block_number: timestamp
+        for block_number, timestamp in db_session.query(
+            block_model.block_number, block_model.timestamp
+        )
+        .filter(block_model.block_number.between(from_block, to_block))
+        .all()
+    }
+    if not stored_blocks_timestamps:
+        return [], stored_blocks_timestamps
+
+    transactions = [
+        {
+            "block_number": block_number,
+            "hash": transaction_hash,
+            "from": from_address,
+            "to": to_address,
+            "input": transaction_input,
+        }
+        for (
+            block_number,
+            transaction_hash,
+            from_address,
+            to_address,
+            transaction_input,
+        ) in db_session.query(
+            transaction_model.block_number,
+            transaction_model.hash,
+            transaction_model.from_address,
+            transaction_model.to_address,
+            transaction_model.input,
+        )
+        .filter(
+            transaction_model.to_address.in_(contracts_addresses),
+            transaction_model.block_number.between(from_block, to_block),
+        )
+        .order_by(transaction_model.block_number, transaction_model.transaction_index)
+        .all()
+    ]
+    return transactions, stored_blocks_timestamps
+
+
+def _crawl_functions_batched(
+    blockchain_type: AvailableBlockchainType,
+    web3: Web3,
+    jobs: List[FunctionCallCrawlJob],
+    from_block: int,
+    to_block: int,
+    blocks_cache: Optional[BlockTimestampsCache] = None,
+    rpc_batch_size: int = 100,
+    block_receipts: bool = False,
+    db_session: Optional[Session] = None,
+) -> List[ContractFunctionCall]:
+    """
+    Crawl function calls of all jobs with one pass over blocks transactions.
+
+    Transactions to subscribed contracts are decoded by method selector, receipts
+    are fetched only for decoded transactions with batch requests. If block_receipts
+    is set, receipts are fetched with eth_getBlockReceipts for blocks with decoded
+    transactions, falling back to per transaction receipts if node does not support it.
+
+    If db_session is given, transactions of blocks stored by blocks crawler are
+    selected from database and only missing blocks are fetched from node.
+    """
+    selectors_index = make_function_selectors_index(web3, jobs)
+    if not selectors_index:
+        return []
+    on_decode_error = _generate_reporter_callback("function_call", blockchain_type)
+
+    candidate_transactions: List[Dict[str, Any]] = []
+    blocks_timestamps: Dict[int, int] = {}
+    if db_session is not None:
+        candidate_transactions, blocks_timestamps = _get_db_transactions(
+            db_session,
+            blockchain_type,
+            list({Web3.toChecksumAddress(job.contract_address) for job in jobs}),
+            from_block,
+            to_block,
+        )
+
+    node_blocks = [
+        block_number
+        for block_number in range(from_block, to_block + 1)
+        if block_number not in blocks_timestamps
+    ]
+    if db_session is not None:
+        logger.info(
+            f"Selected {len(candidate_transactions)} transactions from database, "
+            f"fetching {len(node_blocks)} missing blocks from node"
+        )
+    for i in range(0, len(node_blocks), rpc_batch_size):
+        for block in get_blocks(
+            web3,
+            blockchain_type,
+            node_blocks[i : i + rpc_batch_size],
+            full_transactions=True,
+        ):
+            blocks_timestamps[block["number"]] = block["timestamp"]
+            # Blocks are requested with full transactions
+            for transaction in cast(List[Any], block["transactions"]):
+                if (
+                    transaction["to"] is not None
+                    and transaction["to"].lower() in selectors_index
+                ):
+                    candidate_transactions.append(
+                        {
+                            "block_number": block["number"],
+                            "hash": transaction["hash"].hex(),
+                            "from": transaction["from"],
+                            "to": transaction["to"],
+                            "input": transaction["input"],
+                        }
+                    )
+
+    if blocks_cache is not None:
+        blocks_cache.add(blocks_timestamps)
+
+    decoded_calls: List[Tuple[Dict[str, Any], str, Dict[str, Any]]] = []
+    for transaction in candidate_transactions:
+        if transaction["to"] is None or transaction["input"] is None:
+            continue
+        selectors = selectors_index.get(transaction["to"].lower())
+        if selectors is None:
+            continue
+        contract = selectors.get(transaction["input"][:10])
+        if contract is None:
+            continue
+        try:
+            function, function_args = contract.decode_function_input(
+                transaction["input"]
+            )
+        except Exception as e:
+            on_decode_error(e)
+            continue
+        decoded_calls.append((transaction, function.fn_name, function_args))
+
+    if not decoded_calls:
+        return []
+
+    transactions_hashes = [transaction["hash"] for transaction, _, _ in decoded_calls]
+    receipts: Optional[Dict[str, Any]] = None
+    if block_receipts:
+        try:
+            receipts = get_blocks_receipts(
+                web3,
+                sorted(
+                    {transaction["block_number"] for transaction, _, _ in decoded_calls}
+                ),
+            )
+        except BatchRequestError as err:
+            logger.warning(f"Falling back to transactions receipts: {err}")
+    if receipts is None:
+        receipts = get_transaction_receipts(
+            web3, transactions_hashes, batch_size=rpc_batch_size
+        )
+
+    crawled_functions = []
+    for transaction, function_name, function_args in decoded_calls:
+        receipt = receipts[transaction["hash"]]
+        crawled_functions.append(
+            ContractFunctionCall(
+                block_number=transaction["block_number"],
+                block_timestamp=blocks_timestamps[transaction["block_number"]],
+                transaction_hash=transaction["hash"],
+                contract_address=transaction["to"],
+                caller_address=transaction["from"],
+                function_name=function_name,
+                function_args=utfy_dict(function_args),
+                gas_used=receipt["gasUsed"],
+                status=receipt["status"],
+            )
+        )
+    return crawled_functions
+
+
 def function_call_crawler(
     db_session: Session,
     blockchain_type: AvailableBlockchainType,
@@ -1,20 +1,39 @@
 import logging
 import time
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
 from uuid import UUID
 
 from moonstreamdb.blockchain import AvailableBlockchainType
+from moonstreamdb.db import yield_db_session_ctx
 from moonworm.crawler.moonstream_ethereum_state_provider import (  # type: ignore
     MoonstreamEthereumStateProvider,
 )
 from moonworm.crawler.networks import Network  # type: ignore
 from sqlalchemy.orm.session import Session
 from web3 import Web3
+from web3.middleware import geth_poa_middleware
 
+from ..block_timestamps import BlockTimestampsCache
+from ..blockchain import get_web3_provider
+from ..checkpoints import (
+    MOONWORM_HISTORICAL_CRAWLER,
+    CrawlRangeRolledBack,
+    crawl_range_start_block,
+    get_crawl_ranges,
+    split_range,
+    update_crawl_range_progress,
+)
+from .batch_size import BatchSizeController
 from .crawler import EventCrawlJob, FunctionCallCrawlJob, _retry_connect_web3
-from .db import add_events_to_session, add_function_calls_to_session, commit_session
+from .db import (
+    add_events_to_session,
+    add_function_calls_to_session,
+    commit_session,
+    dispose_inherited_connections,
+)
 from .event_crawler import _crawl_events
-from .function_call_crawler import _crawl_functions
+from .function_call_crawler import _crawl_functions, _crawl_functions_batched
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,8 +50,23 @@ def historical_crawler(
     max_blocks_batch: int = 100,
     min_sleep_time: float = 0.1,
     access_id: Optional[UUID] = None,
+    max_adaptive_blocks_batch: int = 1000,
+    progress_callback: Optional[Callable[[Session, int], None]] = None,
+    batched_function_calls: bool = False,
+    db_function_calls: bool = False,
 ):
+    """
+    Crawl blocks from start_block down to end_block.
+
+    progress_callback is called with session and the lowest crawled block
+    before each batch is committed. If batched_function_calls is set, function
+    calls of all jobs are crawled with one pass over blocks transactions,
+    db_function_calls additionally selects transactions from database.
+    """
     assert max_blocks_batch > 0, "max_blocks_batch must be greater than 0"
+    assert (
+        max_adaptive_blocks_batch >= max_blocks_batch
+    ), "max_adaptive_blocks_batch must be greater than max_blocks_batch"
     assert min_sleep_time > 0, "min_sleep_time must be greater than 0"
     assert start_block >= end_block, "start_block must be greater than end_block"
     assert end_block > 0, "end_block must be greater than 0"
@@ -57,7 +91,10 @@ def historical_crawler(
 
     logger.info(f"Starting historical event crawler start_block={start_block}")
 
-    blocks_cache: Dict[int, int] = {}
+    blocks_cache = BlockTimestampsCache()
+    batch_size_controller = BatchSizeController(
+        initial_size=max_blocks_batch, max_size=max_adaptive_blocks_batch
+    )
     failed_count = 0
 
     while start_block >= end_block:
@@ -66,10 +103,11 @@ def historical_crawler(
             time.sleep(min_sleep_time)
 
             batch_end_block = max(
-                start_block - max_blocks_batch,
+                start_block - batch_size_controller.size + 1,
                 end_block,
             )
 
+            step_started_at = time.time()
             logger.info(f"Crawling events from {start_block} to {batch_end_block}")
             all_events = _crawl_events(
                 db_session=db_session,
@@ -90,14 +128,26 @@ def historical_crawler(
             logger.info(
                 f"Crawling function calls from {start_block} to {batch_end_block}"
             )
+            all_function_calls = []
             if function_call_crawl_jobs:
-                all_function_calls = _crawl_functions(
-                    blockchain_type,
-                    ethereum_state_provider,
-                    function_call_crawl_jobs,
-                    batch_end_block,
-                    start_block,
-                )
+                if batched_function_calls or db_function_calls:
+                    all_function_calls = _crawl_functions_batched(
+                        blockchain_type,
+                        web3,
+                        function_call_crawl_jobs,
+                        batch_end_block,
+                        start_block,
+                        blocks_cache=blocks_cache,
+                        db_session=db_session if db_function_calls else None,
+                    )
+                else:
+                    all_function_calls = _crawl_functions(
+                        blockchain_type,
+                        ethereum_state_provider,
+                        function_call_crawl_jobs,
+                        batch_end_block,
+                        start_block,
+                    )
                 logger.info(
                     f"Crawled {len(all_function_calls)} function calls from {start_block} to {batch_end_block}."
                 )
@@ -106,12 +156,26 @@ def historical_crawler(
                     db_session, all_function_calls, blockchain_type
                 )
 
+            if progress_callback is not None:
+                progress_callback(db_session, batch_end_block)
+
             # Commiting to db
             commit_session(db_session)
+            batch_size_controller.record_success(
+                start_block - batch_end_block + 1,
+                time.time() - step_started_at,
+                len(all_events) + len(all_function_calls),
+            )
 
             start_block = batch_end_block - 1
             failed_count = 0
+        except CrawlRangeRolledBack:
+            db_session.rollback()
+            raise
         except Exception as e:
+            if batch_size_controller.record_failure(e):
+                db_session.rollback()
+                continue
 
             logger.error(f"Internal error: {e}")
             logger.exception(e)
@@ -125,3 +189,165 @@ def historical_crawler(
                 logger.error(f"Failed to reconnect: {err}")
                 logger.exception(err)
                 raise err
+
+
+def _crawl_historical_shard(
+    blockchain_type: AvailableBlockchainType,
+    web3_uri: Optional[str],
+    poa: bool,
+    access_id: Optional[UUID],
+    event_crawl_jobs: List[EventCrawlJob],
+    function_call_crawl_jobs: List[FunctionCallCrawlJob],
+    crawl_range_id: UUID,
+    progress_block: Optional[int],
+    start_block: int,
+    end_block: int,
+    max_blocks_batch: int,
+    min_sleep_time: float,
+    max_adaptive_blocks_batch: int,
+    batched_function_calls: bool = False,
+    db_function_calls: bool = False,
+) -> None:
+    """
+    Crawl one shard in worker process with its own database session
+    and web3 connection, shard progress is saved with each batch.
+
+    Raises CrawlRangeRolledBack if shard progress was rolled back by chain
+    reorganization, shard is crawled again on next run.
+    """
+    web3: Optional[Web3] = None
+    if web3_uri is not None:
+        web3 = Web3(get_web3_provider(web3_uri))
+        if poa:
+            web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+
+    saved_progress_block = progress_block
+
+    def save_progress(db_session: Session, progress_block: int) -> None:
+        nonlocal saved_progress_block
+        update_crawl_range_progress(
+            db_session,
+            crawl_range_id,
+            saved_progress_block,
+            progress_block,
+            finished=progress_block <= end_block,
+        )
+        saved_progress_block = progress_block
+
+    with yield_db_session_ctx() as db_session:
+        historical_crawler(
+            db_session,
+            blockchain_type,
+            web3,
+            event_crawl_jobs,
+            function_call_crawl_jobs,
+            start_block,
+            end_block,
+            max_blocks_batch,
+            min_sleep_time,
+            access_id=access_id,
+            max_adaptive_blocks_batch=max_adaptive_blocks_batch,
+            progress_callback=save_progress,
+            batched_function_calls=batched_function_calls,
+            db_function_calls=db_function_calls,
+        )
+
+
+def parallel_historical_crawler(
+    db_session: Session,
+    blockchain_type: AvailableBlockchainType,
+    label: str,
+    event_crawl_jobs: List[EventCrawlJob],
+    function_call_crawl_jobs: List[FunctionCallCrawlJob],
+    start_block: int,
+    end_block: int,
+    workers: int,
+    shard_size: int = 100000,
+    web3_uri: Optional[str] = None,
+    poa: bool = False,
+    max_blocks_batch: int = 100,
+    min_sleep_time: float = 0.1,
+    access_id: Optional[UUID] = None,
+    max_adaptive_blocks_batch: int = 1000,
+    batched_function_calls: bool = False,
+    db_function_calls: bool = False,
+) -> None:
+    """
+    Split blocks from start_block down to end_block into shards of shard_size blocks
+    and crawl them with pool of worker processes.
+
+    Shards progress is stored in crawler_ranges table under label,
+    so interrupted crawl continues only with unfinished shards.
+    """
+    assert workers > 0, "workers must be greater than 0"
+    assert start_block >= end_block, "start_block must be greater than end_block"
+
+    crawl_ranges = get_crawl_ranges(
+        db_session,
+        MOONWORM_HISTORICAL_CRAWLER,
+        blockchain_type,
+        label,
+        split_range(end_block, start_block, shard_size),
+    )
+    # Shard is crawled from its to_block down to from_block
+    shards: List[Tuple[UUID, Optional[int], int, int]] = [
+        (
+            crawl_range.id,
+            crawl_range.progress_block,
+            crawl_range_start_block(crawl_range),
+            crawl_range.from_block,
+        )
+        for crawl_range in crawl_ranges
+        if not crawl_range.finished
+    ]
+    # Newest blocks first, as sequential crawler does
+    shards.reverse()
+
+    logger.info(
+        f"Crawling {len(shards)} unfinished of {len(crawl_ranges)} shards "
+        f"from {start_block} to {end_block} with {workers} workers"
+    )
+
+    failed_shards = []
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=dispose_inherited_connections
+    ) as executor:
+        futures = {
+            executor.submit(
+                _crawl_historical_shard,
+                blockchain_type,
+                web3_uri,
+                poa,
+                access_id,
+                event_crawl_jobs,
+                function_call_crawl_jobs,
+                crawl_range_id,
+                progress_block,
+                shard_start_block,
+                shard_end_block,
+                max_blocks_batch,
+                min_sleep_time,
+                max_adaptive_blocks_batch,
+                batched_function_calls,
+                db_function_calls,
+            ): (shard_start_block, shard_end_block)
+            for crawl_range_id, progress_block, shard_start_block, shard_end_block in shards
+        }
+        for future in as_completed(futures):
+            shard_start_block, shard_end_block = futures[future]
+            try:
+                future.result()
+                logger.info(
+                    f"Finished shard from {shard_start_block} to {shard_end_block}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"Shard from {shard_start_block} to {shard_end_block} failed: {e}"
+                )
+                failed_shards.append((shard_start_block, shard_end_block))
+
+    if failed_shards:
+        raise Exception(
+            f"{len(failed_shards)} shards failed, run crawler again to resume them: "
+            f"{failed_shards}"
+        )
@@ -0,0 +1,242 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from bugout.data import BugoutSearchResult
+from moonstreamdb.blockchain import AvailableBlockchainType
+
+from ..settings import MOONSTREAM_MOONWORM_TASKS_JOURNAL
+from .crawler import (
+    CrawlJobRegistry,
+    EventCrawlJob,
+    FunctionCallCrawlJob,
+    blockchain_type_to_subscription_type,
+    encode_function_signature,
+    get_crawl_job_entries,
+    make_event_crawl_jobs,
+    make_function_call_crawl_jobs,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CRAWLER_TYPES = ["event", "function"]
+
+# Overlap of consecutive delta requests, to not miss entries updated during request
+SYNC_OVERLAP_SECONDS = 60
+
+# Sync timestamp and fetched entries by crawler type
+JobsUpdates = Tuple[int, Dict[str, List[BugoutSearchResult]]]
+
+
+def _entry_id(entry: BugoutSearchResult) -> str:
+    return entry.entry_url.rstrip("/").split("/")[-1]
+
+
+def _is_active(entry: BugoutSearchResult) -> bool:
+    return "status:active" in entry.tags
+
+
+def _make_entry_job(
+    crawler_type: str, entry: BugoutSearchResult
+) -> Tuple[Tuple[str, str], Union[EventCrawlJob, FunctionCallCrawlJob]]:
+    """
+    Returns crawl job of entry with its key. Event jobs are identified by
+    (abi hash, contract address), function call jobs by (contract address,
+    method selector).
+    """
+    if crawler_type == "event":
+        event_job = make_event_crawl_jobs([entry])[0]
+        return (event_job.event_abi_hash, event_job.contracts[0]), event_job
+
+    function_call_job = make_function_call_crawl_jobs([entry])[0]
+    selector = encode_function_signature(function_call_job.contract_abi[0])
+    return (function_call_job.contract_address, str(selector)), function_call_job
+
+
+class CrawlJobsSync:
+    """
+    Keeps CrawlJobRegistry in sync with moonworm tasks journal.
+
+    Job entries are cached in local snapshot file, on startup only entries
+    updated since snapshot are requested. Each sync requests entries updated
+    since previous one, added and updated active entries are added to registry,
+    jobs of deactivated entries are removed.
+    """
+
+    def __init__(
+        self,
+        blockchain_type: AvailableBlockchainType,
+        snapshot_path: Optional[str] = None,
+        journal_id: str = MOONSTREAM_MOONWORM_TASKS_JOURNAL,
+    ) -> None:
+        self.blockchain_type = blockchain_type
+        self.snapshot_path = snapshot_path
+        self.journal_id = journal_id
+        self.registry = CrawlJobRegistry()
+        self.synced_at: Optional[int] = None
+
+        # Active entries by crawler type and entry id, with their job keys
+        self._entries: Dict[str, Dict[str, BugoutSearchResult]] = {
+            crawler_type: {} for crawler_type in CRAWLER_TYPES
+        }
+        self._entry_keys: Dict[str, Dict[str, Tuple[str, str]]] = {
+            crawler_type: {} for crawler_type in CRAWLER_TYPES
+        }
+        self._key_entries: Dict[str, Dict[Tuple[str, str], Set[str]]] = {
+            crawler_type: {} for crawler_type in CRAWLER_TYPES
+        }
+
+    def _fetch_entries(
+        self, crawler_type: str, updated_at_filter: Optional[int]
+    ) -> List[BugoutSearchResult]:
+        return get_crawl_job_entries(
+            subscription_type=blockchain_type_to_subscription_type(
+                self.blockchain_type
+            ),
+            crawler_type=crawler_type,
+            journal_id=self.journal_id,
+            updated_at_filter=updated_at_filter,
+            only_active=updated_at_filter is None,
+        )
+
+    def _add_entry(self, crawler_type: str, entry: BugoutSearchResult) -> bool:
+        entry_id = _entry_id(entry)
+        try:
+            job_key, job = _make_entry_job(crawler_type, entry)
+        except Exception as e:
+            logger.error(f"Skipping malformed {crawler_type} job entry {entry_id}: {e}")
+            return False
+
+        self._entries[crawler_type][entry_id] = entry
+        self._entry_keys[crawler_type][entry_id] = job_key
+        self._key_entries[crawler_type].setdefault(job_key, set()).add(entry_id)
+        if isinstance(job, EventCrawlJob):
+            return self.registry.add_event_jobs([job]) > 0
+        return self.registry.add_function_call_jobs([job]) > 0
+
+    def _remove_entry(self, crawler_type: str, entry_id: str) -> bool:
+        if entry_id not in self._entries[crawler_type]:
+            return False
+
+        del self._entries[crawler_type][entry_id]
+        job_key = self._entry_keys[crawler_type].pop(entry_id)
+        key_entries = self._key_entries[crawler_type][job_key]
+        key_entries.discard(entry_id)
+        # Other active entry could describe the same job
+        if key_entries:
+            return False
+
+        del self._key_entries[crawler_type][job_key]
+        if crawler_type == "event":
+            return self.registry.remove_event_job(*job_key)  # type: ignore
+        return self.registry.remove_function_call_job(*job_key)  # type: ignore
+
+    def _apply(
+        self, crawler_type: str, entries: List[BugoutSearchResult]
+    ) -> Tuple[int, int]:
+        added = 0
+        removed = 0
+        for entry in entries:
+            entry_id = _entry_id(entry)
+            if entry_id in self._entries[crawler_type]:
+                # Updated entry could change its job, readd it
+                removed += self._remove_entry(crawler_type, entry_id)
+            if _is_active(entry):
+                added += self._add_entry(crawler_type, entry)
+        return added, removed
+
+    def load(self) -> None:
+        """
+        Load jobs from snapshot and sync them, or fetch all active jobs
+        if there is no snapshot.
+        """
+        if self.snapshot_path is not None and os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as ifp:
+                snapshot = json.load(ifp)
+            for crawler_type in CRAWLER_TYPES:
+                for entry_data in snapshot["entries"][crawler_type]:
+                    self._add_entry(crawler_type, BugoutSearchResult(**entry_data))
+            self.synced_at = snapshot["synced_at"]
+            logger.info(
+                f"Loaded {len(self.registry.event_jobs)} event and "
+                f"{len(self.registry.function_call_jobs)} function call crawl jobs "
+                f"from snapshot {self.snapshot_path}"
+            )
+            self.sync()
+            return
+
+        synced_at = int(time.time()) - SYNC_OVERLAP_SECONDS
+        for crawler_type in CRAWLER_TYPES:
+            self._apply(crawler_type, self._fetch_entries(crawler_type, None))
+        self.synced_at = synced_at
+        self.save()
+
+    def fetch_updates(self) -> JobsUpdates:
+        """
+        Request jobs entries added, updated or deactivated since previous sync.
+
+        Does not change registry, so could be called from background thread.
+        """
+        synced_at = int(time.time()) - SYNC_OVERLAP_SECONDS
+        entries = {
+            crawler_type: self._fetch_entries(crawler_type, self.synced_at)
+            for crawler_type in CRAWLER_TYPES
+        }
+        return synced_at, entries
+
+    def apply_updates(self, updates: JobsUpdates) -> Tuple[int, int]:
+        """
+        Apply fetched jobs entries to registry.
+
+        Returns number of added and removed jobs.
+        """
+        synced_at, entries = updates
+        added = 0
+        removed = 0
+        for crawler_type in CRAWLER_TYPES:
+            crawler_type_added, crawler_type_removed = self._apply(
+                crawler_type, entries[crawler_type]
+            )
+            added += crawler_type_added
+            removed += crawler_type_removed
+        # Next updates could be fetched before previous ones were applied
+        if self.synced_at is None or synced_at > self.synced_at:
+            self.synced_at = synced_at
+
+        logger.info(f"Crawl jobs synced, added: {added}, removed: {removed}")
+        if added or removed:
+            self.save()
+        return added, removed
+
+    def sync(self) -> Tuple[int, int]:
+        """
+        Apply jobs entries added, updated or deactivated since previous sync.
+
+        Returns number of added and removed jobs.
+        """
+        return self.apply_updates(self.fetch_updates())
+
+    def save(self) -> None:
+        """
+        Atomically write snapshot of active jobs entries.
+        """
+        if self.snapshot_path is None:
+            return
+
+        snapshot: Dict[str, Any] = {
+            "synced_at": self.synced_at,
+            "entries": {
+                crawler_type: [
+                    json.loads(entry.json())
+                    for entry in self._entries[crawler_type].values()
+                ]
+                for crawler_type in CRAWLER_TYPES
+            },
+        }
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as ofp:
+            json.dump(snapshot, ofp)
+        os.replace(tmp_path, self.snapshot_path)
@@ -0,0 +1,75 @@
+import unittest
+from unittest import mock
+
+from moonstreamdb.blockchain import AvailableBlockchainType
+
+from . import continuous_crawler as continuous_crawler_module
+
+
+class CrawlerStopped(BaseException):
+    pass
+
+
+class TestContinuousCrawlerBatchSize(unittest.TestCase):
+    def setUp(self):
+        self.crawled_ranges = []
+        self.sleeps = 0
+
+        patches = [
+            mock.patch.object(continuous_crawler_module, "HeartbeatWorker"),
+            mock.patch.object(continuous_crawler_module, "JobsRefetchWorker"),
+            mock.patch.object(continuous_crawler_module, "LabelsWriteBuffer"),
+            mock.patch.object(
+                continuous_crawler_module, "MoonstreamEthereumStateProvider"
+            ),
+            mock.patch.object(continuous_crawler_module, "heartbeat"),
+            mock.patch.object(
+                continuous_crawler_module, "_crawl_functions", return_value=[]
+            ),
+            mock.patch.object(
+                continuous_crawler_module, "_crawl_events", side_effect=self.crawl
+            ),
+            mock.patch.object(
+                continuous_crawler_module.time, "sleep", side_effect=self.sleep
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        refetch_worker = continuous_crawler_module.JobsRefetchWorker.return_value
+        refetch_worker.get_updates.return_value = []
+        labels_buffer = continuous_crawler_module.LabelsWriteBuffer.return_value
+        labels_buffer.should_flush.return_value = False
+
+    def crawl(self, from_block, to_block, **kwargs):
+        self.crawled_ranges.append((from_block, to_block))
+        if len(self.crawled_ranges) == 1:
+            raise ValueError("query returned more than 10000 results")
+        if len(self.crawled_ranges) == 3:
+            raise CrawlerStopped()
+        return []
+
+    def sleep(self, seconds):
+        self.sleeps += 1
+        if self.sleeps > 10:
+            raise CrawlerStopped()
+
+    def test_crawls_window_halved_below_min_blocks_batch(self):
+        web3 = mock.MagicMock()
+        web3.eth.blockNumber = 10000
+
+        with self.assertRaises(CrawlerStopped):
+            continuous_crawler_module.continuous_crawler(
+                db_session=mock.MagicMock(),
+                blockchain_type=AvailableBlockchainType.ETHEREUM,
+                web3=web3,
+                event_crawl_jobs=[],
+                function_call_crawl_jobs=[],
+                start_block=100,
+                max_blocks_batch=60,
+                min_blocks_batch=40,
+                confirmations=10,
+            )
+
+        self.assertListEqual(self.crawled_ranges, [(100, 159), (100, 129), (130, 174)])
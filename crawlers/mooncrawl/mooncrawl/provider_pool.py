@@ -0,0 +1,189 @@
+"""
+Pool of HTTP web3 providers for one blockchain.
+
+Requests are balanced between endpoints by measured latency and error rate,
+endpoints failing several times in a row are ejected for a while and requests
+are retried on other endpoints, so crawlers keep working when one node is down.
+"""
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from eth_typing import URI
+from web3 import HTTPProvider
+from web3._utils.request import make_post_request
+from web3.types import RPCEndpoint, RPCResponse
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ProviderPoolError(Exception):
+    """
+    Raised when request failed on all endpoints of the pool.
+    """
+
+
+@dataclass
+class EndpointHealth:
+    """
+    Exponentially weighted latency (seconds) and error rate of endpoint.
+    """
+
+    uri: str
+    latency: Optional[float] = None
+    error_rate: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    consecutive_errors: int = 0
+    ejected_until: float = 0.0
+
+    def score(self) -> float:
+        """
+        Lower is better, endpoints without measurements are tried first.
+        """
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "uri": self.uri,
+            "latency": self.latency,
+            "error_rate": round(self.error_rate, 4),
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": self.ejected_until > time.time(),
+        }
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTP provider which sends each request to the healthiest of several endpoints.
+
+    Endpoint is picked randomly with weights inversely proportional to its score.
+    After eject_after_errors consecutive failures endpoint is ejected for
+    eject_seconds. Only transport and HTTP errors affect health, JSON-RPC errors
+    are returned to caller as is.
+    """
+
+    def __init__(
+        self,
+        endpoint_uris: List[str],
+        request_kwargs: Optional[Any] = None,
+        eject_after_errors: int = 3,
+        eject_seconds: float = 30,
+        smoothing: float = 0.2,
+    ) -> None:
+        if not endpoint_uris:
+            raise ValueError("At least one endpoint URI is required")
+        for endpoint_uri in endpoint_uris:
+            if not (
+                endpoint_uri.startswith("http://")
+                or endpoint_uri.startswith("https://")
+            ):
+                raise ValueError(
+                    f"Provider pool supports only HTTP endpoints, got: {endpoint_uri}"
+                )
+        super().__init__(endpoint_uris[0], request_kwargs=request_kwargs)
+
+        self.endpoints = [EndpointHealth(uri=uri) for uri in endpoint_uris]
+        self.eject_after_errors = eject_after_errors
+        self.eject_seconds = eject_seconds
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def __str__(self) -> str:
+        endpoints_uris = [endpoint.uri for endpoint in self.endpoints]
+        return f"Pooled HTTP connection {endpoints_uris}"
+
+    def _choose_endpoint(self, exclude: Iterable[str]) -> Optional[EndpointHealth]:
+        with self._lock:
+            candidates = [
+                endpoint for endpoint in self.endpoints if endpoint.uri not in exclude
+            ]
+            if not candidates:
+                return None
+
+            now = time.time()
+            healthy = [
+                endpoint for endpoint in candidates if endpoint.ejected_until <= now
+            ]
+            if not healthy:
+                # All endpoints are ejected, probe the one which returns first
+                return min(candidates, key=lambda endpoint: endpoint.ejected_until)
+
+            unmeasured = [endpoint for endpoint in healthy if endpoint.latency is None]
+            if unmeasured:
+                return random.choice(unmeasured)
+            weights = [1 / max(endpoint.score(), 1e-3) for endpoint in healthy]
+            return random.choices(healthy, weights=weights)[0]
+
+    def _record(self, endpoint: EndpointHealth, latency: float, failed: bool) -> None:
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.error_rate += self.smoothing * (int(failed) - endpoint.error_rate)
+            if failed:
+                endpoint.errors += 1
+                endpoint.consecutive_errors += 1
+                if endpoint.consecutive_errors >= self.eject_after_errors:
+                    endpoint.ejected_until = time.time() + self.eject_seconds
+                    logger.warning(
+                        f"Ejected web3 endpoint {endpoint.uri} for {self.eject_seconds} seconds "
+                        f"after {endpoint.consecutive_errors} consecutive errors"
+                    )
+                return
+
+            endpoint.consecutive_errors = 0
+            endpoint.ejected_until = 0.0
+            if endpoint.latency is None:
+                endpoint.latency = latency
+            else:
+                endpoint.latency += self.smoothing * (latency - endpoint.latency)
+
+    def post(
+        self, request_data: bytes, exclude: Iterable[str] = ()
+    ) -> Tuple[str, bytes]:
+        """
+        Send raw request to healthiest endpoint, retrying on other endpoints
+        on failure. Endpoints from exclude are not used.
+
+        Returns endpoint URI and raw response.
+        """
+        excluded = set(exclude)
+        last_error: Optional[Exception] = None
+        while True:
+            endpoint = self._choose_endpoint(excluded)
+            if endpoint is None:
+                break
+
+            started_at = time.time()
+            try:
+                raw_response = make_post_request(
+                    URI(endpoint.uri), request_data, **self.get_request_kwargs()
+                )
+            except Exception as err:
+                self._record(endpoint, time.time() - started_at, failed=True)
+                logger.warning(f"Request to web3 endpoint {endpoint.uri} failed: {err}")
+                excluded.add(endpoint.uri)
+                last_error = err
+                continue
+            self._record(endpoint, time.time() - started_at, failed=False)
+            return endpoint.uri, raw_response
+
+        raise ProviderPoolError(f"Request failed on all web3 endpoints: {last_error}")
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        _, raw_response = self.post(request_data)
+        return self.decode_rpc_response(raw_response)
+
+    def health(self) -> List[Dict[str, Any]]:
+        """
+        Health of endpoints, reported in crawlers heartbeats.
+        """
+        with self._lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
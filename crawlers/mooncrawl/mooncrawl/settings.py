@@ -109,6 +109,11 @@ if MOONSTREAM_MOONWORM_TASKS_JOURNAL == "":
         "MOONSTREAM_MOONWORM_TASKS_JOURNAL environment variable must be set"
     )
 
+# Directory for local snapshots of moonworm crawl jobs, snapshots are disabled if not set
+MOONSTREAM_MOONWORM_JOBS_SNAPSHOT_DIR: Optional[str] = os.environ.get(
+    "MOONSTREAM_MOONWORM_JOBS_SNAPSHOT_DIR"
+)
+
 # queries
 
 MOONSTREAM_QUERY_API_DB_STATEMENT_TIMEOUT_MILLIS = 30000
@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from moonstreamdb.blockchain import AvailableBlockchainType
+from web3.exceptions import TransactionNotFound
+
+from .async_blockchain import AsyncWeb3Client
+
+TRANSACTION_HASHES = [f"0x{i:064x}" for i in range(10)]
+
+
+class TestAsyncWeb3Client(unittest.TestCase):
+    def setUp(self):
+        self.client = AsyncWeb3Client(
+            AvailableBlockchainType.ETHEREUM, "http://node:8545", pool_size=3
+        )
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def get_transaction_receipt(transaction_hash):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            if transaction_hash == TRANSACTION_HASHES[1]:
+                raise TransactionNotFound(transaction_hash)
+            return {"transactionHash": transaction_hash}
+
+        self.client.get_transaction_receipt = get_transaction_receipt  # type: ignore
+
+    def test_requires_http_provider(self):
+        with self.assertRaises(ValueError):
+            AsyncWeb3Client(AvailableBlockchainType.ETHEREUM, "/tmp/geth.ipc")
+
+    def test_get_transaction_receipts_skip_missing(self):
+        receipts = asyncio.run(
+            self.client.get_transaction_receipts(TRANSACTION_HASHES, skip_missing=True)
+        )
+        self.assertListEqual(
+            list(receipts),
+            [TRANSACTION_HASHES[0]] + TRANSACTION_HASHES[2:],
+        )
+        self.assertEqual(self.max_in_flight, 3)
+
+    def test_get_transaction_receipts_raises_missing(self):
+        with self.assertRaises(TransactionNotFound):
+            asyncio.run(self.client.get_transaction_receipts(TRANSACTION_HASHES))
@@ -0,0 +1,115 @@
+import unittest
+from unittest import mock
+
+from moonstreamdb.blockchain import AvailableBlockchainType
+
+from .block_timestamps import BlockTimestampsCache
+
+
+def _db_session(rows):
+    db_session = mock.MagicMock()
+    db_session.query.return_value.filter.return_value.all.return_value = rows
+    return db_session
+
+
+class TestBlockTimestampsCache(unittest.TestCase):
+    def test_get_missing(self):
+        cache = BlockTimestampsCache()
+        cache.add({10: 100, 11: 110})
+        self.assertIsNone(cache.get(9))
+        self.assertIsNone(cache.get(12))
+        self.assertEqual(cache.get(11), 110)
+
+    def test_add_merges_adjacent_ranges(self):
+        cache = BlockTimestampsCache()
+        cache.add({1: 10, 2: 20, 5: 50})
+        self.assertIsNone(cache.get(3))
+        cache.add({3: 30, 4: 40})
+        self.assertEqual(len(cache), 5)
+        self.assertListEqual([cache.get(i) for i in range(1, 6)], [10, 20, 30, 40, 50])
+
+    def test_add_overlapping_range(self):
+        cache = BlockTimestampsCache()
+        cache.add({1: 10, 2: 20, 3: 30})
+        cache.add({2: 20, 3: 30, 4: 40})
+        self.assertEqual(len(cache), 4)
+        self.assertListEqual([cache.get(i) for i in range(1, 5)], [10, 20, 30, 40])
+
+    def test_merged_range_evicted_as_one(self):
+        cache = BlockTimestampsCache(max_blocks=4)
+        cache.add({1: 10})
+        cache.add({2: 20})
+        cache.add({10: 100})
+        cache.get(1)
+        cache.add({20: 200, 21: 210})
+        # Blocks 1-2 are one range, used after block 10 range
+        self.assertIsNone(cache.get(10))
+        self.assertEqual(cache.get(2), 20)
+        self.assertEqual(len(cache), 4)
+
+    def test_evicts_least_recently_used_range(self):
+        cache = BlockTimestampsCache(max_blocks=4)
+        cache.add({1: 10, 2: 20})
+        cache.add({10: 100, 11: 110})
+        cache.get(1)
+        cache.add({20: 200})
+        self.assertIsNone(cache.get(10))
+        self.assertEqual(cache.get(2), 20)
+        self.assertEqual(cache.get(20), 200)
+        self.assertEqual(len(cache), 3)
+
+    def test_add_range_covering_several_ranges(self):
+        cache = BlockTimestampsCache()
+        cache.add({2: 20, 3: 30, 6: 60, 9: 90, 10: 100})
+        cache.add({i: i * 10 + 1 for i in range(1, 10)})
+        self.assertEqual(len(cache), 10)
+        # Added timestamps replace cached ones
+        self.assertListEqual(
+            [cache.get(i) for i in range(1, 11)],
+            [11, 21, 31, 41, 51, 61, 71, 81, 91, 100],
+        )
+
+    def test_trims_oldest_blocks_of_contiguous_range(self):
+        cache = BlockTimestampsCache(max_blocks=1000)
+        for chunk_start in range(0, 20000, 100):
+            cache.add({i: i * 10 for i in range(chunk_start, chunk_start + 100)})
+        self.assertEqual(len(cache), 1000)
+        self.assertIsNone(cache.get(18999))
+        self.assertEqual(cache.get(19000), 190000)
+        self.assertEqual(cache.get(19999), 199990)
+
+    def test_load_cached(self):
+        cache = BlockTimestampsCache()
+        cache.add({1: 10, 2: 20})
+        db_session = _db_session([])
+        self.assertDictEqual(
+            cache.load(db_session, None, AvailableBlockchainType.ETHEREUM, [2, 1]),
+            {1: 10, 2: 20},
+        )
+        db_session.query.assert_not_called()
+
+    def test_load_from_database_and_node(self):
+        cache = BlockTimestampsCache()
+        cache.add({1: 10})
+        db_session = _db_session([(5, 50), (6, 60)])
+        with mock.patch(
+            "mooncrawl.block_timestamps.get_blocks",
+            return_value=[{"number": 7, "timestamp": 70}],
+        ) as get_blocks:
+            timestamps = cache.load(
+                db_session, None, AvailableBlockchainType.ETHEREUM, [1, 5, 7]
+            )
+        self.assertDictEqual(timestamps, {1: 10, 5: 50, 7: 70})
+        get_blocks.assert_called_once_with(None, AvailableBlockchainType.ETHEREUM, [7])
+
+        # Loaded blocks, including prefetched by database query, are cached
+        db_session = _db_session([])
+        self.assertDictEqual(
+            cache.load(db_session, None, AvailableBlockchainType.ETHEREUM, [5, 6, 7]),
+            {5: 50, 6: 60, 7: 70},
+        )
+        db_session.query.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import time
+import unittest
+from unittest import mock
+
+from web3 import HTTPProvider, Web3
+
+from . import blockchain
+from .blockchain import (
+    BatchRequestError,
+    BatchRequestRetryableError,
+    make_batch_request,
+)
+
+ENDPOINT = "http://node:8545"
+
+
+class TestMakeBatchRequest(unittest.TestCase):
+    def setUp(self):
+        self.web3 = Web3(HTTPProvider(ENDPOINT))
+        patch = mock.patch.dict(blockchain._batch_rejected_endpoints, clear=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def request(self, response):
+        with mock.patch.object(
+            blockchain,
+            "make_post_request",
+            return_value=json.dumps(response).encode("utf-8"),
+        ):
+            return make_batch_request(self.web3, "eth_chainId", [[], []])
+
+    def test_results_in_params_order(self):
+        results = self.request(
+            [
+                {"jsonrpc": "2.0", "id": 1, "result": "0x2"},
+                {"jsonrpc": "2.0", "id": 0, "result": "0x1"},
+            ]
+        )
+        self.assertListEqual(results, [1, 2])
+
+    def test_rate_limit_is_retryable(self):
+        rate_limit = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32005, "message": "rate limit exceeded"},
+        }
+        with self.assertRaises(BatchRequestRetryableError):
+            self.request(rate_limit)
+        self.assertDictEqual(blockchain._batch_rejected_endpoints, {})
+
+        self.request([{"jsonrpc": "2.0", "id": 0, "result": "0x1"}])
+
+    def test_rejected_batch_is_not_retried_until_expired(self):
+        rejection = {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "invalid request"},
+        }
+        with self.assertRaises(BatchRequestError) as context:
+            self.request(rejection)
+        self.assertNotIsInstance(context.exception, BatchRequestRetryableError)
+
+        with self.assertRaises(BatchRequestError):
+            self.request([{"jsonrpc": "2.0", "id": 0, "result": "0x1"}])
+
+        blockchain._batch_rejected_endpoints[ENDPOINT] = (
+            time.time() - blockchain.BATCH_REJECTION_SECONDS - 1
+        )
+        self.request([{"jsonrpc": "2.0", "id": 0, "result": "0x1"}])
@@ -0,0 +1,126 @@
+import unittest
+
+from moonstreamdb.models import CrawlerCheckpoint, CrawlerRange
+
+from .checkpoints import (
+    GENERIC_CRAWLER,
+    MOONWORM_CONTINUOUS_CRAWLER,
+    MOONWORM_HISTORICAL_CRAWLER,
+    add_range,
+    crawl_range_start_block,
+    last_shard_block,
+    rollback_checkpoint,
+    rollback_crawl_range,
+    split_range,
+    subtract_range,
+)
+
+
+class TestAddRange(unittest.TestCase):
+    def test_add_range_to_empty(self):
+        self.assertListEqual(add_range([], 5, 10), [[5, 10]])
+
+    def test_add_range_merges_overlapping_and_adjacent(self):
+        self.assertListEqual(
+            add_range([[1, 3], [8, 10], [20, 30]], 4, 9), [[1, 10], [20, 30]]
+        )
+
+    def test_add_range_keeps_separate(self):
+        self.assertListEqual(add_range([[20, 30]], 1, 5), [[1, 5], [20, 30]])
+
+    def test_add_empty_range(self):
+        self.assertListEqual(add_range([[1, 5]], 10, 9), [[1, 5]])
+
+
+class TestSubtractRange(unittest.TestCase):
+    def test_subtract_range_splits(self):
+        self.assertListEqual(subtract_range([[1, 10]], 4, 6), [[1, 3], [7, 10]])
+
+    def test_subtract_range_removes_covered(self):
+        self.assertListEqual(
+            subtract_range([[1, 3], [5, 7], [9, 12]], 2, 10), [[1, 1], [11, 12]]
+        )
+
+    def test_subtract_range_not_overlapping(self):
+        self.assertListEqual(subtract_range([[1, 3]], 4, 6), [[1, 3]])
+
+
+class TestSplitRange(unittest.TestCase):
+    def test_split_range_aligned_shards(self):
+        self.assertListEqual(
+            split_range(150, 420, 100),
+            [(150, 199), (200, 299), (300, 399), (400, 420)],
+        )
+
+    def test_split_range_single_block(self):
+        self.assertListEqual(split_range(5, 5, 100), [(5, 5)])
+
+    def test_last_shard_block(self):
+        self.assertEqual(last_shard_block(420, 100), 399)
+        self.assertEqual(last_shard_block(399, 100), 399)
+        self.assertEqual(last_shard_block(50, 100), -1)
+
+
+class TestRollbackCrawlersProgress(unittest.TestCase):
+    def test_rollback_checkpoint_crawls_fork_again(self):
+        checkpoint = CrawlerCheckpoint(
+            crawler=MOONWORM_CONTINUOUS_CRAWLER,
+            first_block=10,
+            last_block=120,
+            gaps=[[20, 30], [100, 110]],
+        )
+        self.assertTrue(rollback_checkpoint(checkpoint, 104))
+        # Continuous crawler resumes right after last_block
+        self.assertEqual(checkpoint.last_block + 1, 105)
+        self.assertListEqual(checkpoint.gaps, [[20, 30], [100, 104]])
+
+    def test_rollback_checkpoint_below_fork_unchanged(self):
+        checkpoint = CrawlerCheckpoint(first_block=10, last_block=50, gaps=[])
+        self.assertFalse(rollback_checkpoint(checkpoint, 60))
+        self.assertEqual(checkpoint.last_block, 50)
+
+    def test_rollback_finished_ascending_range(self):
+        crawl_range = CrawlerRange(
+            crawler=GENERIC_CRAWLER,
+            from_block=100,
+            to_block=199,
+            progress_block=199,
+            finished=True,
+        )
+        self.assertTrue(rollback_crawl_range(crawl_range, 149))
+        self.assertFalse(crawl_range.finished)
+        self.assertEqual(crawl_range_start_block(crawl_range), 150)
+
+    def test_rollback_ascending_range_below_from_block(self):
+        crawl_range = CrawlerRange(
+            crawler=GENERIC_CRAWLER,
+            from_block=100,
+            to_block=199,
+            progress_block=120,
+            finished=False,
+        )
+        self.assertTrue(rollback_crawl_range(crawl_range, 90))
+        self.assertEqual(crawl_range_start_block(crawl_range), 100)
+
+    def test_rollback_descending_range_crawls_it_again(self):
+        crawl_range = CrawlerRange(
+            crawler=MOONWORM_HISTORICAL_CRAWLER,
+            from_block=100,
+            to_block=199,
+            progress_block=100,
+            finished=True,
+        )
+        self.assertTrue(rollback_crawl_range(crawl_range, 149))
+        self.assertFalse(crawl_range.finished)
+        self.assertEqual(crawl_range_start_block(crawl_range), 199)
+
+    def test_rollback_range_below_fork_unchanged(self):
+        crawl_range = CrawlerRange(
+            crawler=GENERIC_CRAWLER,
+            from_block=0,
+            to_block=99,
+            progress_block=99,
+            finished=True,
+        )
+        self.assertFalse(rollback_crawl_range(crawl_range, 149))
+        self.assertTrue(crawl_range.finished)
@@ -0,0 +1,115 @@
+import time
+import unittest
+from unittest import mock
+
+from .provider_pool import EndpointHealth, PooledHTTPProvider, ProviderPoolError
+
+ENDPOINT_A = "http://node-a:8545"
+ENDPOINT_B = "http://node-b:8545"
+
+
+class TestEndpointHealth(unittest.TestCase):
+    def test_unmeasured_endpoint_scores_first(self):
+        self.assertEqual(EndpointHealth(uri=ENDPOINT_A).score(), 0.0)
+
+    def test_errors_increase_score(self):
+        endpoint = EndpointHealth(uri=ENDPOINT_A, latency=0.5)
+        healthy_score = endpoint.score()
+        endpoint.error_rate = 0.5
+        self.assertGreater(endpoint.score(), healthy_score)
+
+
+class TestPooledHTTPProvider(unittest.TestCase):
+    def setUp(self):
+        self.provider = PooledHTTPProvider(
+            [ENDPOINT_A, ENDPOINT_B],
+            eject_after_errors=2,
+            eject_seconds=30,
+            smoothing=0.5,
+        )
+        self.endpoint_a, self.endpoint_b = self.provider.endpoints
+
+    def test_requires_http_endpoints(self):
+        with self.assertRaises(ValueError):
+            PooledHTTPProvider([])
+        with self.assertRaises(ValueError):
+            PooledHTTPProvider([ENDPOINT_A, "/tmp/geth.ipc"])
+
+    def test_record_smooths_latency_and_error_rate(self):
+        self.provider._record(self.endpoint_a, 1.0, failed=False)
+        self.assertEqual(self.endpoint_a.latency, 1.0)
+        self.provider._record(self.endpoint_a, 3.0, failed=False)
+        self.assertEqual(self.endpoint_a.latency, 2.0)
+        self.assertEqual(self.endpoint_a.error_rate, 0.0)
+
+        self.provider._record(self.endpoint_a, 10.0, failed=True)
+        self.assertEqual(self.endpoint_a.latency, 2.0)
+        self.assertEqual(self.endpoint_a.error_rate, 0.5)
+        self.assertEqual(self.endpoint_a.requests, 3)
+        self.assertEqual(self.endpoint_a.errors, 1)
+
+    def test_ejects_after_consecutive_errors(self):
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        self.assertEqual(self.endpoint_a.ejected_until, 0.0)
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        self.assertGreater(self.endpoint_a.ejected_until, time.time())
+        for _ in range(10):
+            self.assertIs(self.provider._choose_endpoint(()), self.endpoint_b)
+
+    def test_success_resets_ejection(self):
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        self.provider._record(self.endpoint_a, 1.0, failed=False)
+        self.assertEqual(self.endpoint_a.consecutive_errors, 0)
+        self.assertEqual(self.endpoint_a.ejected_until, 0.0)
+
+    def test_all_ejected_probes_first_returning(self):
+        now = time.time()
+        self.endpoint_a.ejected_until = now + 20
+        self.endpoint_b.ejected_until = now + 10
+        self.assertIs(self.provider._choose_endpoint(()), self.endpoint_b)
+
+    def test_unmeasured_endpoint_chosen_first(self):
+        self.provider._record(self.endpoint_a, 0.1, failed=False)
+        for _ in range(10):
+            self.assertIs(self.provider._choose_endpoint(()), self.endpoint_b)
+
+    def test_choose_skips_excluded(self):
+        self.assertIs(self.provider._choose_endpoint([ENDPOINT_A]), self.endpoint_b)
+        self.assertIsNone(self.provider._choose_endpoint([ENDPOINT_A, ENDPOINT_B]))
+
+    def test_post_retries_on_other_endpoint(self):
+        def post_request(endpoint_uri, data, **kwargs):
+            if endpoint_uri == ENDPOINT_A:
+                raise ConnectionError("node is down")
+            return b"response"
+
+        with mock.patch(
+            "mooncrawl.provider_pool.make_post_request", side_effect=post_request
+        ):
+            self.provider._record(self.endpoint_b, 0.1, failed=False)
+            self.assertEqual(self.provider.post(b"request"), (ENDPOINT_B, b"response"))
+
+        self.assertEqual(self.endpoint_a.errors, 1)
+        self.assertEqual(self.endpoint_b.errors, 0)
+        self.assertEqual(self.endpoint_b.requests, 2)
+
+    def test_post_raises_when_all_endpoints_fail(self):
+        with mock.patch(
+            "mooncrawl.provider_pool.make_post_request",
+            side_effect=ConnectionError("node is down"),
+        ):
+            with self.assertRaises(ProviderPoolError):
+                self.provider.post(b"request")
+
+        self.assertEqual(self.endpoint_a.errors, 1)
+        self.assertEqual(self.endpoint_b.errors, 1)
+
+    def test_health(self):
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        self.provider._record(self.endpoint_a, 1.0, failed=True)
+        health = {endpoint["uri"]: endpoint for endpoint in self.provider.health()}
+        self.assertTrue(health[ENDPOINT_A]["ejected"])
+        self.assertEqual(health[ENDPOINT_A]["errors"], 2)
+        self.assertFalse(health[ENDPOINT_B]["ejected"])
+        self.assertEqual(health[ENDPOINT_B]["requests"], 0)
@@ -33,11 +33,12 @@ setup(
     package_data={"mooncrawl": ["py.typed"]},
     zip_safe=False,
     install_requires=[
+        "aiohttp",
         "boto3",
         "bugout>=0.1.19",
         "chardet",
         "fastapi",
-        "moonstreamdb>=0.3.2",
+        "moonstreamdb>=0.3.5",
         "moonworm==0.2.4",
         "humbug",
         "pydantic",
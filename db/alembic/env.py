@@ -38,6 +38,8 @@ from moonstreamdb.models import (
     ESDFunctionSignature,
     ESDEventSignature,
     OpenSeaCrawlingState,
+    CrawlerCheckpoint,
+    CrawlerRange,
 )
 
 
@@ -55,6 +57,8 @@ def include_symbol(tablename, schema):
         ESDFunctionSignature.__tablename__,
         ESDEventSignature.__tablename__,
         OpenSeaCrawlingState.__tablename__,
+        CrawlerCheckpoint.__tablename__,
+        CrawlerRange.__tablename__,
     }
 
 
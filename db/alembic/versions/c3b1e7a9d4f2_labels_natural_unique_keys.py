@@ -0,0 +1,112 @@
+"""Unique indexes on labels natural keys
+
+Revision ID: c3b1e7a9d4f2
+Revises: 5f2a9c1d7e63
+Create Date: 2026-10-17 18:12:45.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3b1e7a9d4f2"
+down_revision = "5f2a9c1d7e63"
+branch_labels = None
+depends_on = None
+
+LABELS_TABLES = ["ethereum_labels", "polygon_labels", "mumbai_labels", "xdai_labels"]
+
+TX_CALL_PREDICATE = "log_index IS NULL AND (label_data->>'type') = 'tx_call'"
+
+# Duplicates are deleted in separately committed batches of blocks range,
+# so tables are not locked by one long transaction
+DEDUPE_BLOCKS_BATCH = 100000
+
+# Duplicates of event labels and of tx_call labels
+DUPLICATES_PREDICATES = [
+    """
+    duplicate.log_index = original.log_index
+    """,
+    """
+    duplicate.log_index IS NULL
+    AND original.log_index IS NULL
+    AND (duplicate.label_data->>'type') = 'tx_call'
+    AND (original.label_data->>'type') = 'tx_call'
+    """,
+]
+
+
+def delete_duplicates(table: str, block_predicate: str) -> None:
+    for duplicates_predicate in DUPLICATES_PREDICATES:
+        op.execute(
+            f"""
+            DELETE FROM {table} duplicate USING {table} original
+            WHERE {block_predicate}
+                AND duplicate.label = original.label
+                AND duplicate.transaction_hash = original.transaction_hash
+                AND {duplicates_predicate}
+                AND duplicate.id > original.id
+            """
+        )
+
+
+def upgrade():
+    """
+    Runs outside of migration transaction: duplicates left by concurrent crawlers
+    are deleted in batches, then unique indexes are built concurrently, without
+    blocking crawlers writes.
+
+    If crawlers insert new duplicates before index is built, its build fails
+    and leaves invalid index. Drop it with DROP INDEX CONCURRENTLY and run
+    migration again.
+    """
+    with op.get_context().autocommit_block():
+        for table in LABELS_TABLES:
+            min_block, max_block = (
+                op.get_bind()
+                .execute(
+                    sa.text(f"SELECT min(block_number), max(block_number) FROM {table}")
+                )
+                .one()
+            )
+            if min_block is not None:
+                for from_block in range(min_block, max_block + 1, DEDUPE_BLOCKS_BATCH):
+                    delete_duplicates(
+                        table,
+                        f"duplicate.block_number BETWEEN {from_block} "
+                        f"AND {from_block + DEDUPE_BLOCKS_BATCH - 1}",
+                    )
+            delete_duplicates(table, "duplicate.block_number IS NULL")
+
+            op.create_index(
+                f"uix_{table}_label_transaction_hash_log_index",
+                table,
+                ["label", "transaction_hash", "log_index"],
+                unique=True,
+                postgresql_where=sa.text("log_index IS NOT NULL"),
+                postgresql_concurrently=True,
+            )
+            op.create_index(
+                f"uix_{table}_label_transaction_hash_tx_call",
+                table,
+                ["label", "transaction_hash"],
+                unique=True,
+                postgresql_where=sa.text(TX_CALL_PREDICATE),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table in LABELS_TABLES:
+            op.drop_index(
+                f"uix_{table}_label_transaction_hash_tx_call",
+                table_name=table,
+                postgresql_concurrently=True,
+            )
+            op.drop_index(
+                f"uix_{table}_label_transaction_hash_log_index",
+                table_name=table,
+                postgresql_concurrently=True,
+            )
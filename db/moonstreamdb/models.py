@@ -3,6 +3,7 @@ import uuid
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
     BigInteger,
+    Boolean,
     Column,
     DateTime,
     Index,
@@ -11,7 +12,9 @@ from sqlalchemy import (
     MetaData,
     Numeric,
     Text,
+    UniqueConstraint,
     VARCHAR,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import expression
@@ -125,6 +128,26 @@ class EthereumLabel(Base):  # type: ignore
 
     __tablename__ = "ethereum_labels"
 
+    __table_args__ = (
+        Index(
+            "uix_ethereum_labels_label_transaction_hash_log_index",
+            "label",
+            "transaction_hash",
+            "log_index",
+            unique=True,
+            postgresql_where=text("log_index IS NOT NULL"),
+        ),
+        Index(
+            "uix_ethereum_labels_label_transaction_hash_tx_call",
+            "label",
+            "transaction_hash",
+            unique=True,
+            postgresql_where=text(
+                "log_index IS NULL AND (label_data->>'type') = 'tx_call'"
+            ),
+        ),
+    )
+
     id = Column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -244,6 +267,23 @@ class PolygonLabel(Base):  # type: ignore
             "block_timestamp",
             unique=False,
         ),
+        Index(
+            "uix_polygon_labels_label_transaction_hash_log_index",
+            "label",
+            "transaction_hash",
+            "log_index",
+            unique=True,
+            postgresql_where=text("log_index IS NOT NULL"),
+        ),
+        Index(
+            "uix_polygon_labels_label_transaction_hash_tx_call",
+            "label",
+            "transaction_hash",
+            unique=True,
+            postgresql_where=text(
+                "log_index IS NULL AND (label_data->>'type') = 'tx_call'"
+            ),
+        ),
     )
 
     id = Column(
@@ -350,6 +390,23 @@ class MumbaiLabel(Base):  # type: ignore
             "block_timestamp",
             unique=False,
         ),
+        Index(
+            "uix_mumbai_labels_label_transaction_hash_log_index",
+            "label",
+            "transaction_hash",
+            "log_index",
+            unique=True,
+            postgresql_where=text("log_index IS NOT NULL"),
+        ),
+        Index(
+            "uix_mumbai_labels_label_transaction_hash_tx_call",
+            "label",
+            "transaction_hash",
+            unique=True,
+            postgresql_where=text(
+                "log_index IS NULL AND (label_data->>'type') = 'tx_call'"
+            ),
+        ),
     )
 
     id = Column(
@@ -462,6 +519,26 @@ class XDaiLabel(Base):  # type: ignore
 
     __tablename__ = "xdai_labels"
 
+    __table_args__ = (
+        Index(
+            "uix_xdai_labels_label_transaction_hash_log_index",
+            "label",
+            "transaction_hash",
+            "log_index",
+            unique=True,
+            postgresql_where=text("log_index IS NOT NULL"),
+        ),
+        Index(
+            "uix_xdai_labels_label_transaction_hash_tx_call",
+            "label",
+            "transaction_hash",
+            unique=True,
+            postgresql_where=text(
+                "log_index IS NULL AND (label_data->>'type') = 'tx_call'"
+            ),
+        ),
+    )
+
     id = Column(
         UUID(as_uuid=True),
         primary_key=True,
@@ -540,3 +617,78 @@ class OpenSeaCrawlingState(Base):  # type: ignore
     )
 
     total_count = Column(Integer, nullable=False)
+
+
+class CrawlerCheckpoint(Base):  # type: ignore
+    """
+    Crawling state of crawler for blockchain.
+
+    Blocks from first_block to last_block (high-water mark) are crawled
+    except of outstanding gaps, stored as list of [from_block, to_block] ranges.
+    """
+
+    __tablename__ = "crawler_checkpoints"
+
+    __table_args__ = (UniqueConstraint("crawler", "blockchain"),)
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        unique=True,
+        nullable=False,
+    )
+    crawler = Column(VARCHAR(256), nullable=False)
+    blockchain = Column(VARCHAR(128), nullable=False)
+    first_block = Column(BigInteger, nullable=True)
+    last_block = Column(BigInteger, nullable=True)
+    gaps = Column(JSONB, nullable=False, server_default="[]")
+    created_at = Column(
+        DateTime(timezone=True), server_default=utcnow(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=utcnow(),
+        onupdate=utcnow(),
+        nullable=False,
+    )
+
+
+class CrawlerRange(Base):  # type: ignore
+    """
+    Blocks range (shard) crawled by one worker of parallel crawler.
+
+    label distinguishes crawl targets of the same crawler (e.g. contract address).
+    progress_block is the last crawled block in crawl direction, shard is done
+    when finished is set.
+    """
+
+    __tablename__ = "crawler_ranges"
+
+    __table_args__ = (
+        UniqueConstraint("crawler", "blockchain", "label", "from_block", "to_block"),
+    )
+
+    id = Column(
+        UUID(as_uuid=True),
+        primary_key=True,
+        default=uuid.uuid4,
+        unique=True,
+        nullable=False,
+    )
+    crawler = Column(VARCHAR(256), nullable=False)
+    blockchain = Column(VARCHAR(128), nullable=False)
+    label = Column(VARCHAR(256), nullable=False)
+    from_block = Column(BigInteger, nullable=False)
+    to_block = Column(BigInteger, nullable=False)
+    progress_block = Column(BigInteger, nullable=True)
+    finished = Column(Boolean, nullable=False, server_default=expression.false())
+    created_at = Column(
+        DateTime(timezone=True), server_default=utcnow(), nullable=False
+    )
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=utcnow(),
+        onupdate=utcnow(),
+        nullable=False,
+    )